@@ -8,15 +8,24 @@ if sys.version_info < (3, 5):
 from .base import Baseset
 from .batch import Batch
 from .batch_image import ImagesBatch
+from .batch_window import WindowBatch
+from .batch_volume import VolumeBatch
+from .volume import BloscVolume, ChunkCache
 from .config import Config
 from .dataset import Dataset
 from .pipeline import Pipeline
 from .monitor import *
 from .notifier import Notifier
 from .named_expr import NamedExpression, B, C, F, L, V, M, D, R, W, P, I
-from .dsindex import DatasetIndex, FilesIndex
+from .dsindex import DatasetIndex, FilesIndex, MemmapIndex, WindowIndex, CropIndex
+from .stream import StreamIndex, StreamDataset
+from .ordering import BlockShuffle
+from .reducers import Reducer, Sum, Count, Min, Max, MeanVar, Histogram, ValueCounts
+from .batch_sampler import BatchSampler, WeightedSampler, BalancedSampler, PrioritizedSampler, BucketSampler
 from .decorators import action, inbatch_parallel, parallel, any_action_failed, mjit, deprecated, apply_parallel
 from .exceptions import SkipBatchException, EmptyBatchSequence
+from .pools import PoolRegistry, WorkerPool, shared_pools
+from .tracing import Tracer
 from .sampler import Sampler, ConstantSampler, NumpySampler, HistoSampler, ScipySampler
 from .utils import save_data_to
 from .utils_notebook import in_notebook, get_notebook_path, get_notebook_name, pylint_notebook
@@ -15,6 +15,8 @@ UPDATE_ID = '#_update'
 CALL_ID = '#_call'
 PRINT_ID = '#_print'
 CALL_FROM_NS_ID = '#_from_ns'
+UPDATE_PRIORITIES_ID = '#_update_priorities'
+REDUCE_ID = '#_reduce'
 
 ACTIONS = {
     IMPORT_MODEL_ID: '_exec_import_model',
@@ -28,4 +30,6 @@ ACTIONS = {
     CALL_ID: '_exec_call',
     PRINT_ID: '_exec_print',
     CALL_FROM_NS_ID: '_exec_from_ns',
+    UPDATE_PRIORITIES_ID: '_exec_update_priorities',
+    REDUCE_ID: '_exec_reduce',
 }
@@ -31,6 +31,7 @@ from .dsindex import DatasetIndex, FilesIndex
 from .decorators import action, inbatch_parallel, any_action_failed, apply_parallel as apply_parallel_
 from .components import create_item_class, BaseComponents
 from .named_expr import P, R
+from .pools import get_pools
 
 
 class MethodsTransformingMeta(type):
@@ -401,14 +402,14 @@ class Batch(metaclass=MethodsTransformingMeta):
 
     def __getstate__(self):
         state = self.__dict__.copy()
-        state.pop('_data_named')
+        state.pop('_data_named', None)
         state['_local'] = state['_local'] is not None
         state['_preloaded_lock'] = True
         return state
 
     def __setstate__(self, state):
         state['_preloaded_lock'] = threading.Lock() if state['_preloaded_lock'] else None
-        state['_local'] = threading.Lock() if state['_local'] else None
+        state['_local'] = threading.local() if state['_local'] else None
 
         for k, v in state.items():
             # this warrants that all hidden objects are reconstructed upon unpickling
@@ -478,9 +479,11 @@ class Batch(metaclass=MethodsTransformingMeta):
 
         target : str
             See :func:`~batchflow.inbatch_parallel` for details.
+            If 'vectorized', ``func`` is called once with the whole component (see Notes).
 
         post : str or callable
             See :func:`~batchflow.inbatch_parallel` for details.
+            With ``target='vectorized'`` post gets the whole result instead of a list of item results.
 
         src : str, sequence, list of str
             the source to get data from, can be:
@@ -496,7 +499,14 @@ class Batch(metaclass=MethodsTransformingMeta):
             - tuple or list of str, e.g. ['images', 'masks']
 
         p : float or None
-            probability of applying func to an element in the batch
+            probability of applying func to an element in the batch.
+            Items which are left intact are not sent to workers at all.
+
+        chunk_size : int or 'auto'
+            a number of items processed by a worker at once (see :func:`~batchflow.inbatch_parallel`)
+
+        n_chunks : int
+            a number of chunks to split the batch items into
 
         args, kwargs
             other parameters passed to ``func``
@@ -517,6 +527,15 @@ class Batch(metaclass=MethodsTransformingMeta):
 
         However, named expressions will be evaluated only once before the first call.
 
+        With `target='vectorized'` the function is applied to the whole component at once::
+
+            self.dst = func(self.src, *args, **kwargs)
+
+        which is much faster for functions working with arrays of any shape (e.g. numpy ufuncs).
+        When `p` is given, the function gets only the selected items.
+        When `n_workers` is given, the component is split into `n_workers` contiguous slices
+        which are processed in parallel threads.
+
         Whereas `apply_parallel(func, src=('images', 'masks'))` (i.e. when `src` takes a tuple of component names,
         not the list as in the previous example) passes both components data into `func` simultaneously::
 
@@ -531,6 +550,7 @@ class Batch(metaclass=MethodsTransformingMeta):
             apply_parallel(rotate, src=['images', 'masks'], dst=['images', 'masks'], p=.2)
             apply_parallel(MyBatch.some_static_method, p=.5)
             apply_parallel(B.some_method, src='features', p=.5)
+            apply_parallel(np.clip, 0, 1, src='images', target='vectorized')
         """
         kwargs = {**self.apply_defaults, **kwargs}
 
@@ -553,6 +573,12 @@ class Batch(metaclass=MethodsTransformingMeta):
                 self.apply_parallel(func, *args, p=p, **kwargs)
             return self
 
+        post = kwargs.pop('post', None)
+        target = kwargs.pop('target', None)
+
+        if target == 'vectorized':
+            return self._apply_vectorized(func, args, kwargs, src=src, dst=dst, p=p, post=post)
+
         if isinstance(src, str):
             init = self.get(component=src)
         elif isinstance(src, (tuple, list)):
@@ -560,10 +586,7 @@ class Batch(metaclass=MethodsTransformingMeta):
         else:
             init = src
 
-        post = kwargs.pop('post', None)
-        target = kwargs.pop('target', None)
-
-        parallel = inbatch_parallel(init=init, post=post, target=target, src=src, dst=dst)
+        parallel = inbatch_parallel(init=init, post=post, target=target, _mask='p', src=src, dst=dst)
         # unbind the method to pass self explicitly
         transform = parallel(type(self)._apply_once)
         return transform(self, *args, func=func, p=p, **kwargs)
@@ -589,6 +612,115 @@ class Batch(metaclass=MethodsTransformingMeta):
             return func(item, *args, **kwargs)
         return item
 
+    def _apply_vectorized(self, func, args, kwargs, src=None, dst=None, p=None, post=None):
+        """ Apply a function to whole components (or to their contiguous slices in parallel threads).
+
+        Parameters
+        ----------
+        func : callable
+            a function which accepts a component (or a tuple of components if `src` is a tuple)
+        args : tuple
+            positional arguments passed to ``func``
+        kwargs : dict
+            keyword arguments passed to ``func``, except for `n_workers` (a number of contiguous slices
+            to process in parallel, if None, the function is called once) and `dst_default`
+            (see :meth:`._assemble`)
+        src : str, tuple of str or sequence
+            the source to get data from
+        dst : str or tuple of str
+            the destination to put the result in (the same as `src` by default)
+        p : P, int or None
+            whether to apply func to each batch item
+        post : str or callable
+            a method or a function which gets the whole result
+        """
+        n_workers = kwargs.pop('n_workers', None)
+        dst_default = kwargs.pop('dst_default', 'src')
+        if isinstance(src, str):
+            data = self.get(component=src)
+        elif isinstance(src, tuple):
+            data = tuple(self.get(component=s) for s in src)
+        elif src is None:
+            raise ValueError("src should be specified when target='vectorized'")
+        else:
+            data = src
+
+        if isinstance(p, P):
+            mask = np.asarray(p.get(batch=self, parallel=True)).astype(bool)
+        elif p is not None:
+            mask = np.full(len(self), bool(p))
+        else:
+            mask = None
+        if mask is not None and mask.all():
+            mask = None
+
+        def _take(items, positions):
+            if isinstance(items, tuple):
+                return tuple(_take(item, positions) for item in items)
+            return items[positions]
+
+        def _merge(items, result):
+            if isinstance(items, tuple):
+                if not isinstance(result, tuple) or len(result) != len(items):
+                    raise ValueError("func should return a tuple of %d items if p is used with tuple src" % len(items))
+                return tuple(_merge(item, res) for item, res in zip(items, result))
+            items = np.asarray(items)
+            result = np.asarray(result)
+            merged = items.astype(np.result_type(items, result))
+            merged[mask] = result
+            return merged
+
+        def _concat(results):
+            if isinstance(results[0], tuple):
+                return tuple(_concat(list(res)) for res in zip(*results))
+            return np.concatenate(results)
+
+        if mask is not None and not mask.any():
+            result = data
+        else:
+            items = _take(data, mask) if mask is not None else data
+            if n_workers is None:
+                result = func(items, *args, **kwargs)
+            else:
+                size = len(items[0]) if isinstance(items, tuple) else len(items)
+                bounds = np.linspace(0, size, min(n_workers, size) + 1).astype(int)
+                pool = get_pools(self).get('threads', n_workers)
+                futures = [pool.submit(func, _take(items, slice(start, stop)), *args, **kwargs)
+                           for start, stop in zip(bounds[:-1], bounds[1:])]
+                result = _concat([future.result() for future in futures])
+
+            if mask is not None:
+                result = _merge(data, result)
+
+        if post is None:
+            return self
+        if isinstance(post, str):
+            if post != '_assemble':
+                return getattr(self, post)(result, *args, src=src, dst=dst, **kwargs)
+        else:
+            return post(result, *args, src=src, dst=dst, **kwargs)
+
+        if dst is None:
+            if dst_default == 'src':
+                dst = src
+            elif dst_default == 'components':
+                dst = self.components
+        if isinstance(dst, (tuple, list)) and len(dst) == 1 and not isinstance(result, (tuple, list)):
+            dst = dst[0]
+        if isinstance(dst, str):
+            dst, result = (dst,), (result,)
+        elif not isinstance(dst, (tuple, list)) or not all(isinstance(d, str) for d in dst):
+            raise ValueError("dst should be a component name or a tuple of component names", dst)
+        elif not isinstance(result, (tuple, list)) or len(result) != len(dst):
+            raise ValueError("func should return %d items to put them into %s" % (len(dst), dst))
+
+        for component, value in zip(dst, result):
+            if hasattr(self, component):
+                setattr(self, component, value)
+            else:
+                self.add_components(component, value)
+        return self
+
     def _get_file_name(self, ix, src):
         """ Get full path file name corresponding to the current index.
 
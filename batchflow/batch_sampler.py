@@ -0,0 +1,468 @@
+""" Contains samplers which choose items for each batch """
+import threading
+
+import numpy as np
+
+
+def _make_random_state(seed):
+    if seed is None or isinstance(seed, np.random.RandomState):
+        return seed
+    return np.random.RandomState(seed)
+
+
+class IndexSampler:
+    """ Base class for samplers which choose items of an index for batches
+
+    A sampler is passed as `shuffle` to `next_batch` and `gen_batch` of a dataset, an index or a pipeline.
+    See :class:`BatchSampler` which draws items for each batch and :class:`BucketSampler` which plans
+    batches for a whole epoch.
+
+    Parameters
+    ----------
+    seed : int or :class:`numpy.random.RandomState`
+        a seed (if None, the global numpy generator is used)
+    """
+    def __init__(self, seed=None):
+        self.random_state = _make_random_state(seed)
+        self.index = None
+
+    @property
+    def rng(self):
+        """ A random generator: a given :class:`numpy.random.RandomState` or `numpy.random` """
+        return np.random if self.random_state is None else self.random_state
+
+    def setup(self, index):
+        """ Prepare the sampler for an index (called before the first batch of each iteration)
+
+        Parameters
+        ----------
+        index : DatasetIndex
+        """
+        self.index = index
+
+    def _get_values(self, values, name):
+        """ Return an array of per-item values which might be given as an array or a callable """
+        if callable(values):
+            values = values(self.index.indices)
+        values = np.asarray(values)
+        if values.ndim != 1 or len(values) != len(self.index):
+            raise ValueError("%s should be a 1-d array with a value for each item in the index" % name)
+        return values
+
+
+class BatchSampler(IndexSampler):
+    """ Base class for samplers which draw positions of items for each batch
+
+    Instead of splitting a complete order of items into batches, items for each batch are drawn by the sampler
+    just before the batch is created, so a sampler could change its distribution while iterating.
+
+    An epoch consists of `epoch_size` drawn items (by default, the index length), so `n_epochs`, `n_iters`
+    and `drop_last` have the same meaning as for ordinary shuffling.
+
+    Child classes should implement :meth:`sample` and might redefine :meth:`setup`.
+
+    Parameters
+    ----------
+    seed : int or :class:`numpy.random.RandomState`
+        a seed (if None, the global numpy generator is used)
+    epoch_size : int
+        a number of items in an epoch (if None, the index length)
+    """
+    def __init__(self, seed=None, epoch_size=None):
+        super().__init__(seed=seed)
+        self.epoch_size = epoch_size
+
+    def sample(self, size):
+        """ Return positions of items for a batch
+
+        Parameters
+        ----------
+        size : int
+            a number of items
+
+        Returns
+        -------
+        np.ndarray of int
+        """
+        raise NotImplementedError()
+
+
+class WeightedSampler(BatchSampler):
+    """ Draws items with replacement with probabilities proportional to their weights
+
+    Each item is drawn in O(1) with Walker's alias method.
+
+    Parameters
+    ----------
+    weights : array-like or callable
+        a non-negative weight for each item in the index or a function which takes an array
+        of index items and returns their weights
+    seed : int or :class:`numpy.random.RandomState`
+        a seed
+    epoch_size : int
+        a number of items in an epoch (by default, the index length)
+
+    Examples
+    --------
+    >>> dataset.gen_batch(BATCH_SIZE, shuffle=WeightedSampler(weights, seed=42), n_iters=1000)
+    """
+    def __init__(self, weights, seed=None, epoch_size=None):
+        super().__init__(seed=seed, epoch_size=epoch_size)
+        self.weights = weights
+        self.prob = None
+        self.alias = None
+
+    def setup(self, index):
+        if index is self.index and self.prob is not None:
+            return
+        super().setup(index)
+        weights = self._get_values(self.weights, 'weights').astype(np.float64)
+        if (weights < 0).any() or not np.isfinite(weights).all() or weights.sum() <= 0:
+            raise ValueError("weights should be non-negative and finite with a positive sum")
+        self.prob, self.alias = self.build_alias(weights)
+
+    @staticmethod
+    def build_alias(weights):
+        """ Build tables of the alias method (Vose's algorithm)
+
+        Returns
+        -------
+        prob : np.ndarray of float
+            a probability to keep a drawn cell
+        alias : np.ndarray of int
+            an item to take instead of a drawn one otherwise
+        """
+        size = len(weights)
+        prob = weights * size / weights.sum()
+        alias = np.arange(size)
+        small = np.flatnonzero(prob < 1).tolist()
+        large = np.flatnonzero(prob >= 1).tolist()
+        scaled = prob.tolist()
+        while small and large:
+            less, more = small.pop(), large.pop()
+            alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+        prob = np.array(scaled)
+        # the rest are equal to 1 up to rounding errors
+        prob[large + small] = 1
+        return prob, alias
+
+    def sample(self, size):
+        cells = self.rng.randint(len(self.prob), size=size)
+        keep = self.rng.random_sample(size) < self.prob[cells]
+        return np.where(keep, cells, self.alias[cells])
+
+
+class BalancedSampler(BatchSampler):
+    """ Composes batches with fixed shares of classes
+
+    In each batch the number of items of each class is proportional to its share (the remainder is allocated
+    randomly according to the shares). Items of a class are taken from a shuffled list of all class items,
+    which is reshuffled when exhausted. So minority classes are oversampled without duplicating the index,
+    while majority classes are undersampled.
+
+    Parameters
+    ----------
+    labels : array-like or callable
+        a class label for each item in the index or a function which takes an array of index items
+        and returns their labels
+    shares : dict or None
+        class label -> a share of the class in each batch (if None, all classes get equal shares)
+    seed : int or :class:`numpy.random.RandomState`
+        a seed
+    epoch_size : int
+        a number of items in an epoch (by default, the index length)
+
+    Examples
+    --------
+    >>> dataset.gen_batch(BATCH_SIZE, shuffle=BalancedSampler(labels), n_epochs=10)
+    >>> dataset.gen_batch(BATCH_SIZE, shuffle=BalancedSampler(labels, shares={0: .5, 1: .25, 2: .25}), n_epochs=10)
+    """
+    def __init__(self, labels, shares=None, seed=None, epoch_size=None):
+        super().__init__(seed=seed, epoch_size=epoch_size)
+        self.labels = labels
+        self.shares = shares
+        self.classes = None
+        self.probs = None
+        self._items = None
+        self._next = None
+
+    def setup(self, index):
+        if index is self.index and self.classes is not None:
+            return
+        super().setup(index)
+        labels = self._get_values(self.labels, 'labels')
+        self.classes, inverse = np.unique(labels, return_inverse=True)
+        if self.shares is None:
+            probs = np.ones(len(self.classes))
+        else:
+            unknown = set(self.shares) - set(self.classes.tolist())
+            if unknown:
+                raise ValueError("Unknown classes in shares: %s" % sorted(unknown, key=str))
+            probs = np.array([self.shares.get(label, 0) for label in self.classes.tolist()], dtype=np.float64)
+            if (probs < 0).any() or probs.sum() <= 0:
+                raise ValueError("shares should be non-negative with a positive sum")
+        self.probs = probs / probs.sum()
+
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.cumsum(np.bincount(inverse, minlength=len(self.classes)))[:-1]
+        self._items = [self.rng.permutation(items) for items in np.split(order, bounds)]
+        self._next = [0] * len(self.classes)
+
+    def _take(self, cls, size):
+        """ Take next items of a class reshuffling them when all of them have been taken """
+        parts = []
+        while size > 0:
+            items, start = self._items[cls], self._next[cls]
+            if start == len(items):
+                items = self._items[cls] = self.rng.permutation(items)
+                start = 0
+            part = items[start : start + size]
+            self._next[cls] = start + len(part)
+            parts.append(part)
+            size -= len(part)
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.intp)
+
+    def sample(self, size):
+        counts = np.floor(self.probs * size).astype(np.intp)
+        rest = size - counts.sum()
+        if rest > 0:
+            fractions = self.probs * size - counts
+            extra = self.rng.choice(len(counts), rest, replace=False, p=fractions / fractions.sum())
+            counts[extra] += 1
+        positions = np.concatenate([self._take(cls, count) for cls, count in enumerate(counts)])
+        return self.rng.permutation(positions)
+
+
+class SumTree:
+    """ A complete binary tree where leaves hold values and each node holds the sum of its children
+
+    It allows to update values and to find an item by a prefix sum in O(log n).
+
+    Parameters
+    ----------
+    values : 1-d array-like
+        non-negative values of items
+    """
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.size = len(values)
+        self.capacity = 1 << max(self.size - 1, 0).bit_length()
+        self.tree = np.zeros(2 * self.capacity)
+        self.tree[self.capacity : self.capacity + self.size] = values
+        start = self.capacity
+        while start > 1:
+            self.tree[start // 2 : start] = self.tree[start : 2 * start : 2] + self.tree[start + 1 : 2 * start : 2]
+            start //= 2
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def total(self):
+        """ float : a sum of all values """
+        return self.tree[1]
+
+    @property
+    def values(self):
+        """ np.ndarray : values of items """
+        return self.tree[self.capacity : self.capacity + self.size]
+
+    def update(self, positions, values):
+        """ Set values of items at given positions """
+        nodes = np.asarray(positions, dtype=np.intp) + self.capacity
+        self.tree[nodes] = values
+        nodes = np.unique(nodes // 2)
+        while len(nodes) > 0 and nodes[0] >= 1:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            nodes = np.unique(nodes[nodes > 1] // 2)
+
+    def find(self, prefix_sums):
+        """ Return positions of items where cumulative sums of values exceed given numbers """
+        prefix_sums = np.asarray(prefix_sums, dtype=np.float64)
+        nodes = np.ones(len(prefix_sums), dtype=np.intp)
+        for _ in range(self.capacity.bit_length() - 1):
+            left = self.tree[2 * nodes]
+            right = prefix_sums >= left
+            prefix_sums = np.where(right, prefix_sums - left, prefix_sums)
+            nodes = 2 * nodes + right
+        # rounding errors might lead to empty leaves beyond the last item
+        return np.minimum(nodes - self.capacity, self.size - 1)
+
+
+class PrioritizedSampler(BatchSampler):
+    """ Draws items with replacement with probabilities proportional to their priorities
+
+    Priorities are kept in a :class:`SumTree`, so both sampling and updates take O(log n) per item and
+    new priorities affect the very next batch. Priorities are usually updated after each training step
+    with :meth:`~.Pipeline.update_priorities`::
+
+        sampler = PrioritizedSampler(alpha=.6)
+
+        pipeline = (dataset.p
+            .load(...)
+            .train_model('model', ..., fetches='per_item_loss', save_to=B('loss'))
+            .update_priorities(sampler, B('loss'))
+        )
+        pipeline.run(BATCH_SIZE, shuffle=sampler, n_iters=10000)
+
+    Parameters
+    ----------
+    priorities : array-like, callable or None
+        initial priorities of items (if None, all priorities are equal to 1)
+    alpha : float
+        a power of priorities (0 gives uniform sampling)
+    eps : float
+        a number added to absolute values of priorities, so that any item could be drawn
+    seed : int or :class:`numpy.random.RandomState`
+        a seed
+    epoch_size : int
+        a number of items in an epoch (by default, the index length)
+    """
+    def __init__(self, priorities=None, alpha=1., eps=1e-6, seed=None, epoch_size=None):
+        super().__init__(seed=seed, epoch_size=epoch_size)
+        self.priorities = priorities
+        self.alpha = alpha
+        self.eps = eps
+        self.tree = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_lock')
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _transform(self, priorities):
+        return (np.abs(np.asarray(priorities, dtype=np.float64)) + self.eps) ** self.alpha
+
+    def setup(self, index):
+        if index is self.index and self.tree is not None:
+            return
+        super().setup(index)
+        if self.priorities is None:
+            priorities = np.ones(len(index))
+        else:
+            priorities = self._get_values(self.priorities, 'priorities')
+        self.tree = SumTree(self._transform(priorities))
+
+    def sample(self, size):
+        # stratified sampling: one item from each of `size` equal segments of the total sum
+        segments = (np.arange(size) + self.rng.random_sample(size)) / size
+        with self._lock:
+            positions = self.tree.find(segments * self.tree.total)
+        return self.rng.permutation(positions)
+
+    def update(self, indices, priorities):
+        """ Set new priorities of items
+
+        Parameters
+        ----------
+        indices : 1-d array-like
+            index items (e.g. `batch.indices`)
+        priorities : float or 1-d array-like
+            new priorities (e.g. losses of items)
+        """
+        if self.tree is None:
+            raise RuntimeError("Priorities cannot be updated before the sampler is used to generate batches")
+        positions = self.index.get_pos(np.asarray(indices))
+        values = np.broadcast_to(self._transform(priorities), np.shape(positions))
+        with self._lock:
+            self.tree.update(positions, values)
+
+    def probabilities(self, indices=None):
+        """ Return current probabilities to draw items (all items, if `indices` is None) """
+        values = self.tree.values if indices is None else self.tree.values[self.index.get_pos(np.asarray(indices))]
+        return values / self.tree.total
+
+
+class BucketSampler(IndexSampler):
+    """ Composes batches of items of similar sizes
+
+    Items are grouped into buckets by their sizes. Each epoch items within every bucket are shuffled
+    and split into batches, and then batches from all buckets are shuffled together.
+    So each item is taken exactly once per epoch, while items in a batch have similar sizes
+    and little space is wasted on padding them to the largest one.
+
+    A number of items in a batch is limited by `batch_size` and, if `max_size` is given,
+    by the padded size of a batch, i.e. a number of items times the largest item size in a bucket.
+
+    Unlike a :class:`BatchSampler`, it plans all batches of an epoch at once with :meth:`plan_epoch`,
+    and batches might contain fewer than `batch_size` items. An epoch ends when all items have been taken,
+    and `drop_last` drops the last incomplete batch of each bucket.
+
+    Parameters
+    ----------
+    sizes : array-like or callable
+        a size of each item in the index (e.g. a sequence length, or a shape, so that the size is a number
+        of pixels) or a function which takes an array of index items and returns their sizes
+    buckets : int or sequence of numbers
+        a number of buckets with equal numbers of items or boundaries of item sizes between buckets
+    max_size : int or None
+        a maximum padded size of a batch (e.g. a number of pixels)
+    seed : int or :class:`numpy.random.RandomState`
+        a seed
+
+    Examples
+    --------
+    >>> sampler = BucketSampler(lambda items: [images[item].shape[:2] for item in items], max_size=2**22)
+    >>> pipeline.run(BATCH_SIZE, shuffle=sampler, n_epochs=10)
+    """
+    def __init__(self, sizes, buckets=10, max_size=None, seed=None):
+        super().__init__(seed=seed)
+        self.sizes = sizes
+        self.buckets = buckets
+        self.max_size = max_size
+        self.item_sizes = None
+        self.bucket_items = None
+
+    def setup(self, index):
+        if index is self.index and self.bucket_items is not None:
+            return
+        super().setup(index)
+        sizes = self.sizes(index.indices) if callable(self.sizes) else self.sizes
+        sizes = np.asarray(sizes)
+        if sizes.ndim == 2:
+            sizes = sizes.prod(axis=1)
+        if sizes.ndim != 1 or len(sizes) != len(index):
+            raise ValueError("sizes should contain a size or a shape for each item in the index")
+        self.item_sizes = sizes
+
+        order = np.argsort(sizes, kind='stable')
+        if isinstance(self.buckets, int):
+            bucket_items = np.array_split(order, min(self.buckets, len(order)))
+        else:
+            bounds = np.searchsorted(sizes[order], np.sort(self.buckets), side='left')
+            bucket_items = np.split(order, bounds)
+        self.bucket_items = [items for items in bucket_items if len(items) > 0]
+
+    def get_capacities(self, batch_size):
+        """ Return a maximum number of items in a batch for each bucket """
+        if self.max_size is None:
+            return [batch_size] * len(self.bucket_items)
+        return [max(1, min(batch_size, int(self.max_size // self.item_sizes[items].max())))
+                for items in self.bucket_items]
+
+    def get_n_batches(self, batch_size, drop_last=False):
+        """ Return a number of batches in an epoch """
+        rounding = np.floor_divide if drop_last else lambda a, b: -(-a // b)
+        return int(sum(rounding(len(items), capacity)
+                       for items, capacity in zip(self.bucket_items, self.get_capacities(batch_size))))
+
+    def plan_epoch(self, batch_size, drop_last=False):
+        """ Return a list of batches (arrays of item positions) for an epoch """
+        batches = []
+        for items, capacity in zip(self.bucket_items, self.get_capacities(batch_size)):
+            items = self.rng.permutation(items)
+            stop = len(items) // capacity * capacity if drop_last else len(items)
+            batches.extend(items[start : start + capacity] for start in range(0, stop, capacity))
+        if not batches:
+            raise ValueError("No batches left after dropping incomplete ones. Decrease the batch size.")
+        return [batches[i] for i in self.rng.permutation(len(batches))]
@@ -0,0 +1,90 @@
+""" Contains a batch class for crops from large volumes """
+import numpy as np
+
+from .batch import Batch
+from .decorators import action
+from .dsindex import CropIndex
+from .volume import as_volume, chunk_cache
+
+
+class VolumeBatch(Batch):
+    """ Batch class for crops from large 3D volumes (e.g. CT scans or seismic cubes)
+
+    The batch index should be a :class:`~.CropIndex`, so each item is a crop `(volume_id, origin, shape)`.
+    Crops are read with `load(src=volumes, fmt='volume')` and volumes might be:
+
+    - :class:`~.volume.BloscVolume` (or a path to it) - a directory of blosc-compressed chunk files
+    - a chunked array (e.g. hdf5 dataset or zarr array)
+    - a numpy array (including memory-mapped ones).
+
+    Only chunks touched by crops are read and decompressed, and they are kept in a per-process LRU cache
+    (:class:`~.volume.ChunkCache`), so overlapping crops of consecutive batches do not read chunks again.
+    All crops are assembled into one preallocated array of shape `(batch_size, D, H, W)`.
+
+    Examples
+    --------
+    >>> volumes = {name: BloscVolume('/data/cubes/' + name) for name in names}
+    >>> index = CropIndex.grid({name: volume.shape for name, volume in volumes.items()}, shape=(64, 128, 128))
+    >>> pipeline = (Dataset(index, VolumeBatch).p
+    ...     .load(src=volumes, fmt='volume', dst='images')
+    ... )
+    """
+    components = 'images', 'masks'
+
+    @action
+    def load(self, *args, src=None, fmt=None, dst=None, **kwargs):
+        """ Load data.
+
+        Parameters
+        ----------
+        src : dict, str, array-like or any other source (see :meth:`.Batch.load`)
+            Volume ids and volumes (or just one volume) if `fmt='volume'`.
+        fmt : {'volume', 'blosc', 'csv', 'hdf5', 'feather'}
+            Format of the source.
+        dst : str, sequence
+            Components to load data to (`'images'` by default for volumes).
+        **kwargs
+            Other parameters of :meth:`_load_crops` or format-specific loaders.
+        """
+        if fmt == 'volume':
+            return self._load_crops(src, dst=dst or 'images', **kwargs)
+        return super().load(src=src, fmt=fmt, dst=dst, *args, **kwargs)
+
+    def _load_crops(self, src, dst='images', dtype=None, fill_value=0, cache=True):
+        """ Read crops from volumes into one array
+
+        Parameters
+        ----------
+        src : dict, str, :class:`~.volume.Volume` or array-like
+            Volume ids and volumes or just one volume for all crops.
+        dst : str
+            A component to load crops to.
+        dtype : np.dtype or None
+            A type of the array (by default, the type of the first volume).
+        fill_value : number
+            A value for crop elements outside volumes.
+        cache : bool or :class:`~.volume.ChunkCache`
+            A cache of chunks (True means the default per-process cache).
+        """
+        if not isinstance(self.index, CropIndex):
+            raise TypeError("Crops could be loaded only for batches with CropIndex", type(self.index))
+        cache = chunk_cache if cache is True else cache or None
+
+        volume_ids, origins, shapes = self.index.locate(self.indices)
+        if len(volume_ids) == 0:
+            setattr(self, dst, np.empty(0, dtype=dtype))
+            return self
+        if (shapes != shapes[0]).any():
+            raise ValueError("All crops in a batch should have the same shape")
+
+        volumes = {}
+        for volume_id in np.unique(volume_ids):
+            volumes[volume_id] = as_volume(src[volume_id] if isinstance(src, dict) else src)
+        if dtype is None:
+            dtype = volumes[volume_ids[0]].dtype
+
+        crops = np.full((len(self),) + tuple(shapes[0]), fill_value, dtype=dtype)
+        for i, (volume_id, origin) in enumerate(zip(volume_ids, origins)):
+            volumes[volume_id].read(origin, out=crops[i], cache=cache, fill_value=fill_value)
+        setattr(self, dst, crops)
+        return self
@@ -0,0 +1,105 @@
+""" Contains a batch class for sliding windows over series """
+import numpy as np
+try:
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    sliding_window_view = None
+
+from .batch import Batch
+from .components import BaseComponents
+from .dsindex import WindowIndex
+
+
+class WindowBatch(Batch):
+    """ Batch class for sliding windows over long series
+
+    The batch index should be a :class:`~.WindowIndex`. Windows are cut when data is loaded
+    (e.g. from `preloaded` data of a dataset), and series might be given as:
+
+    - an array with all series concatenated along the first axis (e.g. just one long series)
+    - a list or a tuple of arrays, one for each series
+    - a dict which maps series ids to arrays.
+
+    For series of shape `(length, ...)` the batch gets an array of shape `(batch_size, window, ...)`.
+    Windows are gathered from a strided view of each series in one vectorised operation,
+    so series data are never copied for each window.
+
+    Examples
+    --------
+    >>> index = WindowIndex(lengths=len(prices), window=64, stride=4)
+    >>> dataset = Dataset(index, WindowBatch, preloaded=prices)
+    >>> dataset.next_batch(32).data.shape
+    (32, 64, 5)
+
+    Each component gets windows from its own series::
+
+        class SignalsBatch(WindowBatch):
+            components = 'signals', 'targets'
+
+        dataset = Dataset(index, SignalsBatch, preloaded=(signals, targets))
+    """
+    def cut(self, data):
+        """ Cut windows of the batch from series
+
+        Parameters
+        ----------
+        data : np.ndarray, list, tuple or dict
+            series (see the class description)
+
+        Returns
+        -------
+        np.ndarray
+            windows of shape `(batch_size, window, ...)`
+        """
+        index = self.index
+        series, offsets = index.locate(self.indices, pos=True)
+
+        if isinstance(data, (list, tuple, dict)):
+            result = None
+            for item in np.unique(series):
+                mask = series == item
+                key = index.series[item] if isinstance(data, dict) else item
+                windows = self._take_windows(data[key], offsets[mask], index.window)
+                if result is None:
+                    result = np.empty((len(offsets),) + windows.shape[1:], dtype=windows.dtype)
+                result[mask] = windows
+            return result
+
+        starts = np.cumsum(index.lengths) - index.lengths
+        return self._take_windows(data, starts[series] + offsets, index.window)
+
+    @staticmethod
+    def _take_windows(data, offsets, window):
+        """ Return windows of one array which start at given offsets """
+        if not isinstance(data, np.ndarray):
+            # e.g. hdf5 or zarr arrays
+            return np.stack([data[offset : offset + window] for offset in offsets])
+        if sliding_window_view is None:
+            return data[offsets[:, None] + np.arange(window)]
+        # the view shares memory with data, so only the chosen windows are copied
+        windows = np.moveaxis(sliding_window_view(data, window, axis=0), -1, 1)
+        return windows[offsets]
+
+    @staticmethod
+    def _get_series(src, component, position):
+        if isinstance(src, BaseComponents):
+            return getattr(src, component)
+        if isinstance(src, dict):
+            return src[component]
+        return src[position]
+
+    def _load_from_source(self, dst, src):
+        """ Cut windows from series in memory """
+        if not isinstance(self.index, WindowIndex):
+            super()._load_from_source(dst, src)
+        elif dst is None:
+            if self.components is None:
+                self._data = self.cut(src)
+            else:
+                self._data = tuple(self.cut(self._get_series(src, comp, i)) for i, comp in enumerate(self.components))
+        else:
+            if isinstance(dst, str):
+                dst = (dst,)
+                src = (src,)
+            for i, comp in enumerate(dst):
+                setattr(self, comp, self.cut(self._get_series(src, comp, i)))
@@ -31,6 +31,8 @@ class BaseComponents:
     def __init__(self, components=None, data=None, indices=None, crop=False, copy=False, cast_to_array=True):
         self.components = components
         self._indices = indices
+        self._positions = None
+        self._sorter = None
         self.data = data
         self.cast_to_array = cast_to_array
         self._crop = crop
@@ -99,17 +101,48 @@ class BaseComponents:
     def __getitem__(self, item):
         if isinstance(item, slice):
             item = list(range(item.start, item.stop, item.step))
-        if self._indices is not None and item not in self._indices:
-            raise KeyError(item)
+        if self._indices is not None:
+            if is_iterable(item):
+                self.find_all_in_index(item)
+            else:
+                self.find_in_index(item)
         return type(self)(self.components, self, item, crop=False)
 
+    def _get_positions(self):
+        """ Return a dict which maps index items to their positions (the first ones for repeated items) """
+        if self._positions is None:
+            if not isinstance(self._indices, (list, np.ndarray)):
+                raise TypeError("Unknown index type: %s" % type(self._indices))
+            positions = {}
+            for pos, item in enumerate(self._indices):
+                positions.setdefault(item, pos)
+            self._positions = positions
+        return self._positions
+
     def find_in_index(self, item):
-        """ Return a posiition of an item in the index """
-        if isinstance(self._indices, list):
-            return self._indices.index(item)
-        if isinstance(self._indices, np.ndarray):
-            return np.where(self._indices == item)[0][0]
-        raise TypeError("Unknown index type: %s" % type(self._indices))
+        """ Return a position of an item in the index """
+        try:
+            return self._get_positions()[item]
+        except KeyError:
+            raise KeyError(item) from None
+
+    def find_all_in_index(self, items):
+        """ Return positions of items in the index """
+        indices = self._indices
+        if isinstance(indices, np.ndarray) and len(indices) > 0:
+            items = np.asarray(items)
+            kinds = indices.dtype.kind, items.dtype.kind
+            if kinds[0] == kinds[1] and kinds[0] in 'biuUS' or kinds[0] in 'iu' and kinds[1] in 'iu':
+                # a binary search is faster than dict lookups for long numpy arrays
+                if self._sorter is None:
+                    self._sorter = np.argsort(indices, kind='stable')
+                pos = np.searchsorted(indices, items, sorter=self._sorter)
+                positions = self._sorter[np.minimum(pos, len(indices) - 1)]
+                found = indices[positions] == items
+                if not found.all():
+                    raise KeyError(items[~found][0])
+                return positions
+        return [self.find_in_index(item) for item in items]
 
     def get_pos(self, component, indices):
         """ Return positions of given indices """
@@ -118,7 +151,7 @@ class BaseComponents:
             # a cropped numpy array needs a position as an index
             if isinstance(self.data[component], np.ndarray):
                 if is_iterable(indices):
-                    items = [self.find_in_index(i) for i in indices]
+                    items = self.find_all_in_index(indices)
                 else:
                     items = self.find_in_index(indices)
         return items
@@ -180,7 +213,10 @@ class BaseComponents:
             super().__setattr__(name, value)
 
     def __getstate__(self):
-        return self.__dict__
+        state = self.__dict__.copy()
+        state['_positions'] = None
+        state['_sorter'] = None
+        return state
 
     def __setstate__(self, d):
         self.__dict__.update(d)
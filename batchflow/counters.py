@@ -0,0 +1,173 @@
+""" Contains lightweight pipeline counters and their export """
+import os
+import time
+import threading
+
+
+# metric name -> (unit, label name, description)
+METRICS = dict(
+    eval_expr=('seconds', 'action', 'Time spent evaluating action arguments'),
+    action=('seconds', 'action', 'Time spent executing actions'),
+    batch=('seconds', None, 'Time spent executing all actions for a batch'),
+    batch_size=('items', None, 'Number of items in a batch'),
+    queue_wait=('seconds', 'queue', 'Time spent waiting on prefetch queues'),
+)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, _escape(value)) for name, value in labels.items()) + '}'
+
+
+class PipelineCounters:
+    """ Counts calls, total and maximum times of pipeline actions, queue waits and batch sizes
+
+    Times are measured with :func:`time.perf_counter_ns` and only a few integer additions are made per action,
+    so counters are always enabled.
+
+    Parameters
+    ----------
+    enabled : bool
+        whether to collect counters
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_lock')
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """ Remove all collected values """
+        self._values = {}
+        # action name -> [count, eval_expr sum, eval_expr max, action sum, action max]
+        self._actions = {}
+        self.start_time = time.time()
+
+    def add(self, metric, label, value):
+        """ Add a value (time in nanoseconds or a number of items) to a metric """
+        with self._lock:
+            item = self._values.get((metric, label))
+            if item is None:
+                self._values[metric, label] = [1, value, value]
+            else:
+                item[0] += 1
+                item[1] += value
+                if value > item[2]:
+                    item[2] = value
+
+    def add_action(self, name, eval_expr_time, exec_time):
+        """ Add argument evaluation and execution times (in nanoseconds) of an action """
+        with self._lock:
+            item = self._actions.get(name)
+            if item is None:
+                self._actions[name] = [1, eval_expr_time, eval_expr_time, exec_time, exec_time]
+            else:
+                item[0] += 1
+                item[1] += eval_expr_time
+                item[3] += exec_time
+                if eval_expr_time > item[2]:
+                    item[2] = eval_expr_time
+                if exec_time > item[4]:
+                    item[4] = exec_time
+
+    def add_batch(self, size, exec_time):
+        """ Add a batch size and the time (in nanoseconds) it took to execute the pipeline """
+        self.add('batch_size', None, size)
+        self.add('batch', None, exec_time)
+
+    def snapshot(self):
+        """ Return current values
+
+        Returns
+        -------
+        dict
+            metric name -> label (action name, queue name or None) -> dict with `count`, `sum`, `mean` and `max`.
+            Times are in seconds.
+        """
+        with self._lock:
+            values = {key: list(value) for key, value in self._values.items()}
+            for name, (count, eval_sum, eval_max, exec_sum, exec_max) in self._actions.items():
+                values['eval_expr', name] = count, eval_sum, eval_max
+                values['action', name] = count, exec_sum, exec_max
+
+        result = {}
+        for (metric, label), (count, total, max_value) in values.items():
+            if METRICS[metric][0] == 'seconds':
+                total, max_value = total / 1e9, max_value / 1e9
+            result.setdefault(metric, {})[label] = dict(count=count, sum=total, mean=total / count, max=max_value)
+        return result
+
+    def to_openmetrics(self, prefix='batchflow', labels=None):
+        """ Return current values in OpenMetrics text format
+
+        Each metric is exposed as a summary (with `_count` and `_sum` samples) and a gauge of maximum values
+        (e.g. `batchflow_action_seconds` and `batchflow_action_max_seconds`).
+
+        Parameters
+        ----------
+        prefix : str
+            a prefix of metric names
+        labels : dict
+            labels added to all samples (e.g. a job name)
+
+        Returns
+        -------
+        str
+        """
+        snapshot = self.snapshot()
+        labels = labels or {}
+        lines = []
+        for metric, (unit, label_name, description) in METRICS.items():
+            if metric not in snapshot:
+                continue
+            name = '{}_{}_{}'.format(prefix, metric, unit)
+            lines.append('# TYPE {} summary'.format(name))
+            lines.append('# UNIT {} {}'.format(name, unit))
+            lines.append('# HELP {} {}'.format(name, description))
+            samples = []
+            for label, values in snapshot[metric].items():
+                sample_labels = dict(labels, **({label_name: label} if label_name is not None else {}))
+                samples.append((_format_labels(sample_labels), values))
+            for suffix in ['count', 'sum']:
+                lines.extend('{}_{}{} {}'.format(name, suffix, label_str, repr(values[suffix]))
+                             for label_str, values in samples)
+            max_name = '{}_{}_max_{}'.format(prefix, metric, unit)
+            lines.append('# TYPE {} gauge'.format(max_name))
+            lines.append('# UNIT {} {}'.format(max_name, unit))
+            lines.append('# HELP {} {} (maximum)'.format(max_name, description))
+            lines.extend('{}{} {}'.format(max_name, label_str, repr(values['max'])) for label_str, values in samples)
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write_openmetrics(self, path, prefix='batchflow', labels=None):
+        """ Write current values into a file in OpenMetrics text format
+
+        The file is replaced atomically, so it can be read by a Prometheus textfile collector at any time.
+
+        Parameters
+        ----------
+        path : str
+            a file name
+        prefix : str
+            a prefix of metric names
+        labels : dict
+            labels added to all samples
+        """
+        text = self.to_openmetrics(prefix=prefix, labels=labels)
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as file:
+            file.write(text)
+        os.replace(tmp_path, path)
@@ -182,9 +182,11 @@ class Dataset(Baseset):
             -------
             bool
         """
+        if index1 is index2:
+            return True
         return (isinstance(index1, type(index2)) or isinstance(index2, type(index1))) and \
                index1.indices.shape == index2.indices.shape and \
-               np.all(index1.indices == index2.indices)
+               (index1.indices is index2.indices or np.all(index1.indices == index2.indices))
 
     def create_subset(self, index):
         """ Create a dataset based on the given subset of indices
@@ -204,11 +206,37 @@ class Dataset(Baseset):
                 that the index of new subset lies in the range of source dataset's index.
                 If the index lies out of the source dataset index's range, the IndexError is raised.
 
+            Notes
+            -----
+            Items are looked up in the positions of the dataset index, which are built once and reused.
+            If positions of items are known, :meth:`create_subset_by_pos` is faster.
         """
-        indices = index.indices if isinstance(index, DatasetIndex) else index
-        if not np.isin(indices, self.indices).all():
-            raise IndexError
-        return type(self).from_dataset(self, self.index.create_subset(index))
+        indices = index.indices if isinstance(index, DatasetIndex) else np.asarray(index)
+        try:
+            self.index.get_pos(indices)
+        except KeyError:
+            raise IndexError("Subset items are not in the dataset index") from None
+        subset = self.index.create_subset(index, check=False)
+        return type(self).from_dataset(self, subset)
+
+    def create_subset_by_pos(self, pos):
+        """ Create a dataset with items at given positions of the dataset index
+
+            Parameters
+            ----------
+            pos : slice or 1-d array-like of int
+                unique positions of items
+
+            Returns
+            -------
+            Dataset
+
+            Raises
+            ------
+            IndexError
+                If some positions are out of the index bounds.
+        """
+        return type(self).from_dataset(self, self.index.create_subset_by_pos(pos))
 
     def create_batch(self, index, pos=False, *args, **kwargs):
         """ Create a batch from given indices.
@@ -345,7 +373,7 @@ class Dataset(Baseset):
         order = self.index.shuffle(shuffle)
 
         if method == 'kfold':
-            splits = self._split_kfold(n_splits, order)
+            bounds = self._split_kfold(n_splits, order)
         else:
             raise ValueError("Unknown split method:", method)
 
@@ -355,28 +383,30 @@ class Dataset(Baseset):
         self.train.n_splits = self.n_splits
         self.test.n_splits = self.n_splits
 
+        # all folds are slices of one buffer with ordered items repeated twice:
+        # a test fold is followed by the rest of items which make a train fold
+        size = len(order)
+        items = self.index.subset_by_pos(np.asarray(order))
+        items = np.concatenate([items, items])
+
         for i in range(n_splits):
-            test_indices = splits[i]
-            train_splits = list(set(range(n_splits)) - {i})
-            train_indices = np.concatenate(np.asarray(splits)[train_splits])
+            start, stop = bounds[i], bounds[i + 1]
+            train_index = self.index.create_subset(items[stop : start + size], check=False)
+            test_index = self.index.create_subset(items[start:stop], check=False)
 
             setattr(self, 'cv'+str(i), self.copy())
             cv_dataset = getattr(self, 'cv'+str(i))
-            cv_dataset.train = self.create_subset(train_indices)
-            cv_dataset.test = self.create_subset(test_indices)
+            cv_dataset.train = type(self).from_dataset(self, train_index)
+            cv_dataset.test = type(self).from_dataset(self, test_index)
             setattr(self.train, 'cv'+str(i), cv_dataset.train)
             setattr(self.test, 'cv'+str(i), cv_dataset.test)
 
-    def _split_kfold(self, n_splits, order):
-        split_sizes = np.full(n_splits, len(order) // n_splits, dtype=np.int)
+    @staticmethod
+    def _split_kfold(n_splits, order):
+        """ Return bounds of folds in the order """
+        split_sizes = np.full(n_splits, len(order) // n_splits, dtype=np.intp)
         split_sizes[:len(order) % n_splits] += 1
-        current = 0
-        splits = []
-        for split_size in split_sizes:
-            start, stop = current, current + split_size
-            splits.append(self.indices[order[start:stop]])
-            current = stop
-        return splits
+        return np.concatenate([[0], np.cumsum(split_sizes)])
 
     def __getstate__(self):
         return self.__dict__
@@ -1,5 +1,5 @@
 """ Pipeline decorators """
-import os
+import time
 import traceback
 import threading
 import concurrent.futures as cf
@@ -7,21 +7,73 @@ import asyncio
 import functools
 import logging
 import inspect
+import numbers
 try:
     from numba import jit
 except ImportError:
     jit = None
 
 from .named_expr import P
+from .pools import WorkerPool, get_pools
+from .tracing import get_tracer, acquire_lock
 
 
-def _workers_count():
-    cpu_count = 0
-    try:
-        cpu_count = len(os.sched_getaffinity(0))
-    except AttributeError:
-        cpu_count = os.cpu_count()
-    return cpu_count * 4
+# methods which have been reported to run without nogil
+_NOT_NOGIL_WARNED = set()
+
+
+def _get_pool(self, target, n_workers=None):
+    """ Return a shared pool of the batch pipeline (or a process-wide one) and whether it is a private pool
+
+    A nested parallel call from a worker of the same pool might exhaust the pool and hang,
+    so a private short-lived pool is returned instead.
+    """
+    pool = get_pools(self).get(target, n_workers)
+    if pool.in_worker():
+        return WorkerPool(pool.name, kind=pool.kind, max_workers=pool.max_workers), True
+    return pool, False
+
+
+def _get_chunk_size(n_items, n_workers, chunk_size='auto', n_chunks=None):
+    """ Return a number of items to be processed by a worker in one task
+
+    When `chunk_size` is 'auto', small batches are submitted item by item,
+    while large batches are split into approximately 4 chunks per worker to amortise dispatch overhead
+    while keeping workers evenly loaded.
+    """
+    if n_chunks is not None:
+        if n_chunks < 1:
+            raise ValueError("n_chunks should be a positive number", n_chunks)
+        return max(1, -(-n_items // n_chunks))
+    if chunk_size is None or chunk_size == 'auto':
+        return max(1, n_items // (n_workers * 4))
+    if chunk_size < 1:
+        raise ValueError("chunk_size should be a positive number or 'auto'", chunk_size)
+    return chunk_size
+
+
+def _is_nogil(func):
+    """ Check whether a function is compiled with numba and releases GIL """
+    if getattr(func, 'nogil', False):
+        return True
+    return jit is not None and bool(getattr(func, 'targetoptions', {}).get('nogil'))
+
+
+def _run_chunk(method, calls):
+    """ Call a method for each (args, kwargs) pair and collect results or exceptions """
+    tracer = get_tracer()
+    if tracer is not None:
+        start_ns = time.perf_counter_ns()
+    results = []
+    for margs, mkwargs in calls:
+        try:
+            result = method(*margs, **mkwargs)
+        except Exception as e:   # pylint: disable=broad-except
+            result = e
+        results.append(result)
+    if tracer is not None:
+        tracer.add(getattr(method, '__name__', str(method)), 'parallel', start_ns, n_items=len(calls))
+    return results
 
 
 def _make_action_wrapper_with_args(use_lock=None):    # pylint: disable=redefined-outer-name
@@ -39,7 +91,7 @@ def _make_action_wrapper(action_method, _use_lock=None):
                     _lock_name = _use_lock
                 if not action_self.pipeline.has_variable(_lock_name):
                     action_self.pipeline.init_variable(_lock_name, threading.Lock())
-                action_self.pipeline.get_variable(_lock_name).acquire()
+                acquire_lock(action_self.pipeline.get_variable(_lock_name), _lock_name)
 
         _res = action_method(action_self, *args, **kwargs)
 
@@ -123,10 +175,35 @@ def any_action_failed(results):
     """ Return `True` if some parallelized invocations threw exceptions """
     return any(isinstance(res, Exception) for res in results)
 
-def inbatch_parallel(init, post=None, target='threads', _use_self=None, **dec_kwargs):
-    """ Decorator for parallel methods in :class:`~batchflow.Batch` classes"""
+def inbatch_parallel(init, post=None, target='threads', _use_self=None, _mask=None, **dec_kwargs):
+    """ Decorator for parallel methods in :class:`~batchflow.Batch` classes
+
+    Parameters
+    ----------
+    init : str or callable
+        a method or a function which returns a sequence of items to be processed in parallel
+    post : str or callable
+        a method or a function which gets a list of all results
+    target : str
+        a parallelization engine: 'threads', 'nogil', 'mpc', 'async' or 'for'.
+        'nogil' runs a method compiled with :func:`~batchflow.mjit` (or `numba.jit(nogil=True)`)
+        in a pool with one thread per CPU. Not compiled methods are run with 'threads'.
+    chunk_size : int or 'auto'
+        a number of items which are sent to a worker at once ('threads' and 'mpc' targets only).
+        Might be also passed in each call.
+    n_chunks : int
+        a number of chunks to split the items into (takes precedence over `chunk_size`).
+        Might be also passed in each call.
+    _mask : str
+        a name of a per-item argument (passed as :class:`~batchflow.P`). Items where it equals 0
+        are not dispatched to workers and passed to `post` as is.
+
+    All other arguments are passed to `init` and `post`.
+    """
     if target not in ['nogil', 'threads', 'mpc', 'async', 'for', 't', 'm', 'a', 'f']:
-        raise ValueError("target should be one of 'threads', 'mpc', 'async', 'for'")
+        raise ValueError("target should be one of 'threads', 'nogil', 'mpc', 'async', 'for'")
+    dec_chunk_size = dec_kwargs.pop('chunk_size', 'auto')
+    dec_n_chunks = dec_kwargs.pop('n_chunks', None)
 
     def inbatch_parallel_decorator(method):
         """ Return a decorator which run a method in parallel """
@@ -249,44 +326,105 @@ def inbatch_parallel(init, post=None, target='threads', _use_self=None, **dec_kw
 
             return margs, mkwargs
 
+        def _is_masked(mkwargs):
+            value = mkwargs.get(_mask)
+            return isinstance(value, numbers.Number) and value == 0
+
+        def _run_in_pool(pool, func, calls, kwargs, default_n_chunks=None):
+            """ Submit calls in chunks, wait for them and return results in the original order """
+            chunk_size = kwargs.pop('chunk_size', dec_chunk_size)
+            n_chunks = kwargs.pop('n_chunks', dec_n_chunks)
+            if n_chunks is None and chunk_size in [None, 'auto']:
+                n_chunks = default_n_chunks
+
+            all_results = [None] * len(calls)
+            positions = []
+            for i, (margs, mkwargs) in enumerate(calls):
+                if _mask is not None and _is_masked(mkwargs):
+                    all_results[i] = margs[1] if use_self else margs[0]
+                else:
+                    positions.append(i)
+
+            chunk_size = _get_chunk_size(len(positions), pool.max_workers, chunk_size, n_chunks)
+            chunks = [positions[i:i + chunk_size] for i in range(0, len(positions), chunk_size)]
+            futures = [pool.submit(_run_chunk, func, [calls[i] for i in chunk]) for chunk in chunks]
+
+            timeout = kwargs.get('timeout', None)
+            cf.wait(futures, timeout=timeout, return_when=cf.ALL_COMPLETED)
+
+            for chunk, future in zip(chunks, futures):
+                try:
+                    results = future.result()
+                except Exception as exce:  # pylint: disable=broad-except
+                    results = [exce] * len(chunk)
+                for i, result in zip(chunk, results):
+                    all_results[i] = result
+            return all_results
+
         def wrap_with_threads(self, args, kwargs):
             """ Run a method in parallel """
             init_fn, post_fn = _check_functions(self)
 
-            n_workers = kwargs.pop('n_workers', _workers_count())
-            with cf.ThreadPoolExecutor(max_workers=n_workers) as executor:
-                futures = []
+            pool, private = _get_pool(self, 'threads', kwargs.pop('n_workers', None))
+            chunking = {k: kwargs.pop(k) for k in ['chunk_size', 'n_chunks'] if k in kwargs}
+            try:
                 args, kwargs, params = _prepare_args(self, args, kwargs)
                 full_kwargs = {**dec_kwargs, **kwargs}
-                for iteration, arg in enumerate(_call_init_fn(init_fn, args, full_kwargs)):
-                    margs, mkwargs = _make_args(self, iteration, arg, args, kwargs, params)
-                    one_ft = executor.submit(method, *margs, **mkwargs)
-                    futures.append(one_ft)
+                calls = [_make_args(self, iteration, arg, args, kwargs, params)
+                         for iteration, arg in enumerate(_call_init_fn(init_fn, args, full_kwargs))]
+                all_results = _run_in_pool(pool, method, calls, {**kwargs, **chunking})
+            finally:
+                if private:
+                    pool.shutdown()
+
+            return _call_post_fn(self, post_fn, all_results, args, full_kwargs)
+
+        def wrap_with_nogil(self, args, kwargs):
+            """ Run a numba-compiled method in threads without GIL """
+            if not _is_nogil(method):
+                name = getattr(method, '__qualname__', method.__name__)
+                if name not in _NOT_NOGIL_WARNED:
+                    _NOT_NOGIL_WARNED.add(name)
+                    logging.warning("%s is not compiled with numba nogil=True, so it is run with target='threads'",
+                                    name)
+                return wrap_with_threads(self, args, kwargs)
 
-                timeout = kwargs.get('timeout', None)
-                cf.wait(futures, timeout=timeout, return_when=cf.ALL_COMPLETED)
+            init_fn, post_fn = _check_functions(self)
 
-            return _call_post_fn(self, post_fn, futures, args, full_kwargs)
+            pool, private = _get_pool(self, 'nogil', kwargs.pop('n_workers', None))
+            chunking = {k: kwargs.pop(k) for k in ['chunk_size', 'n_chunks'] if k in kwargs}
+            try:
+                args, kwargs, params = _prepare_args(self, args, kwargs)
+                full_kwargs = {**dec_kwargs, **kwargs}
+                calls = [_make_args(self, iteration, arg, args, kwargs, params)
+                         for iteration, arg in enumerate(_call_init_fn(init_fn, args, full_kwargs))]
+                # compiled code does not hold GIL, so one chunk per worker keeps all cores busy
+                all_results = _run_in_pool(pool, method, calls, {**kwargs, **chunking},
+                                           default_n_chunks=pool.max_workers)
+            finally:
+                if private:
+                    pool.shutdown()
+
+            return _call_post_fn(self, post_fn, all_results, args, full_kwargs)
 
         def wrap_with_mpc(self, args, kwargs):
             """ Run a method in parallel """
             init_fn, post_fn = _check_functions(self)
 
-            n_workers = kwargs.pop('n_workers', _workers_count())
-            with cf.ProcessPoolExecutor(max_workers=n_workers) as executor:
-                futures = []
+            pool, private = _get_pool(self, 'mpc', kwargs.pop('n_workers', None))
+            chunking = {k: kwargs.pop(k) for k in ['chunk_size', 'n_chunks'] if k in kwargs}
+            try:
                 mpc_func = method(self, *args, **kwargs)
                 args, kwargs, params = _prepare_args(self, args, kwargs)
                 full_kwargs = {**dec_kwargs, **kwargs}
-                for iteration, arg in enumerate(_call_init_fn(init_fn, args, full_kwargs)):
-                    margs, mkwargs = _make_args(None, iteration, arg, args, kwargs, params)
-                    one_ft = executor.submit(mpc_func, *margs, **mkwargs)
-                    futures.append(one_ft)
-
-                timeout = kwargs.pop('timeout', None)
-                cf.wait(futures, timeout=timeout, return_when=cf.ALL_COMPLETED)
+                calls = [_make_args(None, iteration, arg, args, kwargs, params)
+                         for iteration, arg in enumerate(_call_init_fn(init_fn, args, full_kwargs))]
+                all_results = _run_in_pool(pool, mpc_func, calls, {**kwargs, **chunking})
+            finally:
+                if private:
+                    pool.shutdown()
 
-            return _call_post_fn(self, post_fn, futures, args, full_kwargs)
+            return _call_post_fn(self, post_fn, all_results, args, full_kwargs)
 
         async def wait_for_all(futures, loop):
             """ Wait for all futures to complete """
@@ -331,7 +469,7 @@ def inbatch_parallel(init, post=None, target='threads', _use_self=None, **dec_kw
         def wrap_with_for(self, args, kwargs):
             """ Run a method sequentially (without parallelism) """
             init_fn, post_fn = _check_functions(self)
-            _ = kwargs.pop('n_workers', _workers_count())
+            _ = kwargs.pop('n_workers', None), kwargs.pop('chunk_size', None), kwargs.pop('n_chunks', None)
             futures = []
             args, kwargs, params = _prepare_args(self, args, kwargs)
             full_kwargs = {**dec_kwargs, **kwargs}
@@ -365,6 +503,8 @@ def inbatch_parallel(init, post=None, target='threads', _use_self=None, **dec_kw
                 x = wrap_with_async(self, args, kwargs)
             elif _target in ['threads', 't']:
                 x = wrap_with_threads(self, args, kwargs)
+            elif _target == 'nogil':
+                x = wrap_with_nogil(self, args, kwargs)
             elif _target in ['mpc', 'm']:
                 x = wrap_with_mpc(self, args, kwargs)
             elif _target in ['for', 'f']:
@@ -417,6 +557,8 @@ def mjit(*args, nopython=True, nogil=True, **kwargs):
         def _wrapped_method(self, *args, **kwargs):
             _ = self
             return func(None, *args, **kwargs)
+        _wrapped_method.kernel = func
+        _wrapped_method.nogil = jit is not None and nogil
         return _wrapped_method
 
     if len(args) == 1 and (callable(args[0])) and len(kwargs) == 0:
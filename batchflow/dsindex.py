@@ -1,13 +1,17 @@
 """ DatasetIndex """
 import os
 import math
-import glob
 from collections.abc import Iterable
 import warnings
 import numpy as np
 
 from .base import Baseset
 from .notifier import Notifier
+from .positions import make_positions
+from .path_store import PathStore
+from .batch_sampler import BatchSampler, BucketSampler
+from .ordering import RangeOrder, BlockPermutation, BlockShuffle, draw_seed
+from .scanner import scan
 
 
 class DatasetIndex(Baseset):
@@ -26,10 +30,19 @@ class DatasetIndex(Baseset):
     >>> index.split([0.8, 0.2])
 
     >>> item_pos = index.get_pos(item_id)
+
+    Attributes
+    ----------
+    pos_backend : str, class or None
+        A structure to look up item positions ('range', 'sorted', 'hash', 'dict'
+        or a subclass of :class:`~.positions.BasePositions`).
+        If None, it is chosen by the type and the size of the index. See :func:`~.positions.make_positions`.
     """
+    pos_backend = None
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._pos = self.build_pos()
+        self._pos_map = None
         self._random_state = None
 
     @classmethod
@@ -60,7 +73,7 @@ class DatasetIndex(Baseset):
         return self.concat(self, other)
 
     @staticmethod
-    def build_index(index):
+    def build_index(index, check=True):
         """ Check index type and structure.
 
         Parameters
@@ -77,6 +90,10 @@ class DatasetIndex(Baseset):
             - callable
                 Content is return of given function (should be 1-d array-like).
 
+        check : bool
+            Whether to check that all items are unique.
+            Might be skipped for subsets of an already checked index.
+
         Raises
         ------
         TypeError
@@ -112,16 +129,23 @@ class DatasetIndex(Baseset):
         if len(_index.shape) > 1:
             raise TypeError("Index should be 1-dimensional")
 
-        if len(np.unique(_index)) != len(_index):
+        if check and len(np.unique(_index)) != len(_index):
             warnings.warn("Index contains non-unique elements")
 
         return _index
 
     def build_pos(self):
-        """ Create a dictionary with positions in the index. """
+        """ Create a structure to look up positions in the index. """
         if self.indices is None:
             return dict()
-        return dict(zip(self.indices, np.arange(len(self))))
+        return make_positions(self.indices, self.pos_backend)
+
+    @property
+    def _pos(self):
+        """ :class:`~.positions.BasePositions` : positions of items in the index, built on the first use """
+        if self._pos_map is None:
+            self._pos_map = self.build_pos()
+        return self._pos_map
 
     def get_pos(self, index):
         """ Return position of an item in the index.
@@ -156,7 +180,9 @@ class DatasetIndex(Baseset):
         elif isinstance(index, str):
             pos = self._pos[index]
         elif isinstance(index, Iterable):
-            pos = np.asarray([self._pos[ix] for ix in index])
+            if not isinstance(index, (np.ndarray, list, tuple)):
+                index = list(index)
+            pos = self._pos.get_many(index)
         else:
             pos = self._pos[index]
         return pos
@@ -176,9 +202,48 @@ class DatasetIndex(Baseset):
         """
         return self.index[pos]
 
-    def create_subset(self, index):
-        """ Return a new index object based on the subset of indices given. """
-        return type(self)(index)
+    def create_subset_by_pos(self, pos):
+        """ Return a new index object with items at given positions.
+
+        Positions are only checked to be within the index bounds, so it takes O(k) for k positions,
+        and a slice gives a subset which shares memory with this index.
+
+        Parameters
+        ----------
+        pos : slice or 1-d array-like of int
+            Positions of items in this index (they should be unique).
+
+        Raises
+        ------
+        IndexError
+            If some positions are out of the index bounds.
+        """
+        if not isinstance(pos, slice):
+            pos = np.asarray(pos)
+            if pos.dtype == bool:
+                pos = np.flatnonzero(pos)
+            if pos.dtype.kind not in 'iu':
+                raise TypeError("Positions should be integers", pos.dtype)
+            if len(pos) > 0 and (pos.min() < 0 or pos.max() >= len(self)):
+                raise IndexError("Positions are out of the index bounds")
+        return self.create_subset(self.subset_by_pos(pos), check=False)
+
+    def create_subset(self, index, check=True):
+        """ Return a new index object based on the subset of indices given.
+
+        Parameters
+        ----------
+        index : 1-d array-like or DatasetIndex
+            Items of the subset.
+
+        check : bool
+            Whether to check items uniqueness. Subsets taken by positions from this index do not need this.
+
+        Notes
+        -----
+        Child classes which override this method or :meth:`build_index` should accept `check` argument too.
+        """
+        return type(self)(index, check=check)
 
     def split(self, shares=0.8, shuffle=False):
         """ Split index into train, test and validation subsets.
@@ -192,7 +257,7 @@ class DatasetIndex(Baseset):
         shares : float or tuple of floats
             train, test and validation shares.
 
-        shuffle : bool, int, class:`numpy.random.RandomState` or callable
+        shuffle : bool, int, str, class:`numpy.random.RandomState` or callable
             specifies the order of items, could be:
 
             - bool - if `False`, items go sequentionally, one after another as they appear in the index.
@@ -205,6 +270,8 @@ class DatasetIndex(Baseset):
             - callable - a function which takes an array of item indices in the initial order
                 (as they appear in the index) and returns the order of items.
 
+            - 'block' - a locality-aware shuffle with default parameters (see :class:`~.ordering.BlockShuffle`).
+
         Notes
         -----
         If tuple of 3 floats is passed, then validation subset is always present.
@@ -238,20 +305,20 @@ class DatasetIndex(Baseset):
         # pylint: disable=attribute-defined-outside-init
         if valid_share > 0:
             validation_pos = order[:valid_share]
-            self.validation = self.create_subset(self.subset_by_pos(validation_pos))
+            self.validation = self.create_subset_by_pos(validation_pos)
         if test_share > 0:
             test_pos = order[valid_share : valid_share + test_share]
-            self.test = self.create_subset(self.subset_by_pos(test_pos))
+            self.test = self.create_subset_by_pos(test_pos)
         if train_share > 0:
             train_pos = order[valid_share + test_share:]
-            self.train = self.create_subset(self.subset_by_pos(train_pos))
+            self.train = self.create_subset_by_pos(train_pos)
 
     def shuffle(self, shuffle, iter_params=None):
         """ Permute indices
 
         Parameters
         ----------
-        shuffle : bool, int, class:`numpy.random.RandomState` or callable
+        shuffle : bool, int, str, class:`numpy.random.RandomState` or callable
             specifies the order of items, could be:
 
             - bool - if `False`, items go sequentionally, one after another as they appear in the index.
@@ -264,6 +331,8 @@ class DatasetIndex(Baseset):
             - callable - a function which takes an array of item indices in the initial order
                 (as they appear in the index) and returns the order of items.
 
+            - 'block' - a locality-aware shuffle with default parameters (see :class:`~.ordering.BlockShuffle`).
+
         Returns
         -------
         ndarray
@@ -277,6 +346,9 @@ class DatasetIndex(Baseset):
         else:
             order = iter_params['_order']
 
+        if isinstance(shuffle, str) and shuffle == 'block':
+            shuffle = BlockShuffle()
+
         if isinstance(shuffle, bool):
             if shuffle:
                 order = np.random.permutation(order)
@@ -291,7 +363,7 @@ class DatasetIndex(Baseset):
         elif callable(shuffle):
             order = shuffle(self.indices)
         else:
-            raise ValueError("shuffle could be bool, int, numpy.random.RandomState or callable", shuffle)
+            raise ValueError("shuffle could be bool, int, 'block', numpy.random.RandomState or callable", shuffle)
         return order
 
     def next_batch(self, batch_size, shuffle=False, n_iters=None, n_epochs=None, drop_last=False, iter_params=None):
@@ -302,7 +374,7 @@ class DatasetIndex(Baseset):
         batch_size : int
             Desired number of items in the batch (the actual batch could contain fewer items)
 
-        shuffle : bool, int, class:`numpy.random.RandomState` or callable
+        shuffle : bool, int, str, class:`numpy.random.RandomState`, callable, BatchSampler or BucketSampler
             Specifies the order of items, could be:
 
             - bool
@@ -319,6 +391,18 @@ class DatasetIndex(Baseset):
                 A function which takes an array of item indices in the initial order
                 (as they appear in the index) and returns the order of items.
 
+            - 'block'
+                A locality-aware shuffle: blocks of contiguous items are shuffled, and then items
+                are shuffled within a sliding window of a few blocks (see :class:`~.ordering.BlockShuffle`).
+
+            - :class:`~.batch_sampler.BatchSampler` instance
+                Items for each batch are drawn by the sampler, e.g. with weights (:class:`~.WeightedSampler`)
+                or with fixed class shares (:class:`~.BalancedSampler`). An epoch consists of `epoch_size`
+                drawn items of the sampler (by default, the index length).
+
+            - :class:`~.batch_sampler.BucketSampler` instance
+                Batches of items of similar sizes planned for each epoch.
+
         n_iters : int
             Number of iterations to make (only one of `n_iters` and `n_epochs` should be specified).
 
@@ -373,6 +457,11 @@ class DatasetIndex(Baseset):
                 iter_params['notifier'].close()
             raise StopIteration("Dataset is over. No more batches left.")
 
+        if isinstance(shuffle, BucketSampler):
+            return self._next_bucket_batch(shuffle, batch_size, n_iters, n_epochs, drop_last, iter_params)
+        if isinstance(shuffle, BatchSampler):
+            return self._next_sampled_batch(shuffle, batch_size, n_iters, n_epochs, drop_last, iter_params)
+
         if iter_params['_order'] is None:
             iter_params['_order'] = self.shuffle(shuffle, iter_params)
         num_items = len(iter_params['_order'])
@@ -411,6 +500,57 @@ class DatasetIndex(Baseset):
         iter_params['_start_index'] += rest_of_batch
         return self.create_batch(batch_items, pos=True)
 
+    def _next_sampled_batch(self, sampler, batch_size, n_iters, n_epochs, drop_last, iter_params):
+        """ Return the next batch with items drawn by a sampler """
+        if iter_params['_n_iters'] == 0:
+            sampler.setup(self)
+        epoch_size = sampler.epoch_size or len(self)
+        if drop_last and batch_size > epoch_size:
+            raise ValueError("Batch size cannot be larger than the epoch size.")
+
+        size = batch_size
+        if n_epochs is not None and not drop_last:
+            # the very last batch contains only the rest of the last epoch
+            size = min(size, (n_epochs - iter_params['_n_epochs']) * epoch_size - iter_params['_start_index'])
+
+        if n_iters is not None and iter_params['_n_iters'] >= n_iters or \
+           n_epochs is not None and (iter_params['_n_epochs'] >= n_epochs or size <= 0):
+            if 'notifier' in iter_params:
+                iter_params['notifier'].close()
+            raise StopIteration("Dataset is over. No more batches left.")
+
+        positions = sampler.sample(size)
+
+        iter_params['_n_iters'] += 1
+        passed_epochs, iter_params['_start_index'] = divmod(iter_params['_start_index'] + size, epoch_size)
+        iter_params['_n_epochs'] += passed_epochs
+        if drop_last and iter_params['_start_index'] + batch_size > epoch_size:
+            # the rest of the epoch is dropped
+            iter_params['_start_index'] = 0
+            iter_params['_n_epochs'] += 1
+        return self.create_batch(positions, pos=True)
+
+    def _next_bucket_batch(self, sampler, batch_size, n_iters, n_epochs, drop_last, iter_params):
+        """ Return the next batch of items of similar sizes """
+        if n_iters is not None and iter_params['_n_iters'] >= n_iters or \
+           n_epochs is not None and iter_params['_n_epochs'] >= n_epochs:
+            if 'notifier' in iter_params:
+                iter_params['notifier'].close()
+            raise StopIteration("Dataset is over. No more batches left.")
+
+        if iter_params['_order'] is None:
+            sampler.setup(self)
+            iter_params['_order'] = sampler.plan_epoch(batch_size, drop_last)
+        positions = iter_params['_order'][iter_params['_start_index']]
+
+        iter_params['_n_iters'] += 1
+        iter_params['_start_index'] += 1
+        if iter_params['_start_index'] == len(iter_params['_order']):
+            iter_params['_order'] = None
+            iter_params['_start_index'] = 0
+            iter_params['_n_epochs'] += 1
+        return self.create_batch(positions, pos=True)
+
     def gen_batch(self, batch_size, shuffle=False, n_iters=None, n_epochs=None, drop_last=False, notifier=False,
                   iter_params=None):
         """ Generate batches
@@ -420,7 +560,7 @@ class DatasetIndex(Baseset):
         batch_size : int
             Desired number of items in the batch (the actual batch could contain fewer items).
 
-        shuffle : bool, int, class:`numpy.random.RandomState` or callable
+        shuffle : bool, int, str, class:`numpy.random.RandomState`, callable, BatchSampler or BucketSampler
             Specifies the order of items, could be:
 
             - bool
@@ -437,6 +577,18 @@ class DatasetIndex(Baseset):
                 A function which takes an array of item indices in the initial order
                 (as they appear in the index) and returns the order of items.
 
+            - 'block'
+                A locality-aware shuffle: blocks of contiguous items are shuffled, and then items
+                are shuffled within a sliding window of a few blocks (see :class:`~.ordering.BlockShuffle`).
+
+            - :class:`~.batch_sampler.BatchSampler` instance
+                Items for each batch are drawn by the sampler, e.g. with weights (:class:`~.WeightedSampler`)
+                or with fixed class shares (:class:`~.BalancedSampler`). An epoch consists of `epoch_size`
+                drawn items of the sampler (by default, the index length).
+
+            - :class:`~.batch_sampler.BucketSampler` instance
+                Batches of items of similar sizes planned for each epoch.
+
         n_iters : int
             Number of iterations to make (only one of `n_iters` and `n_epochs` should be specified).
 
@@ -484,14 +636,21 @@ class DatasetIndex(Baseset):
         """
         iter_params = iter_params or self.get_default_iter_params()
 
+        epoch_size = len(self)
+        if isinstance(shuffle, BatchSampler):
+            epoch_size = shuffle.epoch_size or epoch_size
+
         if n_iters is not None:
             total = n_iters
         elif n_epochs is None:
             total = None
+        elif isinstance(shuffle, BucketSampler):
+            shuffle.setup(self)
+            total = shuffle.get_n_batches(batch_size, drop_last) * n_epochs
         elif drop_last:
-            total = len(self) // batch_size * n_epochs
+            total = epoch_size // batch_size * n_epochs
         else:
-            total = math.ceil(len(self) * n_epochs / batch_size)
+            total = math.ceil(epoch_size * n_epochs / batch_size)
         iter_params.update({'_total': total})
 
         if notifier:
@@ -559,7 +718,7 @@ class DatasetIndex(Baseset):
         else:
             batch = _index
         if not as_array:
-            batch = self.create_subset(batch)
+            batch = self.create_subset(batch, check=not pos)
         return batch
 
 
@@ -596,12 +755,24 @@ class FilesIndex(DatasetIndex):
     """
     def __init__(self, *args, **kwargs):
         self._paths = None
+        self._own_paths = None
         self.dirs = False
         super().__init__(*args, **kwargs)
 
     @property
     def paths(self):
-        return self._paths
+        """ :class:`~.PathStore` : a mapping from items of the index to their full paths
+
+        Subsets look up paths in the store of the parent index,
+        while their own store is taken from it on the first access.
+        """
+        if self._own_paths is None:
+            store = self._paths
+            if store is None or len(store) == len(self) and np.array_equal(store.index, self.indices):
+                self._own_paths = store
+            else:
+                self._own_paths = store.take(store.positions.get_many(self.indices))
+        return self._own_paths
 
     @classmethod
     def concat(cls, *index_list):
@@ -618,38 +789,61 @@ class FilesIndex(DatasetIndex):
         DatasetIndex
             Contains one common index.
         """
-        paths = {}
-        for index in index_list:
-            paths.update(index.paths)
+        paths = PathStore.concat(*[index.paths for index in index_list])
         return type(index_list[0])(index=np.concatenate([i.index for i in index_list]), paths=paths)
 
     def build_index(self, index=None, path=None, *args, **kwargs):
         """ Build index from a path string or an index given. """
         if path is None:
-            _index = self.build_from_index(index, *args, **kwargs)
-        else:
-            _index = self.build_from_path(path, *args, **kwargs)
+            return self.build_from_index(index, *args, **kwargs)
+        return self.build_from_path(path, *args, **kwargs)
 
-        if len(_index) != len(self._paths):
-            raise ValueError("Index contains non-unique elements, which leads to path collision")
-        return _index
+    def build_from_index(self, index, paths, dirs=None, check=True):
+        """ Build index from another index for indices given.
+
+        Parameters
+        ----------
+        index : 1-d array-like or DatasetIndex
+            Index items.
 
-    def build_from_index(self, index, paths, dirs=None):
-        """ Build index from another index for indices given. """
+        paths : PathStore, dict or sequence
+            Full paths: a store of the parent index (which is shared, not copied), a mapping from items to paths
+            or a sequence of paths for each item.
+
+        dirs : bool
+            Whether items are directories.
+
+        check : bool
+            Whether to check items uniqueness and, if `paths` is a store of the parent index, their presence in it.
+
+        Raises
+        ------
+        KeyError
+            If some items have no paths.
+        """
         if isinstance(index, DatasetIndex):
             index = index.indices
         else:
-            index = DatasetIndex(index).indices
-
-        if isinstance(paths, dict):
-            self._paths = dict((file, paths[file]) for file in index)
+            index = DatasetIndex.build_index(index, check=check)
+
+        if isinstance(paths, PathStore):
+            if check:
+                paths.positions.get_many(index)
+            self._paths = paths
+        elif isinstance(paths, dict):
+            self._paths = PathStore.from_dict(paths, keys=index)
         else:
-            self._paths = dict((file, paths[pos]) for pos, file in np.ndenumerate(index))
+            self._paths = PathStore(index, paths)
         self.dirs = dirs
         return index
 
-    def build_from_path(self, path, dirs=False, no_ext=False, sort=False):
-        """ Build index from a path/glob or a sequence of paths/globs. """
+    def build_from_path(self, path, dirs=False, no_ext=False, sort=False, n_workers=None, cache=None):
+        """ Build index from a path/glob or a sequence of paths/globs.
+
+        Directories are scanned in parallel with `n_workers` threads. If `cache` directory is given,
+        scan results are saved there and reused until any of scanned directories is modified
+        (see :func:`~.scanner.scan`).
+        """
         if isinstance(path, str):
             paths = [path]
         else:
@@ -659,36 +853,37 @@ class FilesIndex(DatasetIndex):
             raise ValueError("`path` cannot be empty. Got '{}'.".format(path))
 
         _all_index = []
-        _all_paths = dict()
+        _all_paths = []
         for one_path in paths:
-            _index, _paths = self.build_from_one_path(one_path, dirs, no_ext)
+            _index, _paths = self.build_from_one_path(one_path, dirs, no_ext, n_workers=n_workers, cache=cache)
             _all_index.append(_index)
-            _all_paths.update(_paths)
+            _all_paths.append(_paths)
 
-        _all_index = np.ravel(_all_index)
+        _all_index = np.concatenate(_all_index)
+        _all_paths = np.concatenate(_all_paths)
+        if len(np.unique(_all_index)) != len(_all_index):
+            raise ValueError("Index contains non-unique elements, which leads to path collision")
 
+        self._paths = PathStore(_all_index, _all_paths)
         if sort:
-            _all_index.sort()
-        self._paths = _all_paths
+            self._paths = self._paths.take(np.argsort(_all_index, kind='stable'))
         self.dirs = dirs
 
-        return _all_index
+        return self._paths.index
 
-    def build_from_one_path(self, path, dirs=False, no_ext=False):
+    def build_from_one_path(self, path, dirs=False, no_ext=False, n_workers=None, cache=None):
         """ Build index from a path/glob. """
         if not isinstance(path, str):
             raise TypeError('Each path must be a string, instead got {}'.format(path))
 
-        check_fn = os.path.isdir if dirs else os.path.isfile
-        pathlist = glob.iglob(path, recursive=True)
-        _full_index = np.asarray([self.build_key(fname, no_ext) for fname in pathlist if check_fn(fname)])
+        pathlist = scan(path, dirs=dirs, n_workers=n_workers, cache=cache)
+        _full_index = np.asarray([self.build_key(fname, no_ext) for fname in pathlist])
         if len(_full_index):
             _index = _full_index[:, 0]
             _paths = _full_index[:, 1]
         else:
             warnings.warn("No items to index in %s" % path)
-            _index, _paths = np.empty(0), np.empty(0)
-        _paths = dict(zip(_index, _paths))
+            _index, _paths = np.empty(0, dtype=str), np.empty(0, dtype=str)
         return _index, _paths
 
     @staticmethod
@@ -704,8 +899,327 @@ class FilesIndex(DatasetIndex):
 
     def get_fullpath(self, key):
         """ Return the full path name for an item in the index. """
-        return self._paths[key]
+        return self.paths[key]
 
-    def create_subset(self, index):
+    def create_subset(self, index, check=True):
         """ Return a new FilesIndex based on the subset of indices given. """
-        return type(self).from_index(index=index, paths=self._paths, dirs=self.dirs)
+        return type(self).from_index(index=index, paths=self._paths, dirs=self.dirs, check=check)
+
+
+class MemmapIndex(DatasetIndex):
+    """ Index stored in a file and memory-mapped, so that it does not have to fit in memory
+
+    Items are read from disk only when batches are created. Shuffling does not create a permutation
+    of all items either: a :class:`~.ordering.BlockPermutation` shuffles blocks of `block_size` contiguous items
+    and items within each block, and computes positions only for the blocks needed by the current batches.
+    `next_batch` and `gen_batch` behave exactly as for :class:`DatasetIndex`.
+
+    Batches and subsets (e.g. after `split`) are in-memory :class:`DatasetIndex` instances.
+
+    Parameters
+    ----------
+    path : str
+        a `.npy` file or a raw binary file (then `dtype` should be specified)
+    dtype : np.dtype
+        a type of items in a raw binary file
+    block_size : int
+        a number of contiguous items shuffled together
+    check : bool
+        whether to check that all items are unique (it requires loading the whole index in memory)
+
+    Examples
+    --------
+    >>> np.save('clicks_index.npy', click_ids)
+    >>> index = MemmapIndex('clicks_index.npy')
+    >>> for batch in index.gen_batch(BATCH_SIZE, shuffle=42, n_epochs=1):
+    ...     pass
+    """
+    def __init__(self, path, dtype=None, block_size=2 ** 16, check=False):
+        self.path = path
+        self.dtype = dtype
+        self.block_size = block_size
+        super().__init__(path, dtype=dtype, check=check)
+
+    def build_index(self, path, dtype=None, check=False):      # pylint: disable=arguments-differ, arguments-renamed
+        """ Open a memory-mapped index file. """
+        if dtype is None:
+            _index = np.load(path, mmap_mode='r')
+        else:
+            _index = np.memmap(path, dtype=dtype, mode='r')
+
+        if _index.ndim != 1:
+            raise TypeError("Index should be 1-dimensional")
+        if len(_index) == 0:
+            raise ValueError("Index cannot be empty")
+        if check and len(np.unique(_index)) != len(_index):
+            warnings.warn("Index contains non-unique elements")
+        return _index
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_index'] = None
+        state['_pos_map'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._index = self.build_index(self.path, self.dtype)
+
+    @classmethod
+    def concat(cls, *index_list):
+        """ Create an in-memory index by concatenating other indices. """
+        return DatasetIndex(np.concatenate([i.index for i in index_list]))
+
+    def shuffle(self, shuffle, iter_params=None):
+        """ Return a lazy order of items
+
+        Parameters
+        ----------
+        shuffle : bool, int, str, class:`numpy.random.RandomState` or callable
+            specifies the order of items as in :meth:`DatasetIndex.shuffle`.
+            A new permutation is drawn for each call, so that epochs differ.
+            A callable gets all items and should return a complete order.
+
+        Returns
+        -------
+        :class:`~.ordering.LazyOrder` or np.ndarray
+        """
+        if iter_params is None:
+            iter_params = self.get_default_iter_params()
+
+        if isinstance(shuffle, str) and shuffle == 'block':
+            shuffle = BlockShuffle(self.block_size)
+
+        if isinstance(shuffle, bool):
+            if not shuffle:
+                return RangeOrder(len(self))
+            seed = draw_seed()
+        elif isinstance(shuffle, int):
+            if iter_params['_random_state'] is None:
+                iter_params['_random_state'] = np.random.RandomState(shuffle)
+            seed = draw_seed(iter_params['_random_state'])
+        elif isinstance(shuffle, np.random.RandomState):
+            iter_params['_random_state'] = shuffle
+            seed = draw_seed(shuffle)
+        elif callable(shuffle):
+            return shuffle(self.indices)
+        else:
+            raise ValueError("shuffle could be bool, int, 'block', numpy.random.RandomState or callable", shuffle)
+        return BlockPermutation(len(self), self.block_size, seed)
+
+    def subset_by_pos(self, pos):
+        """ Return items at given positions as an in-memory array. """
+        items = self.index[pos]
+        return np.array(items) if isinstance(items, np.ndarray) else items
+
+    def create_subset(self, index, check=True):
+        """ Return an in-memory :class:`DatasetIndex` with the given items. """
+        return DatasetIndex(index, check=check)
+
+
+class WindowIndex(DatasetIndex):
+    """ Index of sliding windows over long series (e.g. time series)
+
+    Each series of length `L` contains `(L - window) // stride + 1` windows, and index items are window numbers
+    (windows of the first series go first). Only the numbers are stored, while windows themselves are cut
+    from series data when a batch is loaded (see :class:`~.WindowBatch`).
+
+    Subsets and batches share series lengths with the parent index.
+
+    Parameters
+    ----------
+    index : 1-d array-like or None
+        window numbers (if None, all windows)
+    lengths : int, 1-d array-like or dict
+        a length of one series, lengths of series or a mapping from series ids to their lengths
+    window : int
+        a number of series elements in a window
+    stride : int
+        a step between consecutive windows
+    parent : WindowIndex
+        an index to take series lengths, `window` and `stride` from (instead of passing them)
+
+    Examples
+    --------
+    >>> index = WindowIndex(lengths=[len(s) for s in series], window=256, stride=16)
+    >>> dataset = Dataset(index, WindowBatch, preloaded=series)
+
+    >>> series_ids, offsets = index.locate(batch.indices)
+    """
+    def __init__(self, *args, **kwargs):
+        self.series = None
+        self.lengths = None
+        self.window = None
+        self.stride = None
+        self.starts = None
+        super().__init__(*args, **kwargs)
+
+    def build_index(self, index=None, lengths=None, window=None, stride=1, parent=None, check=True):
+        """ Build an index of windows. """
+        # pylint: disable=arguments-differ, arguments-renamed
+        if parent is not None:
+            self.series, self.lengths, self.starts = parent.series, parent.lengths, parent.starts
+            self.window, self.stride = parent.window, parent.stride
+        else:
+            if lengths is None or window is None:
+                raise ValueError("lengths and window should be specified")
+            if window < 1 or stride < 1:
+                raise ValueError("window and stride should be positive", window, stride)
+            if isinstance(lengths, dict):
+                self.series = np.asarray(list(lengths.keys()))
+                lengths = list(lengths.values())
+            lengths = np.asarray([lengths] if isinstance(lengths, (int, np.integer)) else lengths, dtype=np.int64)
+            if self.series is None:
+                self.series = np.arange(len(lengths))
+            self.lengths, self.window, self.stride = lengths, window, stride
+
+            n_windows = np.maximum(lengths - window, -stride) // stride + 1
+            # starts[i] is the number of the first window of the i-th series, and starts[-1] is the number of windows
+            self.starts = np.concatenate([[0], np.cumsum(n_windows)])
+
+        if index is None:
+            return DatasetIndex.build_index(int(self.starts[-1]))
+        return DatasetIndex.build_index(index, check=check)
+
+    @classmethod
+    def concat(cls, *index_list):
+        """ Create an index by concatenating subsets of the same windows index. """
+        parent = index_list[0]
+        if any(index.window != parent.window or index.stride != parent.stride or
+               not np.array_equal(index.starts, parent.starts) for index in index_list):
+            raise ValueError("Only subsets of the same windows index could be concatenated")
+        return cls(index=np.concatenate([i.index for i in index_list]), parent=parent)
+
+    def create_subset(self, index, check=True):
+        """ Return a new WindowIndex with the windows given. """
+        return type(self).from_index(index=index, parent=self, check=check)
+
+    def locate(self, indices=None, pos=False):
+        """ Return series and offsets of windows
+
+        Parameters
+        ----------
+        indices : 1-d array-like or None
+            window numbers (if None, all windows of the index)
+        pos : bool
+            whether to return positions of series instead of their ids
+
+        Returns
+        -------
+        series : np.ndarray
+            ids (or positions) of series
+        offsets : np.ndarray
+            positions of the first elements of windows within series
+        """
+        indices = self.indices if indices is None else np.asarray(indices, dtype=np.int64)
+        if len(indices) > 0 and (indices.min() < 0 or indices.max() >= self.starts[-1]):
+            raise IndexError("Window numbers are out of bounds")
+        series = np.searchsorted(self.starts, indices, side='right') - 1
+        offsets = (indices - self.starts[series]) * self.stride
+        return (series if pos else self.series[series]), offsets
+
+
+class CropIndex(DatasetIndex):
+    """ Index of crops from volumes (e.g. 3D scans or seismic cubes)
+
+    Index items are crop numbers, while each crop is defined by a volume id, an origin and a shape.
+    Crops are read when a batch is loaded (see :class:`~.VolumeBatch`).
+
+    Subsets and batches share the crops table with the parent index.
+
+    Parameters
+    ----------
+    index : 1-d array-like or None
+        crop numbers (if None, all crops)
+    volumes : hashable or 1-d array-like
+        an id of a volume for all crops or for each crop
+    origins : array-like of shape (n_crops, n_dims)
+        coordinates of the first element of each crop (crops might stick out of volumes)
+    shape : sequence of int or array-like of shape (n_crops, n_dims)
+        a shape of all crops or of each crop
+    parent : CropIndex
+        an index to take the crops table from (instead of passing it)
+
+    Examples
+    --------
+    >>> index = CropIndex(volumes=['cube_1', 'cube_1', 'cube_2'], origins=[[0, 0, 0], [0, 64, 0], [32, 0, 0]],
+    ...                   shape=(64, 64, 64))
+
+    >>> index = CropIndex.grid({'cube_1': (500, 800, 800), 'cube_2': (400, 800, 900)}, shape=(64, 256, 256))
+    """
+    def __init__(self, *args, **kwargs):
+        self.volumes = None
+        self.origins = None
+        self.shapes = None
+        super().__init__(*args, **kwargs)
+
+    def build_index(self, index=None, volumes=None, origins=None, shape=None, parent=None, check=True):
+        """ Build an index of crops. """
+        # pylint: disable=arguments-differ, arguments-renamed
+        if parent is not None:
+            self.volumes, self.origins, self.shapes = parent.volumes, parent.origins, parent.shapes
+        else:
+            if origins is None or shape is None:
+                raise ValueError("origins and shape should be specified")
+            origins = np.asarray(origins, dtype=np.int64)
+            if origins.ndim != 2:
+                raise ValueError("origins should be an array of shape (n_crops, n_dims)")
+            volumes = np.asarray(volumes)
+            if volumes.ndim == 0:
+                volumes = np.full(len(origins), volumes)
+            if len(volumes) != len(origins):
+                raise ValueError("volumes and origins should have the same length")
+            self.volumes, self.origins = volumes, origins
+            self.shapes = np.broadcast_to(np.asarray(shape, dtype=np.int64), origins.shape)
+
+        if index is None:
+            return DatasetIndex.build_index(len(self.origins))
+        return DatasetIndex.build_index(index, check=check)
+
+    @classmethod
+    def grid(cls, shapes, shape, stride=None):
+        """ Create an index of crops which cover volumes with a regular grid
+
+        The last crop along each axis is shifted back so that it ends at the volume border
+        (unless the volume is smaller than the crop).
+
+        Parameters
+        ----------
+        shapes : dict
+            volume ids and shapes of volumes
+        shape : sequence of int
+            a shape of crops
+        stride : sequence of int or None
+            steps between crops (by default, equal to `shape`, so crops do not overlap)
+        """
+        stride = shape if stride is None else stride
+        volumes, origins = [], []
+        for volume, volume_shape in shapes.items():
+            ranges = []
+            for length, size, step in zip(volume_shape, shape, stride):
+                starts = list(range(0, max(length - size, 0) + 1, step))
+                if starts[-1] + size < length:
+                    starts.append(length - size)
+                ranges.append(starts)
+            grid = np.stack(np.meshgrid(*ranges, indexing='ij'), axis=-1).reshape(-1, len(shape))
+            volumes.extend([volume] * len(grid))
+            origins.append(grid)
+        return cls(volumes=volumes, origins=np.concatenate(origins), shape=shape)
+
+    @classmethod
+    def concat(cls, *index_list):
+        """ Create an index by concatenating subsets of the same crops index. """
+        parent = index_list[0]
+        if any(not np.array_equal(index.origins, parent.origins) or not np.array_equal(index.volumes, parent.volumes)
+               for index in index_list):
+            raise ValueError("Only subsets of the same crops index could be concatenated")
+        return cls(index=np.concatenate([i.index for i in index_list]), parent=parent)
+
+    def create_subset(self, index, check=True):
+        """ Return a new CropIndex with the crops given. """
+        return type(self).from_index(index=index, parent=self, check=check)
+
+    def locate(self, indices=None):
+        """ Return volume ids, origins and shapes of crops (all crops of the index, if `indices` is None) """
+        indices = self.indices if indices is None else np.asarray(indices, dtype=np.int64)
+        return self.volumes[indices], self.origins[indices], self.shapes[indices]
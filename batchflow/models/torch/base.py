@@ -26,6 +26,7 @@ from .losses import CrossEntropyLoss, BinaryLovaszLoss, LovaszLoss, SSIM, MSSIM
 from .losses import binary as binary_losses, multiclass as multiclass_losses
 from ..base import BaseModel
 from ... import Config
+from ...tracing import acquire_lock
 
 
 
@@ -899,7 +900,7 @@ class TorchModel(BaseModel, VisualizationMixin):
 
         # Create Pytorch model if it is yet to be initialized, based on the actual inputs
         if self.model is None:
-            self.model_lock.acquire()
+            acquire_lock(self.model_lock, 'model_lock')
             if isinstance(split_inputs[0], (list, tuple)):
                 self.input_shapes = [get_shape(item) for item in split_inputs[0]]
             else:
@@ -926,7 +927,7 @@ class TorchModel(BaseModel, VisualizationMixin):
             profiler.__enter__()
 
         if use_lock:
-            self.model_lock.acquire()
+            acquire_lock(self.model_lock, 'model_lock')
 
         # Train on each of the microbatches
         outputs = []
@@ -1111,7 +1112,7 @@ class TorchModel(BaseModel, VisualizationMixin):
         self.model.eval()
 
         if use_lock:
-            self.model_lock.acquire()
+            acquire_lock(self.model_lock, 'model_lock')
 
         with torch.no_grad():
             output_container = {}
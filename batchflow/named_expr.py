@@ -39,6 +39,39 @@ def eval_expr(expr, **kwargs):
     return expr
 
 
+def has_expr(expr):
+    """ Check whether a data structure contains named expressions """
+    if isinstance(expr, NamedExpression):
+        return True
+    if isinstance(expr, (list, tuple)):
+        return any(has_expr(val) for val in expr)
+    if isinstance(expr, (dict, Config)):
+        return any(has_expr(key) or has_expr(val) for key, val in expr.items())
+    return False
+
+
+def compile_expr(expr):
+    """ Return a function which evaluates named expressions in a given data structure
+
+    The function takes the same arguments as :func:`eval_expr`.
+    Parts of the structure without named expressions are returned as is, without evaluating or copying them.
+    """
+    if not has_expr(expr):
+        return lambda **kwargs: expr
+    if isinstance(expr, (list, tuple)):
+        items = [compile_expr(val) for val in expr]
+        return lambda **kwargs: type(expr)([item(**kwargs) for item in items])
+    if isinstance(expr, (dict, Config)) and not any(has_expr(key) for key in expr.keys()):
+        items = [(key, compile_expr(val)) for key, val in expr.items()]
+        def _eval_dict(**kwargs):
+            _expr = type(expr)()
+            for key, val in items:
+                _expr.update({key: val(**kwargs)})
+            return _expr
+        return _eval_dict
+    return lambda **kwargs: eval_expr(expr, **kwargs)
+
+
 def swap(op):
     """ Swap args """
     def _op_(a, b):
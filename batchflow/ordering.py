@@ -0,0 +1,229 @@
+""" Contains orders of index items which are computed on demand """
+import numpy as np
+
+
+ITER_CHUNK_SIZE = 2 ** 16
+
+
+def draw_seed(random_state=None):
+    """ Draw a 64-bit seed from a :class:`numpy.random.RandomState` (or from the global numpy generator) """
+    random_state = np.random if random_state is None else random_state
+    high, low = random_state.randint(2 ** 32, size=2, dtype=np.uint64)
+    return int(high) << 32 | int(low)
+
+
+class LazyOrder:
+    """ Base class for orders of item positions which never materialise in memory as a whole
+
+    An order behaves like a 1-d array of positions: it has a length and could be indexed
+    with ints, slices and arrays of ints. Any slice of it is a regular numpy array.
+
+    Parameters
+    ----------
+    size : int
+        a number of items
+    """
+    def __init__(self, size):
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(self.size)
+            if step == 1:
+                return self.get_range(start, max(start, stop))
+            item = np.arange(start, stop, step)
+        elif isinstance(item, (int, np.integer)):
+            pos = int(item) + self.size if item < 0 else int(item)
+            if not 0 <= pos < self.size:
+                raise IndexError("Position %d is out of bounds for an order of size %d" % (item, self.size))
+            return self.get_range(pos, pos + 1)[0]
+
+        item = np.asarray(item)
+        if item.dtype == bool:
+            item = np.flatnonzero(item)
+        item = np.where(item < 0, item + self.size, item).astype(np.intp)
+        if len(item) > 0 and (item.min() < 0 or item.max() >= self.size):
+            raise IndexError("Positions are out of bounds for an order of size %d" % self.size)
+        return self.take(item)
+
+    def __array__(self, dtype=None, copy=None):
+        _ = copy
+        order = self.get_range(0, self.size)
+        return order if dtype is None else order.astype(dtype)
+
+    def __iter__(self):
+        for start in range(0, self.size, ITER_CHUNK_SIZE):
+            yield from self.get_range(start, min(start + ITER_CHUNK_SIZE, self.size))
+
+    def get_range(self, start, stop):
+        """ Return positions of items from `start` to `stop` in the order """
+        raise NotImplementedError()
+
+    def take(self, positions):
+        """ Return positions of items at the given places in the order """
+        raise NotImplementedError()
+
+
+class RangeOrder(LazyOrder):
+    """ Sequential order of items """
+    def get_range(self, start, stop):
+        return np.arange(start, stop, dtype=np.intp)
+
+    def take(self, positions):
+        return np.asarray(positions, dtype=np.intp)
+
+
+class BlockPermutation(LazyOrder):
+    """ A random permutation which is generated block by block
+
+    Items are split into contiguous blocks of `block_size` items and the order of blocks is shuffled.
+    Then items are shuffled within a sliding window of `window` consecutive blocks: each block is randomly
+    split into `window` parts, and a chunk `j` of the order consists of shuffled items from part 0 of the block
+    `j`, part 1 of the block `j-1` and so on. So items from any block are spread over `window` chunks,
+    while each chunk reads items from `window` blocks only.
+
+    All random numbers come from generators seeded with `seed` and a block (or a chunk) number,
+    so positions are computed only for the chunks which are requested, and only arrays
+    of block numbers and part sizes are kept in memory.
+
+    Since consecutive positions of the order come from a few blocks, a batch reads items which are close
+    to each other, which keeps memory-mapped and chunked files access mostly sequential.
+
+    Parameters
+    ----------
+    size : int
+        a number of items
+    block_size : int
+        a number of items in a block
+    seed : int
+        a seed of the permutation (if None, it is drawn from the global numpy generator)
+    window : int
+        a number of consecutive blocks which items are mixed together (1 means only within each block)
+    """
+    def __init__(self, size, block_size=2 ** 16, seed=None, window=1):
+        super().__init__(size)
+        if block_size < 1 or window < 1:
+            raise ValueError("block_size and window should be positive", block_size, window)
+        self.block_size = block_size
+        self.window = window
+        self.seed = draw_seed() if seed is None else seed
+
+        n_blocks = -(-size // block_size)
+        rng = np.random.default_rng([self.seed, n_blocks])
+        self.blocks = rng.permutation(n_blocks)
+        sizes = np.full(n_blocks, block_size, dtype=np.int64)
+        if n_blocks > 0:
+            sizes[-1] = size - (n_blocks - 1) * block_size
+        sizes = sizes[self.blocks]
+
+        if window == 1:
+            self.parts = sizes.reshape(-1, 1)
+            chunk_sizes = sizes
+        else:
+            # parts[i, k] - a number of items from the i-th block (in the shuffled order) which go to the chunk i+k
+            self.parts = rng.multinomial(sizes, np.full(window, 1 / window)) if n_blocks > 0 else \
+                         np.empty((0, window), dtype=np.int64)
+            chunk_sizes = np.zeros(n_blocks + window - 1, dtype=np.int64)
+            for k in range(window):
+                chunk_sizes[k : k + n_blocks] += self.parts[:, k]
+        self.offsets = np.concatenate([[0], np.cumsum(chunk_sizes)])
+        self._cache = {}
+
+    def _cached(self, key, func):
+        value = self._cache.get(key)
+        if value is None:
+            value = func()
+            # batches are taken sequentially, so only the latest blocks and chunks are needed
+            if len(self._cache) > self.window + 2:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[key] = value
+        return value
+
+    def get_block(self, block):
+        """ Return a shuffled array of positions of items in a block """
+        def _shuffle():
+            start = block * self.block_size
+            stop = min(start + self.block_size, self.size)
+            return np.random.default_rng([self.seed, block]).permutation(stop - start) + start
+        return self._cached(('block', block), _shuffle)
+
+    def get_chunk(self, chunk):
+        """ Return positions of items in a chunk of the order """
+        if self.window == 1:
+            return self.get_block(self.blocks[chunk])
+
+        def _mix():
+            parts = []
+            for i in range(max(chunk - self.window + 1, 0), min(chunk + 1, len(self.blocks))):
+                k = chunk - i
+                start = self.parts[i, :k].sum()
+                parts.append(self.get_block(self.blocks[i])[start : start + self.parts[i, k]])
+            return np.random.default_rng([self.seed, chunk, self.window]).permutation(np.concatenate(parts))
+        return self._cached(('chunk', chunk), _mix)
+
+    def get_range(self, start, stop):
+        if start >= stop:
+            return np.empty(0, dtype=np.intp)
+        first = np.searchsorted(self.offsets, start, side='right') - 1
+        last = np.searchsorted(self.offsets, stop, side='left') - 1
+        parts = []
+        for i in range(first, last + 1):
+            offset = self.offsets[i]
+            parts.append(self.get_chunk(i)[max(start - offset, 0) : stop - offset])
+        return parts[0].copy() if len(parts) == 1 else np.concatenate(parts)
+
+    def take(self, positions):
+        positions = np.asarray(positions, dtype=np.intp)
+        result = np.empty(len(positions), dtype=np.intp)
+        chunks = np.searchsorted(self.offsets, positions, side='right') - 1
+        for i in np.unique(chunks):
+            mask = chunks == i
+            result[mask] = self.get_chunk(i)[positions[mask] - self.offsets[i]]
+        return result
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_cache'] = {}
+        return state
+
+
+class BlockShuffle:
+    """ A locality-aware shuffle for `DatasetIndex.shuffle` and `next_batch`
+
+    Blocks of `block_size` contiguous items are shuffled, and then items are shuffled within a sliding window
+    of `window` blocks (see :class:`BlockPermutation`). Batches look almost random, while each of them
+    reads items from a few contiguous regions only.
+
+    Each call returns a new permutation, so that epochs differ. With a `seed` the sequence of permutations
+    is reproducible.
+
+    Parameters
+    ----------
+    block_size : int
+        a number of contiguous items in a block
+    window : int
+        a number of blocks which items are mixed together
+    seed : int or :class:`numpy.random.RandomState`
+        a seed (if None, the global numpy generator is used)
+
+    Examples
+    --------
+    >>> dataset.gen_batch(BATCH_SIZE, shuffle=BlockShuffle(block_size=4096, window=8, seed=42), n_epochs=1)
+
+    or with default parameters:
+
+    >>> dataset.gen_batch(BATCH_SIZE, shuffle='block', n_epochs=1)
+    """
+    def __init__(self, block_size=1024, window=4, seed=None):
+        self.block_size = block_size
+        self.window = window
+        if seed is None or isinstance(seed, np.random.RandomState):
+            self.random_state = seed
+        else:
+            self.random_state = np.random.RandomState(seed)
+
+    def __call__(self, indices):
+        return BlockPermutation(len(indices), self.block_size, draw_seed(self.random_state), self.window)
@@ -0,0 +1,104 @@
+""" Contains a compact storage of file paths """
+import os
+from collections.abc import Mapping
+
+import numpy as np
+
+from .positions import make_positions
+
+
+class PathStore(Mapping):
+    """ A mapping from index items to file paths which keeps a table of directories and arrays of file names
+
+    Each path is stored as an integer code of its directory and a base name encoded as bytes,
+    so millions of paths take a fraction of the memory needed for a dict of strings.
+    Index subsets share the store of the parent index.
+
+    Parameters
+    ----------
+    keys : 1-d array-like
+        index items
+    paths : 1-d array-like of str
+        full paths for each item
+
+    Examples
+    --------
+    >>> store = PathStore(['a', 'b'], ['/data/1/a.png', '/data/2/b.png'])
+    >>> store['b']
+    '/data/2/b.png'
+    """
+    def __init__(self, keys, paths):
+        self.index = np.asarray(keys)
+        if len(self.index) != len(paths):
+            raise ValueError("keys and paths should have the same length")
+        if len(paths) > 0:
+            heads, tails = zip(*[os.path.split(path) for path in paths])
+        else:
+            heads, tails = [], []
+        self.directories, codes = np.unique(np.asarray(heads, dtype=str), return_inverse=True)
+        dtype = np.int32 if len(self.directories) < 2 ** 31 else np.int64
+        self.codes = codes.astype(dtype)
+        self.names = np.array([os.fsencode(name) for name in tails], dtype=bytes)
+        self._positions = None
+
+    @classmethod
+    def from_dict(cls, paths, keys=None):
+        """ Create a store from a dict which maps keys to paths (only for `keys`, if given) """
+        if isinstance(paths, PathStore) and keys is None:
+            return paths
+        keys = list(paths.keys()) if keys is None else keys
+        return cls(keys, [paths[key] for key in keys])
+
+    @classmethod
+    def concat(cls, *stores):
+        """ Create a store with all items from the given stores """
+        if all(store is stores[0] for store in stores):
+            return stores[0]
+        keys = np.concatenate([store.index for store in stores])
+        return cls(keys, [store._get_path(pos) for store in stores for pos in range(len(store))])  # pylint: disable=protected-access
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_positions'] = None
+        return state
+
+    @property
+    def positions(self):
+        """ :class:`~.positions.BasePositions` : positions of keys """
+        if self._positions is None:
+            self._positions = make_positions(self.index)
+        return self._positions
+
+    def _get_path(self, pos):
+        return os.path.join(self.directories[self.codes[pos]], os.fsdecode(self.names[pos]))
+
+    def __getitem__(self, key):
+        return self._get_path(self.positions.get(key))
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def get_many(self, keys):
+        """ Return a list of paths for the given keys """
+        return [self._get_path(pos) for pos in self.positions.get_many(keys)]
+
+    def take(self, order):
+        """ Return a new store with items at the given positions (e.g. sorted) """
+        store = type(self).__new__(type(self))
+        store.index = self.index[order]
+        store.directories = self.directories
+        store.codes = self.codes[order]
+        store.names = self.names[order]
+        store._positions = None       # pylint: disable=protected-access
+        return store
+
+    @property
+    def nbytes(self):
+        """ int : a number of bytes used by arrays of the store """
+        return self.directories.nbytes + self.codes.nbytes + self.names.nbytes
@@ -5,7 +5,6 @@ import time
 from functools import partial
 import traceback
 import threading
-import concurrent.futures as cf
 import asyncio
 import logging
 import warnings
@@ -13,17 +12,13 @@ from cProfile import Profile
 from pstats import Stats
 import queue as q
 import numpy as np
-try:
-    import pandas as pd
-except ImportError:
-    from . import _fake as pd
 
 from .base import Baseset
 from .config import Config
 from .batch import Batch
 from .decorators import deprecated
 from .exceptions import SkipBatchException, EmptyBatchSequence, StopPipeline
-from .named_expr import NamedExpression, V, eval_expr
+from .named_expr import NamedExpression, V, eval_expr, compile_expr
 from .once_pipeline import OncePipeline
 from .model_dir import ModelDirectory
 from .variables import VariableDirectory
@@ -33,6 +28,11 @@ from .models.metrics import (ClassificationMetrics, SegmentationMetricsByPixels,
 from ._const import *       # pylint:disable=wildcard-import
 from .utils import save_data_to
 from .notifier import Notifier
+from .pools import PoolRegistry
+from .prefetcher import ProcessPrefetcher
+from .profiler import ProfileInfo, SamplingProfiler
+from .counters import PipelineCounters
+from .tracing import Tracer, get_tracer, trace_span
 
 
 METRICS = dict(
@@ -74,6 +74,7 @@ class Pipeline:
             self.before = OncePipeline(self)
             self.after = OncePipeline(self)
             self._namespaces = []
+            self.pools = PoolRegistry()
         else:
             self.dataset = pipeline.dataset
             config = config or {}
@@ -91,6 +92,7 @@ class Pipeline:
             self.variables = pipeline.variables.copy()
             self.models = pipeline.models.copy()
             self._namespaces = pipeline._namespaces
+            self.pools = pipeline.pools.copy()
             self.before = pipeline.before.copy()
             self.before.pipeline = self
             self.after = pipeline.after.copy()
@@ -112,9 +114,14 @@ class Pipeline:
         self.notifier = None
         self._profile = None
         self._profiler = None
-        self.profile_info = None
+        self._profile_info = ProfileInfo()
+        self.counters = PipelineCounters()
+        self.tracer = None
         self.elapsed_time = 0.0
-        self._profile_info_lock = threading.Lock()
+        self._plan = None
+        self._plan_lock = threading.Lock()
+        self._reduce_states = {}
+        self._reduce_lock = threading.Lock()
 
     def __enter__(self):
         """ Create a context and return an empty pipeline non-bound to any dataset """
@@ -224,8 +231,9 @@ class Pipeline:
             name = action['name'][2:]
         else:
             name = action['name']
-        idx = self._actions.index(action)
-        return name if add_index is False else '{} #{}'.format(name, idx)
+        if add_index is False:
+            return name
+        return '{} #{}'.format(name, self._actions.index(action))
 
     def add_namespace(self, *namespaces):
         self._namespaces.extend(namespaces)
@@ -287,6 +295,7 @@ class Pipeline:
     def append_pipeline(self, pipeline, proba=None, repeat=None):
         """ Add a nested pipeline to the log of future actions """
         self._actions.append({'name': PIPELINE_ID, 'pipeline': pipeline, 'proba': proba, 'repeat': repeat})
+        self._plan = None
 
     @property
     def index(self):
@@ -578,6 +587,120 @@ class Pipeline:
     def _exec_update_variable(self, batch, action):
         self.set_variable(action['var_name'], action['value'], action['mode'], batch=batch)
 
+    def update_priorities(self, sampler, priorities, indices=None):
+        """ Update priorities of batch items in a prioritized sampler during pipeline execution
+
+        Parameters
+        ----------
+        sampler : PrioritizedSampler or a named expression
+            a sampler which is used to generate batches for this pipeline
+        priorities : float, array-like or a named expression
+            new priorities of batch items (e.g. per-item losses)
+        indices : array-like or a named expression
+            index items to update (by default, `batch.indices`)
+
+        Returns
+        -------
+        self - in order to use it in the pipeline chains
+
+        Examples
+        --------
+        ::
+
+            sampler = PrioritizedSampler(alpha=.6)
+            pipeline = (dataset.p
+                .train_model('model', fetches='per_item_loss', save_to=B('loss'))
+                .update_priorities(sampler, B('loss'))
+            )
+            pipeline.run(BATCH_SIZE, shuffle=sampler, n_iters=1000)
+        """
+        return self._add_action(UPDATE_PRIORITIES_ID, _args=dict(sampler=sampler, priorities=priorities,
+                                                                  indices=indices))
+
+    def _exec_update_priorities(self, batch, action):
+        sampler = self._eval_expr(action['sampler'], batch)
+        priorities = self._eval_expr(action['priorities'], batch)
+        indices = batch.indices if action['indices'] is None else self._eval_expr(action['indices'], batch)
+        sampler.update(indices, priorities)
+
+    def reduce(self, name, value, reducer):
+        """ Reduce values of all batches into a pipeline variable (e.g. to compute dataset statistics)
+
+        Each worker thread (see `prefetch`) keeps its own partial state, so batches are reduced
+        without locks. When all batches are over, partial states are combined and the result is saved
+        into a pipeline variable `name`. It is also available at any moment with :meth:`get_reduced`.
+
+        Partial states are cleared when the pipeline starts a new run.
+
+        Parameters
+        ----------
+        name : str
+            a name of the reduction and of the variable to save the result to
+        value : a named expression or a value
+            a value to reduce (e.g. `B('images')`)
+        reducer : :class:`~.reducers.Reducer`
+            a reduction, e.g. :class:`~.reducers.Sum`, :class:`~.reducers.MeanVar`,
+            :class:`~.reducers.Histogram` or :class:`~.reducers.ValueCounts`
+
+        Returns
+        -------
+        self - in order to use it in the pipeline chains
+
+        Notes
+        -----
+        With `target='mpc'` batches are processed in other processes, so their partial states are lost.
+
+        Examples
+        --------
+        ::
+
+            pipeline = (dataset.p
+                .load(...)
+                .reduce('stats', B('images'), MeanVar(axis=(0, 1, 2)))
+                .reduce('classes', B('labels'), ValueCounts())
+            )
+            pipeline.run(BATCH_SIZE, n_epochs=1, prefetch=8)
+            mean, std = pipeline.v('stats')['mean'], pipeline.v('stats')['std']
+        """
+        self.init_variable(name)
+        return self._add_action(REDUCE_ID, _args=dict(reduce_name=name, value=value, reducer=reducer))
+
+    def _exec_reduce(self, batch, action):
+        name, reducer = action['reduce_name'], action['reducer']
+        value = self._eval_expr(action['value'], batch)
+        thread = threading.get_ident()
+        states = self._reduce_states.get(name, (None, {}))[1]
+        if thread not in states:
+            with self._reduce_lock:
+                states = self._reduce_states.setdefault(name, (reducer, {}))[1]
+                states.setdefault(thread, reducer.init())
+        # only this thread changes its own state
+        states[thread] = reducer.update(states[thread], value)
+
+    def get_reduced(self, name):
+        """ Return a result of a reduction over the batches processed so far (see :meth:`reduce`)
+
+        Parameters
+        ----------
+        name : str
+            a name of the reduction
+
+        Raises
+        ------
+        KeyError
+            if no batches have been reduced
+        """
+        with self._reduce_lock:
+            reducer, states = self._reduce_states[name]
+            states = list(states.values())
+        return reducer.reduce(states)
+
+    def _save_reduced(self, batch_generator):
+        """ Save results of reductions into variables when batches are over """
+        yield from batch_generator
+        for name in list(self._reduce_states):
+            self.set_variable(name, self.get_reduced(name))
+
     def print(self, *args, **kwargs):
         """ Print a value during pipeline execution """
         return self._add_action(PRINT_ID, *args, **kwargs)
@@ -661,57 +784,67 @@ class Pipeline:
             raise AttributeError("Method '%s' has not been found in the %s class" % (name, type(batch).__name__))
         return action_method, action_spec
 
-    def _exec_one_action(self, batch, action, args, kwargs):
+    def _get_compiled_method(self, batch, step):
+        """ Return an action function for the batch class (or a method bound to the batch) """
+        function = step['methods'].get(type(batch))
+        if function is None:
+            attr = getattr(type(batch), step['action']['name'], None)
+            if callable(attr) and hasattr(attr, 'action') and step['action']['name'] not in vars(batch):
+                # bind the action once for all batches of this class
+                function = attr
+                step['methods'][type(batch)] = function
+            else:
+                action_method, _ = self._get_action_method(batch, step['action']['name'])
+                return action_method
+        return partial(function, batch)
+
+    def _exec_one_action(self, batch, step, args, kwargs):
+        action = step['action']
         if self._needs_exec(batch, action):
             repeat = self._eval_expr(action['repeat'], batch=batch) or 1
             for _ in range(repeat):
                 batch.pipeline = self
-                action_method, _ = self._get_action_method(batch, action['name'])
+                action_method = self._get_compiled_method(batch, step)
                 batch = action_method(*args, **kwargs)
                 batch.pipeline = self
         return batch
 
-    def _exec_nested_pipeline(self, batch, action):
+    def _exec_nested_pipeline(self, batch, step):
+        action = step['action']
         if self._needs_exec(batch, action):
             repeat = self._eval_expr(action['repeat'], batch=batch) or 1
             for _ in range(repeat):
-                batch = self._exec_all_actions(batch, action['pipeline']._actions)  # pylint: disable=protected-access
+                batch = self._exec_plan(batch, step['plan'])
         return batch
 
-    def _add_profile_info(self, batch, action, exec_time, **kwargs):
+    def _add_profile_info(self, batch, action, exec_time, samples=None, **kwargs):
         name = self.get_action_name(action, add_index=True)
         iter_no = self._iter_params['_n_iters']
 
         start_time = time.time()
-        stats = Stats(self._profiler)
-        self._profiler.clear()
-
-        indices, values = [], []
-        for key, value in stats.stats.items():
-            for k, v in value[4].items():
-                # action name, method_name, file_name, line_no, callee
-                indices.append((name, '{}::{}::{}::{}'.format(key[2], *k)))
-                row_dict = {
-                    'iter': iter_no, 'total_time': exec_time, 'pipeline_time': stats.total_tt, # base stats
-                    'ncalls': v[0], 'tottime': v[2], 'cumtime': v[3], # detailed stats
-                    'batch_id': id(batch), **kwargs
-                }
-                values.append(row_dict)
-
-
-        multiindex = pd.MultiIndex.from_tuples(indices, names=['action', 'id'])
-        df = pd.DataFrame(values, index=multiindex,
-                          columns=['iter', 'total_time', 'pipeline_time',
-                                   'ncalls', 'tottime', 'cumtime',
-                                   'batch_id', *list(kwargs.keys())])
-        df['total_time'] += time.time() - start_time
-
-        if self.profile_info is None:
-            with self._profile_info_lock:
-                self.profile_info = df
+        if samples is not None:
+            details, pipeline_time = samples
         else:
-            with self._profile_info_lock:
-                self.profile_info = self.profile_info.append(df)
+            stats = Stats(self._profiler)
+            self._profiler.clear()
+            pipeline_time = stats.total_tt
+
+            details = []
+            for key, value in stats.stats.items():
+                for k, v in value[4].items():
+                    # action name, method_name, file_name, line_no, callee
+                    details.append(('{}::{}::{}::{}'.format(key[2], *k), v[0], v[2], v[3]))
+
+        total_time = exec_time + time.time() - start_time
+        self._profile_info.add(name, iter_no, id(batch), total_time, pipeline_time, details, **kwargs)
+
+    @property
+    def profile_info(self):
+        """ pd.DataFrame or None : profiling data collected with `profile=True`, one row per profiled function call
+        within each action call """
+        if len(self._profile_info) == 0:
+            return None
+        return self._profile_info.to_frame()
 
     def show_profile_info(self, per_iter=False, detailed=False,
                           groupby=None, columns=None, sortby=None, limit=10):
@@ -721,6 +854,7 @@ class Pipeline:
         ----------
         per_iter : bool
             Whether to make an aggregation over iters or not.
+            Only available when profiling rows are kept (i.e. `profile=True`, not 'summary').
         detailed : bool
             Whether to use information from :class:`cProfiler` or not.
         groupby : str or sequence of str
@@ -732,97 +866,168 @@ class Pipeline:
             then it must be a full identificator of a column.
         limit : int
             Limits the length of resulting dataframe.
-        parse : bool
-            Allows to re-create underlying dataframe from scratches.
         """
         if per_iter is False and detailed is False:
             columns = columns or ['total_time', 'pipeline_time']
             sortby = sortby or ('total_time', 'sum')
-            aggs = {key: ['sum', 'mean', 'max'] for key in columns}
-            result = (self.profile_info.groupby(['action', 'iter'])[columns].mean().groupby('action').agg(aggs)
-                      .sort_values(sortby, ascending=False))
+            result = self._profile_info.summary(columns=columns).sort_values(sortby, ascending=False)
 
         elif per_iter is False and detailed is True:
             columns = columns or ['ncalls', 'tottime', 'cumtime']
             sortby = sortby or ('tottime', 'sum')
-            aggs = {key: ['sum', 'mean', 'max'] for key in columns}
-            result = (self.profile_info.reset_index().groupby(['action', 'id']).agg(aggs)
+            result = (self._profile_info.summary(detailed=True, columns=columns)
                       .sort_values(['action', sortby], ascending=[True, False])
                       .groupby(level=0).apply(lambda df: df[:limit]).droplevel(0))
 
-        elif per_iter is True and detailed is False:
-            groupby = groupby or ['iter', 'action']
-            columns = columns or ['action', 'total_time', 'pipeline_time', 'batch_id']
-            sortby = sortby or 'total_time'
-            result = (self.profile_info.reset_index().groupby(groupby)[columns].mean()
-                      .sort_values(['iter', sortby], ascending=[True, False]))
-
-        elif per_iter is True and detailed is True:
-            groupby = groupby or ['iter', 'action', 'id']
-            columns = columns or ['ncalls', 'tottime', 'cumtime']
-            sortby = sortby or 'tottime'
-            result = (self.profile_info.reset_index().set_index(groupby)[columns]
-                      .sort_values(['iter', 'action', sortby], ascending=[True, True, False])
-                      .groupby(level=[0, 1]).apply(lambda df: df[:limit]).droplevel([0, 1]))
+        else:
+            profile_info = self.profile_info
+            if profile_info is None:
+                raise ValueError("Per iteration info is available only when a pipeline is run with profile=True")
+
+            if detailed is False:
+                groupby = groupby or ['iter', 'action']
+                columns = columns or ['action', 'total_time', 'pipeline_time', 'batch_id']
+                sortby = sortby or 'total_time'
+                result = (profile_info.reset_index().groupby(groupby)[columns].mean(numeric_only=True)
+                          .sort_values(['iter', sortby], ascending=[True, False]))
+            else:
+                groupby = groupby or ['iter', 'action', 'id']
+                columns = columns or ['ncalls', 'tottime', 'cumtime']
+                sortby = sortby or 'tottime'
+                result = (profile_info.reset_index().set_index(groupby)[columns]
+                          .sort_values(['iter', 'action', sortby], ascending=[True, True, False])
+                          .groupby(level=[0, 1]).apply(lambda df: df[:limit]).droplevel([0, 1]))
         return result
 
 
-    def _exec_all_actions(self, batch, actions=None):
-        join_batches = None
-        actions = actions or self._actions
-
-        for action in actions:
-            if self._profile:
-                start_time = time.time()
-                self._profiler.enable()
-
-            _action = action.copy()
+    def _compile_actions(self, actions):
+        """ Make an execution plan for a list of actions """
+        plan = []
+        for i, action in enumerate(actions):
+            step = dict(action=action, methods={}, name='{} #{}'.format(self.get_action_name(action), i))
             if 'args' in action:
-                _action['args'] = self._eval_expr(action['args'], batch=batch)
+                step['args'] = compile_expr(action['args'])
             if 'kwargs' in action:
-                _action['kwargs'] = self._eval_expr(action['kwargs'], batch=batch)
+                step['kwargs'] = compile_expr(action['kwargs'])
+            if action['name'] == PIPELINE_ID:
+                step['plan'] = self._compile_actions(action['pipeline']._actions)  # pylint: disable=protected-access
+            elif action['name'] in ACTIONS:
+                step['function'] = getattr(self, ACTIONS[action['name']])
+            plan.append(step)
+        return plan
 
-            if self._profile:
-                eval_expr_time = time.time() - start_time
+    def compile(self):
+        """ Prepare actions for execution
 
-            if _action.get('#dont_run', False):
-                pass
-            elif _action['name'] in [JOIN_ID, MERGE_ID]:
-                join_batches = []
-                for pipe in _action['pipelines']:   # pylint: disable=not-an-iterable
-                    if _action['mode'] == 'i':
-                        jbatch = pipe.create_batch(batch.index)
-                    elif _action['mode'] == 'n':
-                        jbatch = pipe.next_batch()
-                    join_batches.append(jbatch)
-
-                if _action['name'] == MERGE_ID:
-                    if _action['fn'] is None:
-                        batch, _ = batch.merge([batch] + join_batches, components=_action['components'])
-                    else:
-                        batch, _ = _action['fn']([batch] + join_batches)
-                    join_batches = None
-            elif _action['name'] == REBATCH_ID:
-                pass
-            elif _action['name'] == PIPELINE_ID:
-                batch = self._exec_nested_pipeline(batch, _action)
-            elif _action['name'] in ACTIONS:
-                action_fn = getattr(self, ACTIONS[_action['name']])
-                action_fn(batch, _action)
-            else:
-                if join_batches is None:
-                    _action_args = _action['args']
+        Arguments without named expressions are evaluated once (and not copied for each batch),
+        while only the parts which contain named expressions are evaluated for each batch.
+        Action methods are looked up once for each batch class.
+
+        The pipeline is compiled implicitly before the first batch is processed, so there is no need
+        to call this method unless the actions have been modified in place.
+
+        Returns
+        -------
+        self
+        """
+        with self._plan_lock:
+            self._plan = self._compile_actions(self._actions)
+        return self
+
+    def _get_plan(self):
+        plan = self._plan
+        if plan is None or len(plan) != len(self._actions):
+            with self._plan_lock:
+                plan = self._plan
+                if plan is None or len(plan) != len(self._actions):
+                    plan = self._compile_actions(self._actions)
+                    self._plan = plan
+        return plan
+
+    def _exec_all_actions(self, batch, actions=None):
+        plan = self._get_plan() if actions is None else self._compile_actions(actions)
+        return self._exec_plan(batch, plan)
+
+    def _exec_plan(self, batch, plan):
+        join_batches = None
+        counters = self.counters if self.counters.enabled else None
+        tracer = get_tracer()
+        timed = counters is not None or tracer is not None
+        sampling = isinstance(self._profiler, SamplingProfiler)
+
+        for step in plan:
+            action = step['action']
+            if timed:
+                start_ns = time.perf_counter_ns()
+            if self._profile:
+                start_time = time.time()
+                if sampling:
+                    self._profiler.enter()
                 else:
-                    _action_args = tuple([tuple(join_batches), *_action['args']])
-                    join_batches = None
+                    self._profiler.enable()
 
-                batch = self._exec_one_action(batch, _action, _action_args, _action['kwargs'])
+            samples = None
+            try:
+                _action = action.copy()
+                if 'args' in step:
+                    _action['args'] = step['args'](batch=batch, pipeline=self)
+                if 'kwargs' in step:
+                    _action['kwargs'] = step['kwargs'](batch=batch, pipeline=self)
+
+                if timed:
+                    eval_expr_ns = time.perf_counter_ns()
+                if self._profile:
+                    eval_expr_time = time.time() - start_time
+
+                if _action.get('#dont_run', False):
+                    pass
+                elif _action['name'] in [JOIN_ID, MERGE_ID]:
+                    join_batches = []
+                    for pipe in _action['pipelines']:   # pylint: disable=not-an-iterable
+                        if _action['mode'] == 'i':
+                            jbatch = pipe.create_batch(batch.index)
+                        elif _action['mode'] == 'n':
+                            jbatch = pipe.next_batch()
+                        join_batches.append(jbatch)
+
+                    if _action['name'] == MERGE_ID:
+                        if _action['fn'] is None:
+                            batch, _ = batch.merge([batch] + join_batches, components=_action['components'])
+                        else:
+                            batch, _ = _action['fn']([batch] + join_batches)
+                        join_batches = None
+                elif _action['name'] == REBATCH_ID:
+                    pass
+                elif _action['name'] == PIPELINE_ID:
+                    batch = self._exec_nested_pipeline(batch, step)
+                elif _action['name'] in ACTIONS:
+                    step['function'](batch, _action)
+                else:
+                    if join_batches is None:
+                        _action_args = _action['args']
+                    else:
+                        _action_args = tuple([tuple(join_batches), *_action['args']])
+                        join_batches = None
 
+                    batch = self._exec_one_action(batch, step, _action_args, _action['kwargs'])
+            finally:
+                # a profiler should stop even if an action fails
+                if self._profile:
+                    if sampling:
+                        samples = self._profiler.leave()
+                    else:
+                        self._profiler.disable()
+
+            if timed:
+                end_ns = time.perf_counter_ns()
+                if counters is not None:
+                    counters.add_action(step['name'], eval_expr_ns - start_ns, end_ns - eval_expr_ns)
+                if tracer is not None:
+                    tracer.add(step['name'], 'action', start_ns, end_ns, batch_id=id(batch))
             if self._profile:
-                self._profiler.disable()
                 exec_time = time.time() - start_time
                 self._add_profile_info(batch, action, start_time=start_time, exec_time=exec_time,
-                                       eval_expr_time=eval_expr_time)
+                                       eval_expr_time=eval_expr_time, samples=samples)
 
 
         return batch
@@ -850,7 +1055,14 @@ class Pipeline:
         if new_loop:
             asyncio.set_event_loop(asyncio.new_event_loop())
         batch.pipeline = self
+        start_ns = time.perf_counter_ns()
         batch_res = self._exec_all_actions(batch)
+        end_ns = time.perf_counter_ns()
+        if self.counters.enabled:
+            self.counters.add_batch(len(batch), end_ns - start_ns)
+        tracer = get_tracer()
+        if tracer is not None:
+            tracer.add('batch', 'batch', start_ns, end_ns, batch_id=id(batch), size=len(batch))
         batch_res.pipeline = self
         return batch_res
 
@@ -1274,29 +1486,47 @@ class Pipeline:
         return new_p._add_action(REBATCH_ID, _args=dict(batch_size=batch_size, pipeline=self, fn=fn,
                                                         components=components, batch_class=batch_class))
 
+    def _wait_queue(self, name, method, *args, **kwargs):
+        """ Call a blocking queue method and count the waiting time """
+        tracer = get_tracer()
+        if not self.counters.enabled and tracer is None:
+            return method(*args, **kwargs)
+        start_ns = time.perf_counter_ns()
+        result = method(*args, **kwargs)
+        end_ns = time.perf_counter_ns()
+        if self.counters.enabled:
+            self.counters.add('queue_wait', name, end_ns - start_ns)
+        if tracer is not None:
+            tracer.add(name, 'wait', start_ns, end_ns)
+        return result
+
     def _put_batches_into_queue(self, gen_batch):
         while not self._stop_flag:
-            self._prefetch_count.put(1, block=True)
+            self._wait_queue('prefetch_count', self._prefetch_count.put, 1, block=True)
             try:
-                batch = next(gen_batch)
+                with trace_span('next batch', 'generator'):
+                    batch = next(gen_batch)
             except StopIteration:
                 break
             else:
-                future = self._executor.submit(self.execute_for, batch, new_loop=True)
-                self._prefetch_queue.put(future, block=True)
+                if isinstance(self._executor, ProcessPrefetcher):
+                    future = self._executor.submit(batch)
+                else:
+                    future = self._executor.submit(self.execute_for, batch, new_loop=True)
+                self._wait_queue('prefetch_put', self._prefetch_queue.put, future, block=True)
         self._prefetch_queue.put(None, block=True)
 
     def _run_batches_from_queue(self, notifier):
         skip_batch = False
         while not self._stop_flag:
-            future = self._prefetch_queue.get(block=True)
+            future = self._wait_queue('prefetch_get', self._prefetch_queue.get, block=True)
             if future is None:
                 self._prefetch_queue.task_done()
                 self._batch_queue.put(None)
                 break
 
             try:
-                batch = future.result()
+                batch = self._wait_queue('batch_result', future.result)
                 notifier.update(pipeline=self, batch=batch)
             except SkipBatchException:
                 skip_batch = True
@@ -1306,14 +1536,30 @@ class Pipeline:
                 traceback.print_tb(exc.__traceback__)
             finally:
                 if not skip_batch:
-                    self._batch_queue.put(batch, block=True)
+                    self._wait_queue('batch_put', self._batch_queue.put, batch, block=True)
                     skip_batch = False
                 self._prefetch_queue.task_done()
 
-    def _clear_queue(self, queue):
+    def _stop_service_threads(self, put_future, run_future):
+        """ Unblock prefetching threads (e.g. when a batch generator is closed early) and wait until they finish """
+        self._stop_flag = True
+        while not (put_future.done() and run_future.done()):
+            for queue in [self._batch_queue, self._prefetch_count, self._prefetch_queue]:
+                self._clear_queue(queue, block=False)
+            if not run_future.done():
+                try:
+                    self._prefetch_queue.put_nowait(None)
+                except q.Full:
+                    pass
+            time.sleep(.01)
+
+    def _clear_queue(self, queue, block=True):
         if queue is not None:
             while not queue.empty():
-                queue.get(block=True)
+                try:
+                    queue.get(block=block)
+                except q.Empty:
+                    break
                 queue.task_done()
 
     def _stop_executor(self, executor):
@@ -1328,9 +1574,11 @@ class Pipeline:
         what : list of str, str or bool or None
             what to reset to start from scratch:
 
-            - 'iter' - restart the batch iterator
+            - 'iter' - restart the batch iterator and stop all worker pools
             - 'variables' - re-initialize all pipeline variables
             - 'models' - reset all models
+            - 'pools' - stop all worker pools (they are restarted when needed)
+            - 'counters' - clear action timers (see :attr:`counters`)
 
         Examples
         --------
@@ -1352,7 +1600,7 @@ class Pipeline:
             elif what[0] is True:
                 what = 'iter'
             elif what[0] == 'all':
-                what = ['iter', 'variables', 'models']
+                what = ['iter', 'variables', 'models', 'pools', 'counters']
         if isinstance(what, str):
             what = [what]
 
@@ -1363,11 +1611,13 @@ class Pipeline:
             self._clear_queue(self._batch_queue)
             self._clear_queue(self._prefetch_count)
 
-            self._stop_executor(self._executor)
-            self._stop_executor(self._service_executor)
+            if isinstance(self._executor, ProcessPrefetcher):
+                self._stop_executor(self._executor)
+            self.pools.shutdown()
 
             self._executor = None
             self._service_executor = None
+            self._reduce_states = {}
             self._prefetch_count = None
             self._prefetch_queue = None
             self._batch_queue = None
@@ -1381,6 +1631,12 @@ class Pipeline:
         if 'models' in what:
             self.models.reset()
 
+        if 'pools' in what:
+            self.pools.shutdown()
+
+        if 'counters' in what:
+            self.counters.reset()
+
 
     def gen_rebatch(self, *args, **kwargs):
         """ Generate batches for rebatch operation """
@@ -1432,7 +1688,7 @@ class Pipeline:
         batch_size : int
             desired number of items in the batch (the actual batch could contain fewer items)
 
-        shuffle : bool, int, class:`numpy.random.RandomState` or callable
+        shuffle : bool, int, str, class:`numpy.random.RandomState`, callable, BatchSampler or BucketSampler
             specifies the order of items, could be:
 
             - bool - if `False`, items go sequentionally, one after another as they appear in the index.
@@ -1445,6 +1701,12 @@ class Pipeline:
             - callable - a function which takes an array of item indices in the initial order
                 (as they appear in the index) and returns the order of items.
 
+            - 'block' - a locality-aware shuffle with default parameters (see :class:`~.ordering.BlockShuffle`).
+
+            - :class:`~.batch_sampler.BatchSampler` - draws items for each batch (e.g. :class:`~.WeightedSampler`).
+
+            - :class:`~.batch_sampler.BucketSampler` - makes batches of items of similar sizes.
+
         n_iters : int
             Number of iterations to make (only one of `n_iters` and `n_epochs` should be specified).
 
@@ -1469,7 +1731,13 @@ class Pipeline:
 
         target : 'threads' or 'mpc'
             batch parallelization engine used for prefetching (default='threads').
-            'mpc' rarely works well due to complicated and slow python's inter-process communications.
+            'mpc' runs the pipeline in `prefetch` worker processes, each holding its own copy of the pipeline,
+            so variables and models updated within actions are not visible in the main process.
+            Batch arrays are transported through shared memory without pickling.
+
+        shm_size : int
+            a size (in bytes) of a shared memory slot for one batch when `target='mpc'` (default=64Mb).
+            Batches which do not fit into a slot are pickled.
 
         reset : list of str, str or bool
             what to reset to start from scratch:
@@ -1478,6 +1746,18 @@ class Pipeline:
             - 'variables' - re-initialize all pipeline variables
             - 'models' - reset all models
 
+        profile : bool, 'summary' or 'sampling'
+            whether to profile actions. If 'summary', only per-action aggregates are kept,
+            so memory usage does not grow with the number of iterations (default=False).
+            If 'sampling', stacks of threads executing actions are captured every 5ms
+            instead of tracing all function calls, so the overhead is negligible,
+            though times are estimated and `ncalls` contains the number of samples.
+
+        trace : bool, str or :class:`~.Tracer`
+            whether to record a timeline of actions, batches, parallel chunks and waits in all threads.
+            If str, the trace is saved into a file with this name when the iteration is over,
+            otherwise it is available as `pipeline.tracer`. See :class:`~.Tracer` for details.
+
         Yields
         ------
         an instance of the batch class returned by the last action
@@ -1499,12 +1779,44 @@ class Pipeline:
         args_value = self._eval_expr(args)
         kwargs_value = self._eval_expr(kwargs)
         self.reset(reset)
+        self.compile()
         self._iter_params = iter_params or self._iter_params or Baseset.get_default_iter_params()
         self._profile = profile
-        if profile:
+        if profile == 'sampling':
+            self._profiler = SamplingProfiler(stop_codes=[Pipeline._exec_plan.__code__])
+        elif profile:
             self._profiler = Profile()
-
-        return self._gen_batch(*args_value, iter_params=self._iter_params, **kwargs_value)
+        if profile:
+            self._profile_info.keep_rows = profile != 'summary'
+
+        trace = kwargs_value.pop('trace', None)
+        batch_generator = self._gen_batch(*args_value, iter_params=self._iter_params, **kwargs_value)
+        if profile == 'sampling':
+            batch_generator = self._sample_batches(batch_generator)
+        if trace:
+            batch_generator = self._trace_batches(batch_generator, trace)
+        if any(action['name'] == REDUCE_ID for action in self._actions):
+            batch_generator = self._save_reduced(batch_generator)
+        return batch_generator
+
+    def _sample_batches(self, batch_generator):
+        """ Run a sampling profiler while batches are generated """
+        self._profiler.start()
+        try:
+            yield from batch_generator
+        finally:
+            self._profiler.stop()
+
+    def _trace_batches(self, batch_generator, trace):
+        """ Record a timeline while batches are generated """
+        self.tracer = trace if isinstance(trace, Tracer) else Tracer()
+        self.tracer.start()
+        try:
+            yield from batch_generator
+        finally:
+            self.tracer.stop()
+            if isinstance(trace, str):
+                self.tracer.save(trace)
 
 
     def _gen_batch(self, *args, **kwargs):
@@ -1512,6 +1824,7 @@ class Pipeline:
         start_time = time.time()
         target = kwargs.pop('target', 'threads')
         prefetch = kwargs.pop('prefetch', 0)
+        shm_size = kwargs.pop('shm_size', None)
         on_iter = kwargs.pop('on_iter', None)
         if 'bar' in kwargs:
             warnings.warn('`bar` argument is deprecated and renamed to `notifier`', DeprecationWarning, stacklevel=2)
@@ -1549,9 +1862,9 @@ class Pipeline:
             prefetch = min(prefetch, 62)
 
             if target in ['threads', 't']:
-                self._executor = cf.ThreadPoolExecutor(max_workers=prefetch + 1)
+                self._executor = self.pools.get('prefetch', prefetch + 1)
             elif target in ['mpc', 'm']:
-                self._executor = cf.ProcessPoolExecutor(max_workers=prefetch + 1)
+                self._executor = ProcessPrefetcher(self, n_workers=prefetch, n_slots=prefetch + 3, slot_size=shm_size)
             else:
                 raise ValueError("target should be one of ['threads', 'mpc']")
 
@@ -1559,21 +1872,26 @@ class Pipeline:
             self._prefetch_count = q.Queue(maxsize=prefetch + 1)
             self._prefetch_queue = q.Queue(maxsize=prefetch)
             self._batch_queue = q.Queue(maxsize=1)
-            self._service_executor = cf.ThreadPoolExecutor(max_workers=2)
-            self._service_executor.submit(self._put_batches_into_queue, batch_generator)
-            self._service_executor.submit(self._run_batches_from_queue, notifier)
-
-            while not self._stop_flag:
-                batch_res = self._batch_queue.get(block=True)
-                self._batch_queue.task_done()
-                if batch_res is not None:
-                    yield batch_res
-                    self._prefetch_count.get(block=True)
-                    self._prefetch_count.task_done()
-                    if callable(on_iter):
-                        on_iter(batch_res)
-                else:
-                    self._stop_flag = True
+            self._service_executor = self.pools.get('service', 2)
+            put_future = self._service_executor.submit(self._put_batches_into_queue, batch_generator)
+            run_future = self._service_executor.submit(self._run_batches_from_queue, notifier)
+
+            try:
+                while not self._stop_flag:
+                    batch_res = self._wait_queue('batch_get', self._batch_queue.get, block=True)
+                    self._batch_queue.task_done()
+                    if batch_res is not None:
+                        yield batch_res
+                        self._prefetch_count.get(block=True)
+                        self._prefetch_count.task_done()
+                        if callable(on_iter):
+                            on_iter(batch_res)
+                    else:
+                        self._stop_flag = True
+            finally:
+                self._stop_service_threads(put_future, run_future)
+                if isinstance(self._executor, ProcessPrefetcher):
+                    self._stop_executor(self._executor)
         else:
             is_empty = True
             for batch in batch_generator:
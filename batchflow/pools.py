@@ -0,0 +1,329 @@
+""" Contains worker pools shared by parallel actions and pipelines """
+import os
+import time
+import threading
+import weakref
+import concurrent.futures as cf
+
+
+def cpu_count():
+    """ Return the number of CPUs available to the current process """
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count()
+    return count or 1
+
+
+# pool name -> executor kind
+POOL_KINDS = dict(threads='threads', nogil='threads', mpc='processes', prefetch='threads', service='threads',
+                  scan='threads')
+
+# aliases used as `target` in decorators and pipelines
+POOL_ALIASES = dict(t='threads', m='mpc')
+
+
+def default_pool_sizes():
+    """ Return default numbers of workers for each pool """
+    return dict(threads=cpu_count() * 4, nogil=cpu_count(), mpc=cpu_count(), scan=max(16, cpu_count() * 4))
+
+
+_worker_local = threading.local()
+
+# all registries in the process, so that pools inherited by a forked child can be discarded
+_registries = weakref.WeakSet()
+
+
+class WorkerPool:
+    """ A lazily started executor which keeps track of its utilisation
+
+    Parameters
+    ----------
+    name : str
+        a pool name (e.g. 'threads', 'mpc', 'prefetch')
+    kind : {'threads', 'processes'}
+        an executor type
+    max_workers : int
+        a number of workers
+
+    Notes
+    -----
+    An underlying executor is created when the first task is submitted and it might be
+    restarted after :meth:`.shutdown`.
+
+    For thread pools `busy_time` is a time spent by workers executing tasks,
+    while for process pools it also includes the time tasks have been waiting in the queue.
+    """
+    def __init__(self, name, kind='threads', max_workers=None):
+        if kind not in ['threads', 'processes']:
+            raise ValueError("kind should be 'threads' or 'processes'", kind)
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers or default_pool_sizes().get(name, cpu_count())
+        self._executor = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.active = 0
+        self.peak_active = 0
+        self.busy_time = 0.
+        self.started_at = None
+        self.n_starts = 0
+
+    def __getstate__(self):
+        return dict(name=self.name, kind=self.kind, max_workers=self.max_workers)
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, trback):
+        self.shutdown()
+
+    def __repr__(self):
+        return '%s(%r, kind=%r, max_workers=%d, started=%s)' % (type(self).__name__, self.name, self.kind,
+                                                                self.max_workers, self.is_started)
+
+    @property
+    def is_started(self):
+        """ bool : whether the underlying executor is running """
+        return self._executor is not None
+
+    def _init_worker(self):
+        _worker_local.pool = self
+
+    def start(self):
+        """ Create an underlying executor if it does not exist yet """
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.kind == 'threads':
+                        executor = cf.ThreadPoolExecutor(max_workers=self.max_workers,
+                                                         thread_name_prefix='batchflow-' + self.name,
+                                                         initializer=self._init_worker)
+                    else:
+                        executor = cf.ProcessPoolExecutor(max_workers=self.max_workers)
+                    self.started_at = time.perf_counter()
+                    self.n_starts += 1
+                    self._executor = executor
+        return self._executor
+
+    def in_worker(self):
+        """ Check whether the current thread is one of the pool workers """
+        return getattr(_worker_local, 'pool', None) is self
+
+    def _run(self, fn, *args, **kwargs):
+        """ Execute a task in a worker thread and update counters """
+        with self._lock:
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.active -= 1
+                self.busy_time += elapsed
+
+    def _task_done(self, future, start=None):
+        with self._lock:
+            if start is not None:
+                self.active -= 1
+                self.busy_time += time.perf_counter() - start
+            self.completed += 1
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+
+    def submit(self, fn, *args, **kwargs):
+        """ Schedule a callable to be executed in the pool
+
+        Returns
+        -------
+        concurrent.futures.Future
+        """
+        executor = self.start()
+        with self._lock:
+            self.submitted += 1
+        if self.kind == 'threads':
+            future = executor.submit(self._run, fn, *args, **kwargs)
+            future.add_done_callback(self._task_done)
+        else:
+            with self._lock:
+                self.active += 1
+                self.peak_active = max(self.peak_active, self.active)
+            future = executor.submit(fn, *args, **kwargs)
+            future.add_done_callback(lambda f, start=time.perf_counter(): self._task_done(f, start))
+        return future
+
+    def resize(self, max_workers):
+        """ Change a number of workers
+
+        A running executor is stopped without waiting for its tasks and a new one is started upon the next submission.
+        """
+        with self._lock:
+            if max_workers == self.max_workers:
+                return
+            self.max_workers = max_workers
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def shutdown(self, wait=True):
+        """ Stop the underlying executor (it will be restarted upon the next submission) """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def stats(self):
+        """ Return pool utilisation counters
+
+        Returns
+        -------
+        dict
+            with keys `name`, `kind`, `max_workers`, `started`, `submitted`, `completed`, `failed`,
+            `active`, `peak_active`, `busy_time`, `uptime` and `utilisation` (a share of workers' time spent on tasks)
+        """
+        with self._lock:
+            uptime = time.perf_counter() - self.started_at if self.started_at is not None else 0.
+            utilisation = self.busy_time / (uptime * self.max_workers) if uptime > 0 else 0.
+            return dict(name=self.name, kind=self.kind, max_workers=self.max_workers, started=self.is_started,
+                        submitted=self.submitted, completed=self.completed, failed=self.failed,
+                        active=self.active, peak_active=self.peak_active,
+                        busy_time=self.busy_time, uptime=uptime, utilisation=min(utilisation, 1.))
+
+
+class PoolRegistry:
+    """ A collection of lazily started worker pools
+
+    A pipeline holds its own registry which is used by all its parallel actions (see
+    :func:`~batchflow.inbatch_parallel` and :meth:`~batchflow.Batch.apply_parallel`) and prefetching.
+    Actions executed outside of any pipeline share a process-wide registry :data:`~batchflow.shared_pools`.
+
+    Parameters
+    ----------
+    sizes : dict
+        default numbers of workers for pools, e.g. `threads=16, mpc=4`
+
+    Examples
+    --------
+    ::
+
+        pipeline.pools.configure(threads=8)
+        pipeline.run(BATCH_SIZE, n_epochs=1, prefetch=4)
+        pipeline.pools.stats()
+    """
+    def __init__(self, **sizes):
+        self.sizes = {}
+        self._pools = {}
+        self._lock = threading.Lock()
+        self.configure(**sizes)
+        _registries.add(self)
+
+    def __getstate__(self):
+        return dict(sizes=self.sizes)
+
+    def __setstate__(self, state):
+        self.__init__(**state['sizes'])
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join(repr(pool) for pool in self._pools.values()))
+
+    def copy(self):
+        """ Return a new registry with the same pool sizes (pools are not shared) """
+        return type(self)(**self.sizes)
+
+    def configure(self, **sizes):
+        """ Set default numbers of workers for pools
+
+        Running pools with changed sizes are restarted upon the next request.
+        """
+        for name, size in sizes.items():
+            name = POOL_ALIASES.get(name, name)
+            if size is not None and size < 1:
+                raise ValueError("A pool should have at least one worker", name, size)
+            self.sizes[name] = size
+        return self
+
+    def get(self, name, max_workers=None, kind=None):
+        """ Return a pool (it is created if it does not exist yet)
+
+        Parameters
+        ----------
+        name : str
+            a pool name, e.g. 'threads', 'mpc', 'prefetch'
+        max_workers : int
+            a number of workers. If None, a configured or a default size is used.
+        kind : {'threads', 'processes'}
+            an executor type. If None, it is inferred from the name.
+
+        Returns
+        -------
+        WorkerPool
+
+        Notes
+        -----
+        There is only one pool of each name and kind, so it is resized (and restarted) when another number
+        of workers is requested.
+        """
+        name = POOL_ALIASES.get(name, name)
+        kind = kind or POOL_KINDS.get(name, 'threads')
+        max_workers = max_workers or self.sizes.get(name) or default_pool_sizes().get(name, cpu_count())
+        key = name, kind
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    pool = WorkerPool(name, kind=kind, max_workers=max_workers)
+                    self._pools[key] = pool
+        pool.resize(max_workers)
+        return pool
+
+    def _forget(self):
+        """ Drop all pools without stopping them (e.g. executors inherited from a parent process) """
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def pools(self):
+        """ Return a list of all pools created so far """
+        return list(self._pools.values())
+
+    def shutdown(self, wait=True):
+        """ Stop all running pools (they will be restarted upon the next request) """
+        for pool in self.pools():
+            pool.shutdown(wait=wait)
+
+    def stats(self):
+        """ Return utilisation counters of all pools
+
+        Returns
+        -------
+        dict
+            pool name and size -> pool stats (see :meth:`.WorkerPool.stats`)
+        """
+        return {'%s[%d]' % (pool.name, pool.max_workers): pool.stats() for pool in self.pools()}
+
+
+shared_pools = PoolRegistry()
+
+
+def _after_fork_in_child():
+    """ Forget pools inherited from a parent process as their workers do not exist in a child """
+    for registry in list(_registries):
+        registry._forget()      # pylint: disable=protected-access
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def get_pools(obj=None):
+    """ Return a pool registry of a pipeline the object belongs to or a process-wide registry """
+    pipeline = getattr(obj, 'pipeline', None) if obj is not None else None
+    pools = getattr(pipeline, 'pools', None) if pipeline is not None else None
+    return pools if isinstance(pools, PoolRegistry) else shared_pools
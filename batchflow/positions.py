@@ -0,0 +1,213 @@
+""" Contains structures to look up positions of items in an index """
+import numpy as np
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+
+# string indices longer than this are searched in a sorted array, as a hash table would copy all strings
+MAX_HASH_SIZE = 2 ** 20
+
+
+class BasePositions:
+    """ Base class for position lookups
+
+    Parameters
+    ----------
+    indices : np.ndarray
+        items of an index
+
+    Notes
+    -----
+    For repeated items the first position is returned.
+    """
+    def __init__(self, indices):
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, item):
+        return self.get(item)
+
+    def __contains__(self, item):
+        try:
+            self.get(item)
+        except KeyError:
+            return False
+        return True
+
+    def get(self, item):
+        """ Return a position of an item
+
+        Raises
+        ------
+        KeyError
+            if the item is not in the index
+        """
+        return int(self.get_many([item])[0])
+
+    def get_many(self, items):
+        """ Return positions of items
+
+        Parameters
+        ----------
+        items : 1-d array-like
+
+        Returns
+        -------
+        np.ndarray of positions
+
+        Raises
+        ------
+        KeyError
+            if some items are not in the index
+        """
+        raise NotImplementedError()
+
+    @staticmethod
+    def _check_found(items, found):
+        if not found.all():
+            raise KeyError(np.asarray(items)[~found][0])
+
+
+class DictPositions(BasePositions):
+    """ Positions stored in a dict (suitable for small indices or object items) """
+    def __init__(self, indices):
+        super().__init__(indices)
+        self.positions = {}
+        for pos, item in enumerate(indices):
+            self.positions.setdefault(item, pos)
+
+    def get(self, item):
+        return self.positions[item]
+
+    def get_many(self, items):
+        positions = self.positions
+        return np.array([positions[item] for item in items], dtype=np.intp)
+
+
+class RangePositions(BasePositions):
+    """ Positions of consecutive integers, computed without any additional memory """
+    def __init__(self, indices):
+        super().__init__(indices)
+        self.start = int(indices[0]) if len(indices) > 0 else 0
+
+    @staticmethod
+    def is_suitable(indices):
+        """ Check whether indices are consecutive integers """
+        if indices.dtype.kind not in 'iu' or len(indices) == 0:
+            return False
+        return int(indices[-1]) - int(indices[0]) == len(indices) - 1 and (np.diff(indices) == 1).all()
+
+    def get(self, item):
+        if isinstance(item, (int, np.integer)):
+            pos = int(item) - self.start
+            if 0 <= pos < len(self.indices):
+                return pos
+        elif isinstance(item, (float, np.floating, np.bool_)):
+            return super().get(item)
+        raise KeyError(item)
+
+    def get_many(self, items):
+        items = np.asarray(items)
+        if items.dtype.kind in 'bf':
+            # numbers equal to integers (e.g. 3.0) are found as a dict lookup would find them
+            with np.errstate(invalid='ignore'):
+                self._check_found(items, np.isfinite(items) & (items % 1 == 0))
+        elif items.dtype.kind not in 'iu':
+            if len(items) == 0:
+                return np.empty(0, dtype=np.intp)
+            raise KeyError(items[0])
+        pos = items.astype(np.intp) - self.start
+        self._check_found(items, (pos >= 0) & (pos < len(self.indices)))
+        return pos
+
+
+class SortedPositions(BasePositions):
+    """ Positions found by a binary search over sorted items (8 bytes per item) """
+    def __init__(self, indices):
+        super().__init__(indices)
+        self.sorter = np.argsort(indices, kind='stable')
+
+    def get_many(self, items):
+        items = np.asarray(items)
+        if len(self.indices) == 0 or len(items) == 0:
+            self._check_found(items, np.zeros(len(items), dtype=bool))
+            return np.empty(0, dtype=np.intp)
+        try:
+            pos = np.searchsorted(self.indices, items, sorter=self.sorter)
+        except TypeError:
+            raise KeyError(items[0]) from None
+        positions = self.sorter[np.minimum(pos, len(self.indices) - 1)]
+        self._check_found(items, self.indices[positions] == items)
+        return positions
+
+
+class HashPositions(BasePositions):
+    """ Positions stored in a `pandas.Index` hash table
+
+    Raises
+    ------
+    ValueError
+        if items are not unique
+    """
+    def __init__(self, indices):
+        if pd is None:
+            raise ImportError("pandas is required for hash positions")
+        super().__init__(indices)
+        self.index = pd.Index(indices)
+        if not self.index.is_unique:
+            raise ValueError("Hash positions require unique items")
+
+    def get(self, item):
+        return self.index.get_loc(item)
+
+    def get_many(self, items):
+        positions = self.index.get_indexer(items)
+        self._check_found(items, positions >= 0)
+        return positions
+
+
+POSITION_BACKENDS = dict(dict=DictPositions, range=RangePositions, sorted=SortedPositions, hash=HashPositions)
+
+
+def make_positions(indices, backend=None):
+    """ Create a position lookup structure
+
+    Parameters
+    ----------
+    indices : np.ndarray
+        items of an index
+
+    backend : str, class or None
+        'dict', 'range', 'sorted', 'hash' or a subclass of :class:`BasePositions`.
+        If None, a backend is chosen by the type and the size of the index:
+
+        - consecutive integers - 'range' (no memory at all)
+        - other numbers and dates - 'sorted'
+        - strings - 'hash' (if pandas is available) or 'sorted' for very large indices
+        - other objects - 'hash' or 'dict'
+
+    Returns
+    -------
+    BasePositions
+    """
+    if backend is None:
+        kind = indices.dtype.kind
+        if kind in 'iu' and RangePositions.is_suitable(indices):
+            return RangePositions(indices)
+        if kind in 'biufcmM' or kind in 'US' and (len(indices) > MAX_HASH_SIZE or pd is None):
+            return SortedPositions(indices)
+        if pd is not None:
+            try:
+                return HashPositions(indices)
+            except ValueError:
+                pass
+        return SortedPositions(indices) if kind in 'US' else DictPositions(indices)
+    if isinstance(backend, str):
+        if backend not in POSITION_BACKENDS:
+            raise ValueError("Unknown position backend %s" % backend)
+        backend = POSITION_BACKENDS[backend]
+    return backend(indices)
@@ -0,0 +1,306 @@
+""" Contains a process-based prefetcher which transports batches through shared memory """
+import io
+import queue as q
+import logging
+import threading
+import traceback
+import weakref
+import multiprocessing as mp
+import concurrent.futures as cf
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+import dill
+import numpy as np
+
+
+# arrays smaller than this are pickled along with the batch
+MIN_SHARED_NBYTES = 1024
+ALIGNMENT = 64
+# array subclasses which would lose their type or data source when restored from shared memory
+NOT_SHARED_TYPES = (np.memmap, np.matrix, np.ma.MaskedArray)
+DEFAULT_SLOT_SIZE = 64 * 2 ** 20
+
+
+if shared_memory is not None:
+    class _SharedMemory(shared_memory.SharedMemory):
+        """ Shared memory which stays mapped while batch arrays refer to it """
+        def close(self):
+            try:
+                super().close()
+            except BufferError:
+                # arrays viewing the memory still exist, it will be unmapped when they are deleted
+                pass
+
+
+class _RemoteTraceback(Exception):
+    def __init__(self, tb):
+        super().__init__()
+        self.tb = tb
+
+    def __str__(self):
+        return self.tb
+
+
+class _BatchPickler(dill.Pickler):
+    """ Pickle a batch replacing large arrays with descriptors of their copies in a shared memory slot
+    and objects known to both processes (a pipeline, a dataset) with their names
+    """
+    def __init__(self, file, shared_objects, buffer=None):
+        super().__init__(file, protocol=-1)
+        self.shared_objects = shared_objects
+        self.buffer = buffer
+        self.position = 0
+        self.arrays = {}
+
+    def persistent_id(self, obj):    # pylint: disable=method-hidden
+        key = self.shared_objects.get(id(obj))
+        if key is not None:
+            return 'obj', key
+        if self.buffer is not None and isinstance(obj, np.ndarray) and not isinstance(obj, NOT_SHARED_TYPES) \
+           and not obj.dtype.hasobject and obj.nbytes >= MIN_SHARED_NBYTES:
+            descr = self.arrays.get(id(obj))
+            if descr is None:
+                start = -(-self.position // ALIGNMENT) * ALIGNMENT
+                if start + obj.nbytes > len(self.buffer):
+                    return None
+                np.ndarray(obj.shape, obj.dtype, buffer=self.buffer, offset=start)[...] = obj
+                self.position = start + obj.nbytes
+                descr = 'array', start, obj.shape, obj.dtype
+                self.arrays[id(obj)] = descr
+            return descr
+        return None
+
+
+class _BatchUnpickler(dill.Unpickler):
+    """ Unpickle a batch restoring arrays as views into a shared memory slot """
+    def __init__(self, file, shared_objects, buffer=None):
+        super().__init__(file)
+        self.shared_objects = shared_objects
+        self.buffer = buffer
+        self.arrays = {}
+
+    def persistent_load(self, pid):    # pylint: disable=method-hidden
+        if pid[0] == 'obj':
+            return self.shared_objects[pid[1]]
+        _, offset, shape, dtype = pid
+        array = self.arrays.get(offset)
+        if array is None:
+            array = np.ndarray(shape, dtype, buffer=self.buffer, offset=offset)
+            self.arrays[offset] = array
+        return array
+
+
+def dumps_batch(batch, shared_objects, buffer=None):
+    """ Serialize a batch, copying its large arrays into a buffer """
+    file = io.BytesIO()
+    _BatchPickler(file, shared_objects, buffer).dump(batch)
+    return file.getvalue()
+
+
+def loads_batch(data, shared_objects, buffer=None):
+    """ Deserialize a batch, its arrays become views into a buffer """
+    return _BatchUnpickler(io.BytesIO(data), shared_objects, buffer).load()
+
+
+def _get_shared_objects(pipeline):
+    """ Return objects which exist in all processes and should not be transferred """
+    dataset = pipeline._dataset     # pylint: disable=protected-access
+    objects = dict(pipeline=pipeline, dataset=dataset)
+    if dataset is not None and hasattr(dataset, 'preloaded'):
+        objects.update(preloaded=dataset.preloaded, data=dataset.data)
+    return {key: obj for key, obj in objects.items() if obj is not None}
+
+
+def _prefetch_worker(pipeline, shm_name, slot_size, tasks, results):
+    """ Execute a pipeline for batches received from the parent process """
+    if isinstance(pipeline, bytes):
+        pipeline = dill.loads(pipeline)
+    shm = shared_memory.SharedMemory(name=shm_name) if shm_name is not None else None
+    shared_objects = _get_shared_objects(pipeline)
+    shared_ids = {id(obj): key for key, obj in shared_objects.items()}
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, data, slot = task
+        buffer = None
+        try:
+            batch = loads_batch(data, shared_objects)
+            batch = pipeline.execute_for(batch)
+            if slot is not None:
+                buffer = shm.buf[slot * slot_size:(slot + 1) * slot_size]
+            result = dumps_batch(batch, shared_ids, buffer)
+        except Exception as e:      # pylint: disable=broad-except
+            tb = traceback.format_exc()
+            try:
+                dill.dumps(e)
+            except Exception:       # pylint: disable=broad-except
+                e = RuntimeError(repr(e))
+            results.put((task_id, None, (e, tb)))
+        else:
+            results.put((task_id, result, None))
+        finally:
+            if buffer is not None:
+                buffer.release()
+
+    if shm is not None:
+        shm.close()
+
+
+class ProcessPrefetcher:
+    """ Execute a pipeline for batches in persistent worker processes
+
+    Each worker holds its own copy of the pipeline, so variables and models updated in workers
+    are not visible in the parent process.
+
+    Batch arrays are put into a shared memory ring of `n_slots` slots, so only small descriptors are pickled.
+    A batch returned to the parent process contains views into a slot, and the slot is reused
+    only after all these arrays are deleted. When all slots are busy or arrays do not fit into a slot,
+    batches are pickled as a whole.
+
+    Parameters
+    ----------
+    pipeline : Pipeline
+        a pipeline to execute
+    n_workers : int
+        a number of worker processes
+    n_slots : int
+        a number of shared memory slots
+    slot_size : int
+        a slot size in bytes
+    """
+    def __init__(self, pipeline, n_workers=1, n_slots=None, slot_size=None):
+        self.pipeline = pipeline
+        self.n_workers = n_workers
+        self.n_slots = n_slots or n_workers + 2
+        self.slot_size = slot_size or DEFAULT_SLOT_SIZE
+        self.shared_objects = _get_shared_objects(pipeline)
+        self.shared_ids = {id(obj): key for key, obj in self.shared_objects.items()}
+
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._task_id = 0
+        self._free_slots = list(range(self.n_slots))
+        self._stopped = False
+
+        self._shm = None
+        if shared_memory is not None:
+            try:
+                self._shm = _SharedMemory(create=True, size=self.n_slots * self.slot_size)
+            except OSError as e:
+                logging.warning("Shared memory is not available (%s), so batches are pickled as a whole", e)
+        shm_name = self._shm.name if self._shm is not None else None
+
+        if 'fork' in mp.get_all_start_methods():
+            context = mp.get_context('fork')
+            pipeline_arg = pipeline
+        else:
+            context = mp.get_context()
+            pipeline_arg = dill.dumps(pipeline)
+
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._workers = [context.Process(target=_prefetch_worker, daemon=True,
+                                         args=(pipeline_arg, shm_name, self.slot_size, self._tasks, self._results))
+                         for _ in range(n_workers)]
+        for worker in self._workers:
+            worker.start()
+
+        self._receiver = threading.Thread(target=self._receive, name='batchflow-prefetch-receiver', daemon=True)
+        self._receiver.start()
+
+    def submit(self, batch):
+        """ Send a batch to workers
+
+        Returns
+        -------
+        concurrent.futures.Future
+            which results in a batch returned by the pipeline
+        """
+        future = cf.Future()
+        data = dumps_batch(batch, self.shared_ids)
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("Cannot submit a batch after the prefetcher shutdown")
+            task_id = self._task_id
+            self._task_id += 1
+            slot = self._free_slots.pop() if self._free_slots and self._shm is not None else None
+            self._futures[task_id] = future, slot
+        self._tasks.put((task_id, data, slot))
+        return future
+
+    def _release_slot(self, slot):
+        with self._lock:
+            self._free_slots.append(slot)
+
+    def _receive(self):
+        """ Rebuild batches sent by workers """
+        while True:
+            try:
+                task = self._results.get(timeout=1)
+            except q.Empty:
+                if not all(worker.is_alive() for worker in self._workers):
+                    self._fail_all(RuntimeError("A prefetch worker process has died unexpectedly"))
+                    break
+                continue
+            except (EOFError, OSError):
+                break
+            if task is None:
+                break
+
+            task_id, data, error = task
+            with self._lock:
+                future, slot = self._futures.pop(task_id)
+            if error is not None:
+                if slot is not None:
+                    self._release_slot(slot)
+                exc, tb = error
+                exc.__cause__ = _RemoteTraceback(tb)
+                future.set_exception(exc)
+                continue
+
+            try:
+                buffer = None
+                if slot is not None:
+                    buffer = np.frombuffer(self._shm.buf, dtype=np.uint8, count=self.slot_size,
+                                           offset=slot * self.slot_size)
+                    # a slot is reused when all the arrays viewing it are deleted
+                    weakref.finalize(buffer, self._release_slot, slot)
+                batch = loads_batch(data, self.shared_objects, buffer)
+                batch.pipeline = self.pipeline
+            except Exception as e:      # pylint: disable=broad-except
+                future.set_exception(e)
+            else:
+                future.set_result(batch)
+            del buffer
+
+    def _fail_all(self, exc):
+        with self._lock:
+            futures, self._futures = self._futures, {}
+        for future, _ in futures.values():
+            future.set_exception(exc)
+
+    def shutdown(self, wait=True):
+        """ Stop worker processes """
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+        for _ in self._workers:
+            self._tasks.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5 if wait else 0)
+            if worker.is_alive():
+                worker.terminate()
+        self._results.put(None)
+        self._receiver.join()
+        self._fail_all(RuntimeError("The prefetcher has been shut down"))
+        self._tasks.close()
+        self._results.close()
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
@@ -0,0 +1,268 @@
+""" Contains a storage for pipeline profiling data and a sampling profiler """
+import sys
+import threading
+
+import numpy as np
+try:
+    import pandas as pd
+except ImportError:
+    from . import _fake as pd
+
+
+BASE_COLUMNS = ['total_time', 'pipeline_time']
+DETAILED_COLUMNS = ['ncalls', 'tottime', 'cumtime']
+ROW_COLUMNS = ['iter', 'total_time', 'pipeline_time', 'ncalls', 'tottime', 'cumtime', 'batch_id']
+AGGREGATES = ['sum', 'mean', 'max']
+
+
+class ProfileInfo:
+    """ Append-friendly storage of pipeline profiling data
+
+    Data is kept in lists of primitive values and turned into a dataframe only on demand.
+    Besides, sums and maximums for each action (and for each function within an action)
+    are updated incrementally, so the summary is available even when rows are not kept.
+
+    Parameters
+    ----------
+    keep_rows : bool
+        whether to keep all profiling rows (otherwise only aggregates are kept and memory usage is bounded)
+    """
+    def __init__(self, keep_rows=True):
+        self.keep_rows = keep_rows
+        self._lock = threading.Lock()
+        self._frame = None
+        self.reset()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_lock')
+        state['_frame'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._n_rows
+
+    def reset(self):
+        """ Remove all data """
+        self._rows = {name: [] for name in ['action', 'id'] + ROW_COLUMNS}
+        self._extra = {}
+        self._n_rows = 0
+        self._actions = {}
+        self._details = {}
+        self._frame = None
+
+    @property
+    def is_empty(self):
+        """ bool : whether no data has been added """
+        return len(self._actions) == 0
+
+    @staticmethod
+    def _update(aggregates, key, values):
+        agg = aggregates.get(key)
+        if agg is None:
+            aggregates[key] = [1, list(values), list(values)]
+        else:
+            agg[0] += 1
+            sums, maxs = agg[1], agg[2]
+            for i, value in enumerate(values):
+                sums[i] += value
+                if value > maxs[i]:
+                    maxs[i] = value
+
+    def add(self, action, iter_no, batch_id, total_time, pipeline_time, details=None, **kwargs):
+        """ Add profiling data of one action call
+
+        Parameters
+        ----------
+        action : str
+            an action name
+        iter_no : int
+            an iteration number
+        batch_id : int
+            a batch identifier
+        total_time : float
+            action execution time
+        pipeline_time : float
+            time spent in profiled functions
+        details : sequence of tuples
+            (id, ncalls, tottime, cumtime) for each profiled function
+        kwargs
+            other values to store in rows (e.g. `start_time`)
+        """
+        details = details or []
+        with self._lock:
+            self._frame = None
+            self._update(self._actions, action, (total_time, pipeline_time))
+            for fid, ncalls, tottime, cumtime in details:
+                self._update(self._details, (action, fid), (ncalls, tottime, cumtime))
+
+            if not self.keep_rows:
+                return
+
+            n = len(details)
+            rows = self._rows
+            rows['action'].extend([action] * n)
+            rows['iter'].extend([iter_no] * n)
+            rows['batch_id'].extend([batch_id] * n)
+            rows['total_time'].extend([total_time] * n)
+            rows['pipeline_time'].extend([pipeline_time] * n)
+            for fid, ncalls, tottime, cumtime in details:
+                rows['id'].append(fid)
+                rows['ncalls'].append(ncalls)
+                rows['tottime'].append(tottime)
+                rows['cumtime'].append(cumtime)
+
+            for name in set(self._extra) | set(kwargs):
+                column = self._extra.setdefault(name, [np.nan] * self._n_rows)
+                column.extend([kwargs.get(name, np.nan)] * n)
+            self._n_rows += n
+
+    def to_frame(self):
+        """ Return all profiling rows as a dataframe indexed by action and function id """
+        with self._lock:
+            if self._frame is None:
+                index = pd.MultiIndex.from_arrays([self._rows['action'], self._rows['id']], names=['action', 'id'])
+                data = {name: self._rows[name] for name in ROW_COLUMNS}
+                data.update(self._extra)
+                self._frame = pd.DataFrame(data, index=index, columns=ROW_COLUMNS + list(self._extra))
+            return self._frame
+
+    def summary(self, detailed=False, columns=None):
+        """ Return sum, mean and max of profiling values for each action
+
+        Parameters
+        ----------
+        detailed : bool
+            whether to aggregate values for each function called within actions
+        columns : sequence of str
+            values to aggregate (by default `total_time` and `pipeline_time`, or `ncalls`, `tottime`
+            and `cumtime` if detailed)
+
+        Returns
+        -------
+        pd.DataFrame
+        """
+        all_columns = DETAILED_COLUMNS if detailed else BASE_COLUMNS
+        columns = columns or all_columns
+        if any(column not in all_columns for column in columns):
+            raise ValueError("Only %s could be aggregated" % all_columns, columns)
+
+        with self._lock:
+            aggregates = self._details if detailed else self._actions
+            keys = list(aggregates)
+            data = {}
+            for column in columns:
+                i = all_columns.index(column)
+                sums = np.array([aggregates[key][1][i] for key in keys], dtype=np.float64)
+                counts = np.array([aggregates[key][0] for key in keys], dtype=np.float64)
+                data[(column, 'sum')] = sums
+                data[(column, 'mean')] = sums / np.maximum(counts, 1)
+                data[(column, 'max')] = np.array([aggregates[key][2][i] for key in keys], dtype=np.float64)
+
+        if detailed:
+            index = pd.MultiIndex.from_arrays([[key[0] for key in keys], [key[1] for key in keys]],
+                                              names=['action', 'id'])
+        else:
+            index = pd.Index(keys, name='action')
+        return pd.DataFrame(data, index=index, columns=pd.MultiIndex.from_product([columns, AGGREGATES]))
+
+
+class SamplingProfiler:
+    """ Periodically captures stacks of threads which execute actions
+
+    A thread marks the beginning and the end of each action with :meth:`enter` and :meth:`leave`,
+    while a background thread looks at its current stack every `interval` seconds.
+    Each function in a stack gets a sample for `cumtime`, and the innermost one also gets a sample for `tottime`,
+    so times are estimated as a number of samples multiplied by `interval`.
+
+    Parameters
+    ----------
+    interval : float
+        time between samples in seconds
+    stop_codes : sequence of code objects
+        stack walking stops at frames executing these code objects (e.g. a function which calls actions)
+    """
+    def __init__(self, interval=0.005, stop_codes=None):
+        self.interval = interval
+        self.stop_codes = frozenset(stop_codes or [])
+        self._lock = threading.Lock()
+        self._threads = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """ Start sampling in a background thread """
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='batchflow-sampler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """ Stop sampling """
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        return self
+
+    def enter(self):
+        """ Start collecting samples of the current thread """
+        with self._lock:
+            self._threads.setdefault(threading.get_ident(), []).append([0, {}])
+
+    def leave(self):
+        """ Stop collecting samples of the current thread
+
+        Returns
+        -------
+        details : list of tuples
+            (id, number of samples, tottime, cumtime) for each sampled function.
+            The number of samples is stored in place of a number of calls.
+        sampled_time : float
+            time estimated from all samples
+        """
+        tid = threading.get_ident()
+        with self._lock:
+            stack = self._threads[tid]
+            n_samples, samples = stack.pop()
+            if not stack:
+                del self._threads[tid]
+        interval = self.interval
+        details = [(fid, cum, own * interval, cum * interval) for fid, (own, cum) in samples.items()]
+        return details, n_samples * interval
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """ Capture stacks of all profiled threads """
+        frames = sys._current_frames()      # pylint: disable=protected-access
+        with self._lock:
+            for tid, stack in self._threads.items():
+                frame = frames.get(tid)
+                if frame is None or not stack:
+                    continue
+                current = stack[-1]
+                current[0] += 1
+                samples = current[1]
+                seen = set()
+                innermost = True
+                while frame is not None and frame.f_code not in self.stop_codes:
+                    code = frame.f_code
+                    fid = '{}::{}::{}'.format(code.co_name, code.co_filename, code.co_firstlineno)
+                    if fid not in seen:
+                        seen.add(fid)
+                        counts = samples.get(fid)
+                        if counts is None:
+                            counts = samples[fid] = [0, 0]
+                        counts[0] += innermost
+                        counts[1] += 1
+                    innermost = False
+                    frame = frame.f_back
+        del frames
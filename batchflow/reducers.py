@@ -0,0 +1,240 @@
+""" Contains associative reducers which compute statistics over batches """
+from collections import Counter
+
+import numpy as np
+
+
+class Reducer:
+    """ An associative reduction of batch values
+
+    A reduction keeps a partial state for each worker, updates it with values of each batch
+    and combines partial states when the result is needed (see :meth:`~.Pipeline.reduce`).
+    Since `combine` should be associative, states might be combined in any grouping.
+
+    Child classes redefine :meth:`init`, :meth:`update`, :meth:`combine` and :meth:`result`,
+    while a custom reduction might be created from functions.
+
+    Parameters
+    ----------
+    init : callable or None
+        a function without arguments which returns an initial state (if None, the initial state is None)
+    update : callable or None
+        a function which takes a state and a batch value and returns a new state
+        (if None, the value is combined with the state)
+    combine : callable
+        a function which takes two states and returns a combined state
+    result : callable or None
+        a function which takes a final state and returns a result (if None, the state itself)
+
+    Examples
+    --------
+    A set of all words::
+
+        Reducer(init=set, update=lambda state, words: state | set(words), combine=set.union)
+    """
+    def __init__(self, init=None, update=None, combine=None, result=None):
+        self._init = init
+        self._update = update
+        self._combine = combine
+        self._result = result
+
+    def init(self):
+        """ Return an initial state """
+        return self._init() if self._init is not None else None
+
+    def update(self, state, value):
+        """ Return a state updated with a batch value """
+        if self._update is not None:
+            return self._update(state, value)
+        return value if state is None else self.combine(state, value)
+
+    def combine(self, state, other):
+        """ Return a state combined from two states """
+        if self._combine is None:
+            raise NotImplementedError("combine should be specified")
+        return self._combine(state, other)
+
+    def result(self, state):
+        """ Return a result from a final state """
+        return self._result(state) if self._result is not None else state
+
+    def reduce(self, states):
+        """ Combine states of all workers and return the result """
+        state = self.init()
+        for other in states:
+            state = other if state is None else self.combine(state, other)
+        return self.result(state)
+
+
+class _AxisReducer(Reducer):
+    """ A reducer of numeric arrays along given axes (all axes, if `axis` is None) """
+    def __init__(self, axis=None):
+        super().__init__()
+        self.axis = axis
+
+    def reduce_batch(self, value):
+        """ Return a state for a batch value """
+        raise NotImplementedError()
+
+    def update(self, state, value):
+        value = self.reduce_batch(np.asarray(value))
+        return value if state is None else self.combine(state, value)
+
+    def combine(self, state, other):
+        if state is None or other is None:
+            return other if state is None else state
+        return self._combine_states(state, other)
+
+    def _combine_states(self, state, other):
+        raise NotImplementedError()
+
+    def count(self, value):
+        """ Return a number of elements reduced into each element of a result """
+        axis = range(value.ndim) if self.axis is None else np.atleast_1d(self.axis)
+        return int(np.prod([value.shape[ax] for ax in axis]))
+
+
+class Sum(_AxisReducer):
+    """ A sum of values """
+    def reduce_batch(self, value):
+        return np.sum(value, axis=self.axis)
+
+    def _combine_states(self, state, other):
+        return state + other
+
+
+class Count(_AxisReducer):
+    """ A number of elements (e.g. items with `axis=0`) """
+    def reduce_batch(self, value):
+        return self.count(value)
+
+    def _combine_states(self, state, other):
+        return state + other
+
+    def result(self, state):
+        return 0 if state is None else state
+
+
+class Min(_AxisReducer):
+    """ A minimum of values """
+    def reduce_batch(self, value):
+        return np.min(value, axis=self.axis)
+
+    def _combine_states(self, state, other):
+        return np.minimum(state, other)
+
+
+class Max(_AxisReducer):
+    """ A maximum of values """
+    def reduce_batch(self, value):
+        return np.max(value, axis=self.axis)
+
+    def _combine_states(self, state, other):
+        return np.maximum(state, other)
+
+
+class MeanVar(_AxisReducer):
+    """ A mean and a variance of values
+
+    Each batch is reduced to a count, a mean and a sum of squared deviations, which are combined
+    with the parallel variant of Welford's algorithm, so the result is numerically stable.
+
+    Parameters
+    ----------
+    axis : int, tuple of int or None
+        axes to reduce (e.g. `(0, 1, 2)` to get per-channel statistics of a batch of images)
+    ddof : int
+        delta degrees of freedom of the variance
+
+    Returns
+    -------
+    dict with `count`, `mean`, `var` and `std`
+    """
+    def __init__(self, axis=None, ddof=0):
+        super().__init__(axis=axis)
+        self.ddof = ddof
+
+    def reduce_batch(self, value):
+        value = value.astype(np.float64)
+        count = self.count(value)
+        if count == 0:
+            zeros = np.zeros_like(np.sum(value, axis=self.axis))
+            return count, zeros, zeros
+        mean = np.mean(value, axis=self.axis, keepdims=True)
+        sq_dev = np.sum((value - mean) ** 2, axis=self.axis)
+        return count, mean.reshape(np.shape(sq_dev)), sq_dev
+
+    def _combine_states(self, state, other):
+        count, mean, sq_dev = state
+        other_count, other_mean, other_sq_dev = other
+        # states of empty batches do not change statistics
+        if other_count == 0:
+            return state
+        if count == 0:
+            return other
+        total = count + other_count
+        delta = other_mean - mean
+        mean = mean + delta * other_count / total
+        sq_dev = sq_dev + other_sq_dev + delta ** 2 * count * other_count / total
+        return total, mean, sq_dev
+
+    def result(self, state):
+        if state is None:
+            return None
+        count, mean, sq_dev = state
+        var = sq_dev / (count - self.ddof)
+        return dict(count=count, mean=mean, var=var, std=np.sqrt(var))
+
+
+class Histogram(Reducer):
+    """ A histogram of values with fixed bins
+
+    Parameters
+    ----------
+    bins : int or sequence of numbers
+        a number of equal-width bins (then `range` is required) or bin edges
+    range : tuple of two numbers
+        the lower and upper range of bins
+
+    Returns
+    -------
+    counts : np.ndarray
+        numbers of values in bins
+    edges : np.ndarray
+        bin edges
+    """
+    def __init__(self, bins, range=None):     # pylint: disable=redefined-builtin
+        super().__init__()
+        if np.ndim(bins) == 0 and range is None:
+            raise ValueError("range should be specified, so that all batches have the same bins")
+        self.edges = np.histogram_bin_edges([], bins=bins, range=range)
+
+    def update(self, state, value):
+        counts = np.histogram(np.asarray(value).ravel(), bins=self.edges)[0]
+        return counts if state is None else state + counts
+
+    def combine(self, state, other):
+        return state + other
+
+    def result(self, state):
+        counts = np.zeros(len(self.edges) - 1, dtype=np.int64) if state is None else state
+        return counts, self.edges
+
+
+class ValueCounts(Reducer):
+    """ Numbers of occurrences of distinct values (e.g. class labels or words of a vocabulary)
+
+    Returns
+    -------
+    :class:`collections.Counter`
+    """
+    def init(self):
+        return Counter()
+
+    def update(self, state, value):
+        values, counts = np.unique(np.asarray(value).ravel(), return_counts=True)
+        state.update(dict(zip(values.tolist(), counts.tolist())))
+        return state
+
+    def combine(self, state, other):
+        return state + other
@@ -0,0 +1,196 @@
+""" Contains a parallel directory scanner with an on-disk cache """
+import os
+import glob
+import hashlib
+import fnmatch
+
+import numpy as np
+
+from .pools import shared_pools
+
+
+MANIFEST_VERSION = 1
+
+
+def _is_hidden(name):
+    return name.startswith('.')
+
+
+def _split_pattern(pattern):
+    """ Return a directory without wildcards and the rest of pattern components
+
+    A drive (on Windows) stays in the root and both separators (e.g. '\\' and '/') split the pattern.
+    """
+    root, pattern = os.path.splitdrive(pattern)
+    if os.altsep:
+        pattern = pattern.replace(os.altsep, os.sep)
+    if pattern.startswith(os.sep):
+        root += os.sep
+    parts = [part for part in pattern.split(os.sep) if part]
+    while len(parts) > 1 and not glob.has_magic(parts[0]):
+        root = os.path.join(root, parts.pop(0))
+    return root, parts
+
+
+def _scan_dir(directory, parts, depth, dirs):
+    """ List a directory and match its entries against the pattern component at a given depth
+
+    Returns
+    -------
+    found : list of str
+        matching paths
+    subdirs : list of (str, int)
+        directories to scan and pattern depths for them
+    mtime : int or None
+        directory modification time in nanoseconds (None if it cannot be listed)
+    """
+    part = parts[depth]
+    last = depth == len(parts) - 1
+    recursive = part == '**'
+    found, subdirs = [], []
+    try:
+        mtime = os.stat(directory or os.curdir).st_mtime_ns
+        entries = list(os.scandir(directory or os.curdir))
+    except OSError:
+        return found, subdirs, None
+
+    for entry in entries:
+        name = entry.name
+        path = os.path.join(directory, name)
+        try:
+            is_dir = entry.is_dir()
+            is_file = not is_dir and entry.is_file()
+        except OSError:
+            continue
+
+        if recursive:
+            if _is_hidden(name):
+                continue
+            if is_dir:
+                subdirs.append((path, depth))
+            elif last and not dirs and is_file:
+                found.append(path)
+        elif fnmatch.fnmatch(name, part) and (not _is_hidden(name) or _is_hidden(part)):
+            if last:
+                if is_dir if dirs else is_file:
+                    found.append(path)
+            elif is_dir:
+                subdirs.append((path, depth + 1))
+    return found, subdirs, mtime
+
+
+def _load_manifest(cache_file):
+    """ Return cached paths if no scanned directory has changed since the manifest was saved """
+    try:
+        with np.load(cache_file, allow_pickle=False) as manifest:
+            if int(manifest['version']) != MANIFEST_VERSION:
+                return None
+            paths, directories, mtimes = manifest['paths'], manifest['directories'], manifest['mtimes']
+    except (OSError, KeyError, ValueError):
+        return None
+
+    for directory, mtime in zip(directories, mtimes):
+        try:
+            if os.stat(directory or os.curdir).st_mtime_ns != mtime:
+                return None
+        except OSError:
+            return None
+    return paths
+
+
+def _save_manifest(cache_file, paths, directories, mtimes):
+    tmp_file = '{}.{}.tmp.npz'.format(cache_file[:-len('.npz')], os.getpid())
+    np.savez(tmp_file, version=MANIFEST_VERSION, paths=np.asarray(paths, dtype=str),
+             directories=np.asarray(directories, dtype=str), mtimes=np.asarray(mtimes, dtype=np.int64))
+    os.replace(tmp_file, cache_file)
+
+
+def scan(pattern, dirs=False, n_workers=None, cache=None):
+    """ Return paths matching a glob pattern
+
+    Directories at each level of the pattern are listed in parallel with :func:`os.scandir`,
+    and entry types are taken from directory entries, so no additional `stat` calls are made.
+    Hidden entries, `**` and case sensitivity (which depends on the OS) are treated as in :func:`glob.glob`
+    with `recursive=True`.
+    As in :func:`glob.glob`, a pattern ending with a separator matches only directories
+    (they are returned without the trailing separator).
+
+    Parameters
+    ----------
+    pattern : str
+        a glob pattern
+    dirs : bool
+        whether to return directories (otherwise files)
+    n_workers : int
+        a number of threads (by default, the size of 'scan' pool)
+    cache : str
+        a directory to store a manifest with scan results.
+        The manifest is reused until any of scanned directories is modified
+        (for a pattern without wildcards, the directory which contains the path).
+
+    Returns
+    -------
+    np.ndarray of str
+    """
+    if not dirs and pattern.endswith(tuple(sep for sep in (os.sep, os.altsep) if sep)):
+        return np.asarray([], dtype=str)
+
+    cache_file = None
+    if cache is not None:
+        key = '{}|{}|{}'.format(os.path.abspath(pattern), dirs, MANIFEST_VERSION)
+        cache_file = os.path.join(cache, 'batchflow-scan-{}.npz'.format(hashlib.sha1(key.encode()).hexdigest()))
+        paths = _load_manifest(cache_file)
+        if paths is not None:
+            return paths
+
+    root, parts = _split_pattern(pattern)
+    if not parts or len(parts) == 1 and not glob.has_magic(parts[0]):
+        path = os.path.join(root, *parts)
+        check = os.path.isdir if dirs else os.path.isfile
+        paths = [path] if check(path) else []
+        directories, mtimes = [], []
+        parent = os.path.dirname(path)
+        try:
+            mtimes.append(os.stat(parent or os.curdir).st_mtime_ns)
+            directories.append(parent)
+        except OSError:
+            pass
+    else:
+        pool = shared_pools.get('scan', n_workers)
+        paths, directories, mtimes = [], [], []
+        seen = set()
+        level = []
+
+        def _add(directory, depth):
+            # '**' matches zero or more directories, so the directory itself is matched against the next component
+            while (directory, depth) not in seen:
+                seen.add((directory, depth))
+                if parts[depth] != '**':
+                    level.append((directory, depth))
+                    break
+                if depth == len(parts) - 1:
+                    level.append((directory, depth))
+                    if dirs and directory:
+                        paths.append(directory)
+                    break
+                level.append((directory, depth))
+                depth += 1
+
+        _add(root, 0)
+        while level:
+            current, level = level, []
+            futures = [pool.submit(_scan_dir, directory, parts, depth, dirs) for directory, depth in current]
+            for (directory, _), future in zip(current, futures):
+                found, subdirs, mtime = future.result()
+                paths.extend(found)
+                if mtime is not None:
+                    directories.append(directory)
+                    mtimes.append(mtime)
+                for subdir, depth in subdirs:
+                    _add(subdir, depth)
+
+    # results cannot be validated if no directory has been listed (e.g. it does not exist yet)
+    if cache_file is not None and directories:
+        os.makedirs(cache, exist_ok=True)
+        _save_manifest(cache_file, paths, directories, mtimes)
+    return np.asarray(paths, dtype=str)
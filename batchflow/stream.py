@@ -0,0 +1,384 @@
+""" Contains an index and a dataset which take items from a stream """
+import itertools
+import threading
+
+import numpy as np
+
+from .base import Baseset
+from .batch import Batch
+from .dataset import Dataset
+from .dsindex import DatasetIndex
+from .notifier import Notifier
+
+
+class ShuffleBuffer:
+    """ A fixed-size buffer which returns items of a stream in an approximately random order
+
+    When items are taken in a random order, the buffer is filled with the first `size` items of the stream.
+    Then items for each batch are randomly chosen among the buffered ones and the new items of the stream,
+    and the rest are kept in the buffer. So no more than `size` items (plus one batch) are kept in memory,
+    while an item might be returned much later than the items which came after it.
+    The larger the buffer, the closer the order is to a uniform random permutation.
+
+    When items are taken sequentially, they are returned in the order they come.
+
+    Parameters
+    ----------
+    source : iterable
+        a stream of items
+    size : int
+        a number of buffered items
+    """
+    def __init__(self, source, size=1024):
+        if size < 0:
+            raise ValueError("Buffer size should be non-negative", size)
+        self.source = iter(source)
+        self.size = size
+        self.items = []
+        self.n_pulled = 0
+        self.exhausted = False
+
+    def __len__(self):
+        return len(self.items)
+
+    def _pull(self, size):
+        """ Take the next `size` items from the stream """
+        if self.exhausted:
+            return []
+        items = list(itertools.islice(self.source, size))
+        self.n_pulled += len(items)
+        if len(items) < size:
+            self.exhausted = True
+        return items
+
+    def take(self, size, random_state=None):
+        """ Return the next items (fewer than `size` only when the stream is over)
+
+        Parameters
+        ----------
+        size : int
+            a number of items
+        random_state : :class:`numpy.random.RandomState`, `numpy.random` or None
+            a generator to choose items with (if None, items are returned in the order they come)
+
+        Returns
+        -------
+        list
+        """
+        if random_state is None:
+            batch = self.items[:size]
+            del self.items[:size]
+            batch.extend(self._pull(size - len(batch)))
+            return batch
+
+        self.items.extend(self._pull(max(self.size - len(self.items), 0) + size))
+        n_items = len(self.items)
+        size = min(size, n_items)
+        # each item is chosen among the rest, and its place is taken by the last one
+        positions = random_state.randint(0, np.arange(n_items, n_items - size, -1)) if size > 0 else []
+        batch = []
+        for pos in positions:
+            batch.append(self.items[pos])
+            self.items[pos] = self.items[-1]
+            self.items.pop()
+        return batch
+
+
+class StreamIndex(Baseset):
+    """ An index of items which come from a stream (e.g. a generator, a queue or a growing file)
+
+    Unlike :class:`~.DatasetIndex`, the index items are not known in advance. They are taken from the stream
+    batch by batch, so only a buffer of items is kept in memory. A stream could be iterated over only once:
+    iteration stops when the stream is over, while `reset('iter')` does not rewind it.
+
+    Shuffling is approximate: items for each batch are randomly chosen from a buffer of `buffer_size` items
+    (see :class:`ShuffleBuffer`).
+
+    Parameters
+    ----------
+    source : iterable or callable
+        a stream of index items or a function without arguments which returns it
+    buffer_size : int
+        a number of items to choose from when shuffling
+    numbered : bool
+        if True, stream items are data items and their numbers in the stream are used as index items
+
+    Examples
+    --------
+    >>> index = StreamIndex(tail_lines('/var/log/files.log'), buffer_size=10000)
+    >>> for batch_index in index.gen_batch(BATCH_SIZE, shuffle=True, n_iters=1000):
+    ...     ...
+    """
+    def __init__(self, source, buffer_size=1024, numbered=False):
+        self.numbered = numbered
+        self._lock = threading.Lock()
+        super().__init__(source, buffer_size)
+
+    def build_index(self, source, buffer_size=1024):     # pylint: disable=arguments-differ
+        """ Create a buffer for the stream """
+        if callable(source):
+            source = source()
+        if self.numbered:
+            source = enumerate(source)
+        return ShuffleBuffer(source, buffer_size)
+
+    @property
+    def buffer(self):
+        """ :class:`ShuffleBuffer` : a buffer of stream items """
+        return self._index
+
+    @property
+    def indices(self):
+        """ :class:`numpy.ndarray` : index items in the buffer """
+        items = self.buffer.items
+        if self.numbered:
+            return np.array([number for number, _ in items], dtype=np.int64)
+        return np.asarray(items)
+
+    def __len__(self):
+        """ A number of items taken from the stream so far """
+        return self.buffer.n_pulled
+
+    @property
+    def is_over(self):
+        """ bool : whether all items of the stream have been taken """
+        return self.buffer.exhausted and len(self.buffer) == 0
+
+    def split(self, shares=0.8, shuffle=False):
+        raise NotImplementedError("A stream cannot be split")
+
+    @staticmethod
+    def _get_random_state(shuffle, iter_params):
+        """ Return a generator to shuffle items with (or None to take them sequentially) """
+        if isinstance(shuffle, bool):
+            return np.random if shuffle else None
+        if isinstance(shuffle, int):
+            if iter_params['_random_state'] is None or iter_params.get('_seed') != shuffle:
+                iter_params['_random_state'] = np.random.RandomState(shuffle)
+                iter_params['_seed'] = shuffle
+            return iter_params['_random_state']
+        if isinstance(shuffle, np.random.RandomState):
+            iter_params['_random_state'] = shuffle
+            return shuffle
+        raise ValueError("shuffle could be bool, int or numpy.random.RandomState", shuffle)
+
+    def next_items(self, batch_size, shuffle=False, n_iters=None, n_epochs=None, drop_last=False, iter_params=None):
+        """ Take items for the next batch from the stream
+
+        Parameters are the same as in :meth:`next_batch`.
+
+        Returns
+        -------
+        indices : np.ndarray
+            index items
+        items : list or None
+            data items, if the index is `numbered`
+        """
+        if n_iters is not None and n_epochs is not None:
+            raise ValueError("Only one of n_iters and n_epochs should be specified.")
+        if n_epochs is not None and n_epochs > 1:
+            raise ValueError("A stream could be iterated over only once, so n_epochs cannot be greater than 1.")
+
+        if iter_params is None:
+            iter_params = self._iter_params
+
+        if iter_params['_stop_iter'] or n_iters is not None and iter_params['_n_iters'] >= n_iters:
+            if 'notifier' in iter_params:
+                iter_params['notifier'].close()
+            raise StopIteration("Stream is over. No more batches left.")
+
+        random_state = self._get_random_state(shuffle, iter_params)
+        with self._lock:
+            items = self.buffer.take(batch_size, random_state)
+
+        if len(items) < batch_size:
+            # the stream is over
+            iter_params['_stop_iter'] = True
+            iter_params['_n_epochs'] += 1
+            if drop_last or len(items) == 0:
+                if 'notifier' in iter_params:
+                    iter_params['notifier'].close()
+                raise StopIteration("Stream is over. No more batches left.")
+
+        iter_params['_n_iters'] += 1
+        if self.numbered:
+            numbers, items = zip(*items)
+            return np.array(numbers, dtype=np.int64), list(items)
+        return np.asarray(items), None
+
+    def next_batch(self, batch_size, shuffle=False, n_iters=None, n_epochs=None, drop_last=False, iter_params=None):
+        """ Return the next batch
+
+        Parameters
+        ----------
+        batch_size : int
+            Desired number of items in the batch (only the last batch of the stream could contain fewer items).
+
+        shuffle : bool, int or class:`numpy.random.RandomState`
+            If `False`, items go sequentially, one after another as they come from the stream.
+            Otherwise, items are randomly chosen from a buffer of the stream items (with a given seed or generator).
+
+        n_iters : int
+            Number of iterations to make (if None, iterate until the stream is over).
+
+        n_epochs : None or 1
+            A stream could be iterated over only once, so it means the same as `n_iters=None`.
+
+        drop_last : bool
+            If `True`, drops the last batch of the stream if it contains fewer than `batch_size` items.
+
+        Returns
+        -------
+        DatasetIndex
+
+        Raises
+        ------
+        StopIteration
+            When the stream is over or `n_iters` batches have been taken.
+        """
+        indices, _ = self.next_items(batch_size, shuffle, n_iters, n_epochs, drop_last, iter_params)
+        return self.create_batch(indices)
+
+    def gen_items(self, batch_size, shuffle=False, n_iters=None, n_epochs=None, drop_last=False, notifier=False,
+                  iter_params=None):
+        """ Generate index items and data items for each batch (see :meth:`next_items`) """
+        iter_params = iter_params or self.get_default_iter_params()
+
+        if notifier:
+            if not isinstance(notifier, Notifier):
+                notifier = Notifier(**(notifier if isinstance(notifier, dict) else {'bar': notifier}),
+                                    total=n_iters)
+            iter_params['notifier'] = notifier
+
+        while True:
+            try:
+                items = self.next_items(batch_size, shuffle, n_iters, n_epochs, drop_last, iter_params)
+            except StopIteration:
+                return
+            if 'notifier' in iter_params:
+                notifier.update()
+            yield items
+
+    def gen_batch(self, batch_size, shuffle=False, n_iters=None, n_epochs=None, drop_last=False, notifier=False,
+                  iter_params=None):
+        """ Generate batches (parameters are the same as in :meth:`next_batch`)
+
+        Yields
+        ------
+        DatasetIndex
+        """
+        for indices, _ in self.gen_items(batch_size, shuffle, n_iters, n_epochs, drop_last, notifier, iter_params):
+            yield self.create_batch(indices)
+
+    def create_batch(self, batch_indices, pos=False):
+        """ Create a batch index from index items """
+        _ = pos
+        return DatasetIndex(batch_indices)
+
+
+def _stack(values):
+    """ Stack values into an array (or an object array if they have different shapes) """
+    try:
+        return np.stack(values)
+    except ValueError:
+        array = np.empty(len(values), dtype=object)
+        for i, value in enumerate(values):
+            array[i] = value
+        return array
+
+
+class StreamDataset(Dataset):
+    """ A dataset of items which come from a stream (e.g. a generator, a queue or a growing file)
+
+    Each stream item is a data item: a value (e.g. an array) for batches without components,
+    or a tuple or a dict of component values. Items are numbered in the order they come
+    and their numbers form the batch index.
+
+    It works just like any other dataset (including pipelines with `prefetch`), but:
+
+    - iteration stops when the stream is over or after `n_iters` batches
+    - shuffling is approximate: items for each batch are randomly chosen from a buffer of `buffer_size` items
+    - the stream is iterated over only once, so it cannot be split and `reset('iter')` does not rewind it.
+
+    Only the buffer and a few batches are kept in memory, so the stream might be endless.
+
+    Parameters
+    ----------
+    source : iterable or callable
+        a stream of data items or a function without arguments which returns it
+    batch_class : type
+        a batch class
+    buffer_size : int
+        a number of items to choose from when shuffling
+
+    Examples
+    --------
+    >>> def read_records():
+    ...     while True:
+    ...         image, label = queue.get()
+    ...         yield image, label
+    >>> dataset = StreamDataset(read_records, ImagesBatch, buffer_size=10000)
+    >>> pipeline = dataset.p.resize(...).train_model(...)
+    >>> pipeline.run(BATCH_SIZE, shuffle=True, n_iters=10000, prefetch=4)
+    """
+    def __init__(self, source, batch_class=Batch, *args, buffer_size=1024, **kwargs):
+        super().__init__(StreamIndex(source, buffer_size, numbered=True), batch_class, *args, **kwargs)
+
+    @staticmethod
+    def build_index(index, *args, **kwargs):
+        _ = args, kwargs
+        return index
+
+    def create_subset(self, index):
+        raise NotImplementedError("A subset of a stream cannot be created")
+
+    def split(self, shares=0.8, shuffle=False):
+        raise NotImplementedError("A stream cannot be split")
+
+    def cv_split(self, method='kfold', n_splits=5, shuffle=False):
+        raise NotImplementedError("A stream cannot be split")
+
+    def collate(self, items):
+        """ Combine data items into batch data """
+        components = self.batch_class.components
+        if components is None:
+            return _stack(items)
+        if isinstance(items[0], dict):
+            return tuple(_stack([item[comp] for item in items]) for comp in components)
+        return tuple(_stack(list(values)) for values in zip(*items))
+
+    def create_batch(self, index, items=None, *args, **kwargs):     # pylint: disable=arguments-differ
+        """ Create a batch
+
+        Parameters
+        ----------
+        index : DatasetIndex or array-like
+            numbers of items in the stream
+        items : list or None
+            data items (if None, the batch will be empty)
+
+        Returns
+        -------
+        Batch
+        """
+        _ = args
+        if not isinstance(index, DatasetIndex):
+            index = DatasetIndex(index)
+        batch = self.batch_class(index, dataset=self, copy=self._copy, **kwargs)
+        if items is not None:
+            batch._data = self.collate(items)     # pylint: disable=protected-access
+        return batch
+
+    def next_batch(self, batch_size, shuffle=False, n_iters=None, n_epochs=None, drop_last=False,
+                   iter_params=None, *args, **kwargs):
+        """ Return the next batch (see :meth:`StreamIndex.next_batch`) """
+        indices, items = self.index.next_items(batch_size, shuffle, n_iters, n_epochs, drop_last, iter_params)
+        return self.create_batch(indices, items, *args, **kwargs)
+
+    def gen_batch(self, batch_size, shuffle=False, n_iters=None, n_epochs=None, drop_last=False,
+                  notifier=False, *args, **kwargs):
+        """ Generate batches (see :meth:`StreamIndex.next_batch`) """
+        iter_params = kwargs.pop('iter_params', None)
+        for indices, items in self.index.gen_items(batch_size, shuffle, n_iters, n_epochs, drop_last,
+                                                   notifier, iter_params):
+            yield self.create_batch(indices, items, *args, **kwargs)
@@ -0,0 +1,173 @@
+""" Tests for batch samplers. """
+# pylint: disable=missing-docstring
+import pytest
+import numpy as np
+
+from batchflow import Dataset, DatasetIndex, BatchSampler, WeightedSampler, BalancedSampler, PrioritizedSampler, \
+                      BucketSampler, B, V
+from batchflow.batch_sampler import SumTree
+
+
+def test_alias_tables():
+    weights = np.array([1., 0., 3., 6., 0.5])
+    prob, alias = WeightedSampler.build_alias(weights)
+    # each cell keeps its item with probability `prob` and passes the rest to `alias`
+    result = prob.copy()
+    np.add.at(result, alias, 1 - prob)
+    assert np.allclose(result / len(weights), weights / weights.sum())
+
+
+def test_weighted_sampler():
+    index = DatasetIndex(np.arange(10, 14))
+    sampler = WeightedSampler([1, 0, 3, 6], seed=1)
+    items = np.concatenate([batch.indices for batch in index.gen_batch(4, shuffle=sampler, n_iters=5000)])
+    assert len(items) == 20000
+    frequencies = np.bincount(items - 10, minlength=4) / len(items)
+    assert frequencies[1] == 0
+    assert np.allclose(frequencies, [.1, 0, .3, .6], atol=.01)
+
+
+def test_weighted_sampler_callable():
+    index = DatasetIndex(np.arange(100))
+    sampler = WeightedSampler(lambda items: (items % 2 == 0).astype(float), seed=2)
+    batch = index.next_batch(50, shuffle=sampler)
+    assert (batch.indices % 2 == 0).all()
+
+
+@pytest.mark.parametrize('weights', [[1, 2], [1, -1, 2], [0, 0, 0]])
+def test_weighted_sampler_errors(weights):
+    with pytest.raises(ValueError):
+        DatasetIndex(3).next_batch(2, shuffle=WeightedSampler(weights))
+
+
+def test_balanced_sampler():
+    labels = np.array([0] * 90 + [1] * 9 + [2])
+    index = DatasetIndex(100)
+    batches = list(index.gen_batch(30, shuffle=BalancedSampler(labels, seed=3), n_iters=4))
+    for batch in batches:
+        assert (np.bincount(labels[batch.indices], minlength=3) == 10).all()
+
+    # majority items are not repeated until all of them are drawn
+    majority = np.concatenate([batch.indices[labels[batch.indices] == 0] for batch in batches])
+    assert len(np.unique(majority[:40])) == 40
+
+
+def test_balanced_sampler_shares():
+    labels = np.array(['a'] * 50 + ['b'] * 50)
+    sampler = BalancedSampler(labels, shares={'a': .8, 'b': .2}, seed=4)
+    batch = DatasetIndex(100).next_batch(10, shuffle=sampler)
+    assert (labels[batch.indices] == 'a').sum() == 8
+
+    with pytest.raises(ValueError):
+        DatasetIndex(100).next_batch(10, shuffle=BalancedSampler(labels, shares={'c': 1}))
+
+
+@pytest.mark.parametrize('n_epochs, drop_last, sizes', [(2, False, [3, 3, 2]),
+                                                        (2, True, [3, 3]),
+                                                        (None, False, [3, 3, 3, 3, 3])])
+def test_epochs(n_epochs, drop_last, sizes):
+    index = DatasetIndex(4)
+    n_iters = 5 if n_epochs is None else None
+    batches = list(index.gen_batch(3, shuffle=WeightedSampler(np.ones(4)), n_epochs=n_epochs, n_iters=n_iters,
+                                   drop_last=drop_last))
+    assert [len(batch) for batch in batches] == sizes
+
+
+def test_epoch_size_and_dataset():
+    dataset = Dataset(10)
+    sampler = BalancedSampler(np.arange(10) % 2, seed=5, epoch_size=40)
+    batches = list(dataset.gen_batch(8, shuffle=sampler, n_epochs=1))
+    assert [len(batch) for batch in batches] == [8] * 5
+
+
+@pytest.mark.parametrize('size', [1, 2, 5, 8, 13])
+def test_sum_tree(size):
+    values = np.arange(1, size + 1, dtype=float)
+    tree = SumTree(values)
+    assert tree.total == values.sum()
+
+    cumsum = np.cumsum(values)
+    points = np.linspace(0, values.sum(), 50, endpoint=False)
+    assert (tree.find(points) == np.searchsorted(cumsum, points, side='right')).all()
+
+    positions, new_values = ([0, size - 1], [10, 0]) if size > 1 else ([0], [10])
+    tree.update(positions, new_values)
+    values[positions] = new_values
+    assert np.isclose(tree.total, values.sum())
+    assert (tree.values == values).all()
+    cumsum = np.cumsum(values)
+    points = np.linspace(0, values.sum(), 50, endpoint=False)
+    assert (tree.find(points) == np.searchsorted(cumsum, points, side='right')).all()
+
+
+def test_prioritized_sampler():
+    index = DatasetIndex(np.arange(10, 20))
+    sampler = PrioritizedSampler(seed=6, eps=0)
+    index.next_batch(5, shuffle=sampler)
+    assert np.allclose(sampler.probabilities(), .1)
+
+    sampler.update([10, 11], [3, 1])
+    sampler.update(np.arange(12, 20), 0)
+    assert np.allclose(sampler.probabilities([10, 11]), [.75, .25], atol=1e-5)
+    items = np.concatenate([batch.indices for batch in index.gen_batch(8, shuffle=sampler, n_iters=500)])
+    assert set(items) == {10, 11}
+    assert np.isclose((items == 10).mean(), .75, atol=.02)
+
+
+def test_update_priorities_action():
+    dataset = Dataset(np.arange(20))
+    sampler = PrioritizedSampler(seed=7, eps=0)
+    # items, once seen, are not drawn again
+    pipeline = (dataset.p
+                .init_variable('seen', [])
+                .update(V('seen', mode='e'), B.indices)
+                .update_priorities(sampler, 0))
+    pipeline.run(2, shuffle=sampler, n_iters=10)
+    seen = pipeline.v('seen')
+    assert sorted(seen) == list(range(20))
+
+
+SIZES = np.array([1, 50, 2, 48, 3, 52, 4, 47, 5, 49, 100, 101, 99, 2, 51])
+
+
+def test_bucket_sampler():
+    index = DatasetIndex(np.arange(len(SIZES)))
+    sampler = BucketSampler(SIZES, buckets=3, seed=8)
+    # batches are planned for a whole epoch, so it is not a per-batch sampler
+    assert not isinstance(sampler, BatchSampler)
+    # 5 smallest, 5 middle and 5 largest items
+    buckets = np.argsort(np.argsort(SIZES, kind='stable')) // 5
+    epochs = [[], []]
+    for i, batch in enumerate(index.gen_batch(4, shuffle=sampler, n_epochs=2)):
+        assert len(batch) <= 4
+        assert len(set(buckets[batch.indices])) == 1
+        epochs[i >= sampler.get_n_batches(4)].append(batch.indices)
+
+    for epoch in epochs:
+        assert sorted(np.concatenate(epoch)) == list(range(len(SIZES)))
+    assert [list(batch) for batch in epochs[0]] != [list(batch) for batch in epochs[1]]
+
+
+def test_bucket_sampler_budget():
+    index = DatasetIndex(np.arange(len(SIZES)))
+    sampler = BucketSampler(SIZES, buckets=[10, 60], max_size=200, seed=9)
+    batches = list(index.gen_batch(5, shuffle=sampler, n_epochs=1))
+    assert sorted(np.concatenate([batch.indices for batch in batches])) == list(range(len(SIZES)))
+    for batch in batches:
+        sizes = SIZES[batch.indices]
+        assert len(sizes) * sizes.max() <= 202
+    assert max(len(batch) for batch in batches) == 5
+
+    batches = list(index.gen_batch(5, shuffle=sampler, n_epochs=1, drop_last=True))
+    # buckets of 6, 6 and 3 items get batches of 5, 3 and 1 items
+    assert sorted(len(batch) for batch in batches) == [1, 1, 1, 3, 3, 5]
+
+
+def test_bucket_sampler_shapes():
+    shapes = np.array([[10, 10], [10, 12], [100, 100], [90, 110], [11, 10], [100, 99]])
+    dataset = Dataset(6)
+    sampler = BucketSampler(lambda items: shapes[items], buckets=2)
+    batches = list(dataset.gen_batch(3, shuffle=sampler, n_iters=4))
+    assert len(batches) == 4
+    for batch in batches:
+        assert set(batch.indices) in ({0, 1, 4}, {2, 3, 5})
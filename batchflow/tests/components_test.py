@@ -237,3 +237,19 @@ class TestNoComponents:
         assert (full == np.arange(SIZE) + 100).all()
         assert (a12_68 == np.arange(12, 68) + 100).all()
         assert (a38 == 138).all()
+
+
+@pytest.mark.parametrize('indices_type', ['list', 'array'])
+@pytest.mark.parametrize('dtype', ['int', 'str'])
+def test_get_pos(indices_type, dtype):
+    index = i([5, 3, 9, 3, 7], dtype, indices_type)
+    comps = create_item_class(('labels',), dict(labels=np.arange(5) + 100), index, crop=False)
+
+    assert comps.get_pos('labels', i(9, dtype)) == 2
+    assert list(comps.get_pos('labels', i([7, 3, 5], dtype, indices_type))) == [4, 1, 0]
+    assert comps[i(7, dtype)].labels == 104
+
+    with pytest.raises(KeyError):
+        comps.get_pos('labels', i([7, 4], dtype, indices_type))
+    with pytest.raises(KeyError):
+        _ = comps[i(4, dtype)]
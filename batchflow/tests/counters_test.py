@@ -0,0 +1,71 @@
+""" Test pipeline counters and their export """
+# pylint: disable=missing-docstring
+import numpy as np
+import pytest
+
+from batchflow import Dataset, Batch, action, B
+from batchflow.counters import PipelineCounters
+
+
+class CountBatch(Batch):
+    @action
+    def compute(self, size):
+        _ = size
+        return self
+
+
+def test_snapshot():
+    counters = PipelineCounters()
+    counters.add_action('a', 10, 2000)
+    counters.add_action('a', 30, 4000)
+    counters.add('queue_wait', 'batch_get', 5)
+
+    snapshot = counters.snapshot()
+    assert snapshot['action']['a'] == dict(count=2, sum=6e-6, mean=3e-6, max=4e-6)
+    assert snapshot['eval_expr']['a']['max'] == 3e-8
+    assert snapshot['queue_wait']['batch_get']['count'] == 1
+
+    counters.reset()
+    assert counters.snapshot() == {}
+
+
+def test_openmetrics(tmp_path):
+    counters = PipelineCounters()
+    counters.add_action('load "x" #0', 10, 20)
+    counters.add_batch(8, 100)
+
+    path = str(tmp_path / 'metrics.prom')
+    counters.write_openmetrics(path, labels=dict(job='train'))
+    with open(path) as file:
+        lines = file.read().splitlines()
+
+    assert '# TYPE batchflow_action_seconds summary' in lines
+    assert 'batchflow_action_seconds_count{job="train",action="load \\"x\\" #0"} 1' in lines
+    assert 'batchflow_batch_size_items_sum{job="train"} 8' in lines
+    assert 'batchflow_batch_size_max_items{job="train"} 8' in lines
+    assert lines[-1] == '# EOF'
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_pipeline_counters(prefetch):
+    pipeline = Dataset(50, batch_class=CountBatch).p.compute(B('size')).compute(1)
+    pipeline.run(10, n_epochs=1, prefetch=prefetch)
+
+    snapshot = pipeline.counters.snapshot()
+    assert set(snapshot['action']) == {'compute #0', 'compute #1'}
+    assert snapshot['action']['compute #0']['count'] == 5
+    assert snapshot['batch_size'][None]['sum'] == 50
+    if prefetch:
+        assert snapshot['queue_wait']['batch_get']['count'] >= 5
+    else:
+        assert 'queue_wait' not in snapshot
+
+    pipeline.reset('counters')
+    assert pipeline.counters.snapshot() == {}
+
+
+def test_disabled():
+    pipeline = Dataset(np.arange(10), batch_class=CountBatch).p.compute(1)
+    pipeline.counters.enabled = False
+    pipeline.run(5, n_epochs=1)
+    assert pipeline.counters.snapshot() == {}
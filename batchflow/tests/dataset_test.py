@@ -106,3 +106,24 @@ class TestDataset:
         assert not hasattr(dataset, 'cv3')
         assert not hasattr(dataset.train, 'cv3')
         assert not hasattr(dataset.test, 'cv3')
+
+    @pytest.mark.parametrize('shuffle', [False, 3])
+    def test_cv_folds(self, dataset, shuffle):
+        dataset.cv_split(n_splits=3, shuffle=shuffle)
+        tests = [dataset.cv(i).test.indices for i in range(3)]
+        assert [len(test) for test in tests] == [34, 33, 33]
+        assert sorted(np.concatenate(tests)) == list(range(100))
+        for i in range(3):
+            train = dataset.cv(i).train.indices
+            assert sorted(np.concatenate([train, tests[i]])) == list(range(100))
+            # folds share one buffer instead of copying items
+            assert train.base is not None and train.base is tests[0].base
+        if not shuffle:
+            assert list(tests[0]) == list(range(34))
+
+    def test_create_subset_by_pos(self, dataset):
+        subset = dataset.create_subset_by_pos([3, 1, 99])
+        assert list(subset.indices) == [3, 1, 99]
+        assert np.shares_memory(dataset.create_subset_by_pos(slice(10, 20)).indices, dataset.indices)
+        with pytest.raises(IndexError):
+            dataset.create_subset_by_pos([0, 100])
@@ -44,3 +44,41 @@ def test_create_batch_child():
         pass
     dsi = ChildSet(5)
     assert isinstance(dsi.create_batch(range(5)), ChildSet)
+
+def test_lazy_positions():
+    dsi = DatasetIndex(['a', 'b', 'c', 'd', 'e'])
+    assert dsi._pos_map is None
+    assert dsi.get_pos('c') == 2
+    assert (dsi.get_pos(['e', 'a']) == [4, 0]).all()
+    assert dsi._pos_map is not None
+
+def test_subset_by_pos_is_not_checked(recwarn):
+    dsi = DatasetIndex(5)
+    batch = dsi.create_batch([1, 1, 3], pos=True)
+    assert (batch.index == [1, 1, 3]).all()
+    assert not recwarn.list
+
+    with pytest.warns(UserWarning):
+        dsi.create_batch([1, 1, 3], pos=False)
+
+def test_subclass_without_check():
+    """ Subclasses which override 'create_subset' should accept 'check'. """
+    class LegacyIndex(DatasetIndex):
+        def create_subset(self, index):     # pylint: disable=arguments-differ
+            return LegacyIndex(index)
+
+    with pytest.raises(TypeError):
+        LegacyIndex(10).create_subset_by_pos(slice(0, 5))
+
+def test_split_is_not_checked():
+    checks = []
+    class RecordIndex(DatasetIndex):
+        @staticmethod
+        def build_index(index, check=True):
+            checks.append(check)
+            return DatasetIndex.build_index(index, check=check)
+
+    dsi = RecordIndex(10)
+    dsi.split([0.6, 0.4], shuffle=13)
+    assert len(dsi.train) + len(dsi.test) == 10
+    assert checks == [True, False, False]
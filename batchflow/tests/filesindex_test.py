@@ -98,3 +98,31 @@ def test_create_subset(files_setup, index):
     assert isinstance(new_findex.indices, np.ndarray)
     assert os.path.dirname(full_path) == path
     assert os.path.basename(full_path) == file_name
+
+def test_subsets_share_paths(files_setup):
+    path, _, _ = files_setup
+    findex = FilesIndex(path=os.path.join(path, '*'), sort=True)
+    batch = findex.create_batch([2, 0], pos=True)
+    assert batch._paths is findex.paths
+    assert batch.get_fullpath('file_2.txt') == os.path.join(path, 'file_2.txt')
+    assert list(batch.paths) == ['file_2.txt', 'file_0.txt']
+    assert batch.paths['file_0.txt'] == os.path.join(path, 'file_0.txt')
+    assert 'file_1.txt' not in batch.paths
+    with pytest.raises(KeyError):
+        batch.get_fullpath('file_1.txt')
+    with pytest.raises(KeyError):
+        findex.create_subset(['file_1.txt', 'missing.txt'])
+
+    findex.split(0.5)
+    assert findex.train._paths is findex.paths
+    assert len(findex.train.paths) == len(findex.train)
+
+def test_concat(files_setup):
+    path, folder1, folder2 = files_setup
+    findex1 = FilesIndex(path=os.path.join(path, folder1, '*'), no_ext=True)
+    findex2 = FilesIndex(path=os.path.join(path, folder2, 'file_0.txt'))
+    findex = FilesIndex.concat(findex1, findex2)
+    assert len(findex) == 4
+    assert findex.get_fullpath('file_1') == os.path.join(path, folder1, 'file_1.txt')
+    assert findex.get_fullpath('file_0.txt') == os.path.join(path, folder2, 'file_0.txt')
+    assert len(findex.paths.directories) == 2
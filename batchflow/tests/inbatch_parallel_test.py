@@ -0,0 +1,133 @@
+""" Test parallel engines of :func:`~batchflow.inbatch_parallel` and :meth:`~batchflow.Batch.apply_parallel` """
+# pylint: disable=missing-docstring, attribute-defined-outside-init
+import logging
+
+import numpy as np
+import pytest
+
+from batchflow import Batch, P, action, inbatch_parallel, mjit
+from batchflow.decorators import _get_chunk_size
+
+
+CALLS = []
+
+
+def double(item):
+    CALLS.append(item)
+    return item * 2
+
+
+class ChunkBatch(Batch):
+    components = ('images',)
+
+    @action
+    @inbatch_parallel(init='indices', post='_post_fail', target='threads')
+    def fail_odd(self, ix, **kwargs):
+        _ = kwargs
+        if ix % 2:
+            raise ValueError(ix)
+        return ix
+
+    def _post_fail(self, all_results, *args, **kwargs):
+        _ = args, kwargs
+        self.results = all_results
+        return self
+
+
+def make_batch(size=100):
+    batch = ChunkBatch(np.arange(size))
+    batch.images = np.arange(size)
+    return batch
+
+
+@pytest.mark.parametrize('n_items, n_workers, chunk_size, n_chunks, expected', [
+    (10, 8, 'auto', None, 1),
+    (4096, 8, 'auto', None, 128),
+    (100, 8, 7, None, 7),
+    (100, 8, 'auto', 3, 34),
+])
+def test_chunk_size(n_items, n_workers, chunk_size, n_chunks, expected):
+    assert _get_chunk_size(n_items, n_workers, chunk_size, n_chunks) == expected
+
+
+@pytest.mark.parametrize('chunking', [{}, dict(chunk_size=1), dict(chunk_size=9), dict(n_chunks=4)])
+def test_order_preserved(chunking):
+    batch = make_batch()
+    batch.apply_parallel(double, src='images', **chunking)
+    assert (batch.images == np.arange(100) * 2).all()
+
+
+def test_exceptions_per_item():
+    batch = make_batch(20)
+    batch.fail_odd(chunk_size=5)
+    assert [isinstance(res, ValueError) for res in batch.results] == [bool(i % 2) for i in range(20)]
+
+
+def test_masked_items_are_not_dispatched():
+    CALLS.clear()
+    batch = make_batch(10)
+    mask = np.array([1, 0] * 5)
+    batch.apply_parallel(double, src='images', p=P(mask), chunk_size=2)
+
+    assert sorted(CALLS) == list(range(0, 10, 2))
+    assert (batch.images == np.where(mask, np.arange(10) * 2, np.arange(10))).all()
+
+
+class NogilBatch(ChunkBatch):
+    @action
+    @inbatch_parallel(init='images', target='nogil')
+    @mjit
+    def negate(self, image):
+        for i in range(image.shape[0]):
+            image[i] = -image[i]
+
+    @action
+    @inbatch_parallel(init='images', target='nogil')
+    def negate_python(self, image):
+        image[:] = -image
+
+
+@pytest.mark.parametrize('method', ['negate', 'negate_python'])
+def test_nogil(method):
+    batch = NogilBatch(np.arange(8))
+    batch.images = np.arange(8 * 5, dtype=np.float64).reshape(8, 5)
+    getattr(batch, method)()
+    assert (batch.images == -np.arange(8 * 5).reshape(8, 5)).all()
+
+
+def test_nogil_fallback_warns_once(caplog):
+    batch = NogilBatch(np.arange(8))
+    batch.images = np.zeros((8, 5))
+    with caplog.at_level(logging.WARNING):
+        for _ in range(3):
+            batch.negate_python()
+    assert sum('negate_python' in record.getMessage() for record in caplog.records) <= 1
+
+
+@pytest.mark.parametrize('n_workers', [None, 3])
+def test_vectorized(n_workers):
+    batch = make_batch(10)
+    batch.apply_parallel(np.multiply, 2, src='images', dst='doubled', target='vectorized', n_workers=n_workers)
+    assert (batch.doubled == np.arange(10) * 2).all()
+    assert (batch.images == np.arange(10)).all()
+
+
+def test_vectorized_mask():
+    batch = make_batch(10)
+    mask = np.array([1, 0] * 5)
+    batch.apply_parallel(np.divide, 2, src='images', p=P(mask), target='vectorized')
+    assert (batch.images == np.where(mask, np.arange(10) / 2, np.arange(10))).all()
+
+
+def test_vectorized_tuple_src():
+    batch = make_batch(10)
+    batch.apply_parallel(lambda items: (items[1], items[0] + items[1]), src=('images', 'images'),
+                         dst=('first', 'second'), p=P(np.array([0, 1] * 5)), target='vectorized')
+    assert (batch.first == np.arange(10)).all()
+    assert (batch.second == np.where(np.arange(10) % 2, np.arange(10) * 2, np.arange(10))).all()
+
+
+def test_vectorized_dst_default():
+    batch = make_batch(10)
+    batch.apply_parallel(lambda images: images + 1, src=batch.images, dst_default='components', target='vectorized')
+    assert (batch.images == np.arange(10) + 1).all()
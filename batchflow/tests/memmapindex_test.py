@@ -0,0 +1,72 @@
+""" Tests for MemmapIndex class. """
+# pylint: disable=missing-docstring
+# pylint: disable=redefined-outer-name
+import pickle
+
+import pytest
+import numpy as np
+
+from batchflow import DatasetIndex, MemmapIndex
+
+
+SIZE = 100
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    path = str(tmp_path / 'index.npy')
+    np.save(path, np.arange(10, 10 + SIZE))
+    return path
+
+
+def batches(index, *args, **kwargs):
+    return [list(batch.indices) for batch in index.gen_batch(*args, **kwargs)]
+
+
+def test_build(index_path):
+    index = MemmapIndex(index_path)
+    assert isinstance(index.index, np.memmap)
+    assert len(index) == SIZE
+    assert index.get_pos(15) == 5
+
+
+def test_raw_file(tmp_path):
+    path = str(tmp_path / 'index.bin')
+    np.arange(20, dtype=np.int32).tofile(path)
+    index = MemmapIndex(path, dtype=np.int32)
+    assert list(index.indices) == list(range(20))
+
+
+@pytest.mark.parametrize('kwargs', [dict(n_epochs=2), dict(n_epochs=3, drop_last=True),
+                                    dict(n_iters=7), dict(n_iters=7, drop_last=True)])
+def test_same_batches(index_path, kwargs):
+    index = MemmapIndex(index_path, block_size=16)
+    assert batches(index, 30, **kwargs) == batches(DatasetIndex(np.arange(10, 10 + SIZE)), 30, **kwargs)
+
+
+@pytest.mark.parametrize('shuffle', [True, 3, np.random.RandomState(3)])
+def test_shuffle(index_path, shuffle):
+    index = MemmapIndex(index_path, block_size=16)
+    result = batches(index, 20, shuffle=shuffle, n_epochs=2)
+    first, second = np.concatenate(result[:5]), np.concatenate(result[5:])
+    assert sorted(first) == sorted(second) == list(range(10, 10 + SIZE))
+    assert (first != second).any()
+    assert all(isinstance(batch, DatasetIndex) and not isinstance(batch, MemmapIndex)
+               for batch in index.gen_batch(20, shuffle=shuffle, n_epochs=1))
+
+
+def test_seed(index_path):
+    index = MemmapIndex(index_path, block_size=16)
+    assert batches(index, 20, shuffle=5, n_epochs=2) == batches(MemmapIndex(index_path, block_size=16),
+                                                                  20, shuffle=5, n_epochs=2)
+
+
+def test_split_and_pickle(index_path):
+    index = MemmapIndex(index_path)
+    index.split(0.8, shuffle=1)
+    assert len(index.train) == 80 and len(index.test) == 20
+    assert sorted(np.concatenate([index.train.indices, index.test.indices])) == list(range(10, 10 + SIZE))
+
+    copy = pickle.loads(pickle.dumps(index))
+    assert isinstance(copy.index, np.memmap)
+    assert list(copy.indices) == list(index.indices)
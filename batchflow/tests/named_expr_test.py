@@ -7,6 +7,7 @@ import numpy as np
 
 sys.path.append('..')
 from batchflow import B, C, D, F, L, V, R, P, I, Dataset, Pipeline, Batch, apply_parallel, inbatch_parallel, action
+from batchflow.named_expr import compile_expr, eval_expr
 
 
 #--------------------
@@ -190,3 +191,38 @@ def test_d(size, n_splits):
             pipeline.run(1)
 
             assert pipeline.v('indices') == result[:start] + result[end:]
+
+
+#--------------------
+#   compile_expr
+#--------------------
+
+@pytest.mark.parametrize('expr', [
+    5,
+    [1, (2, 3), {'a': 4}],
+    (B('size'), 1, [V('var'), 2]),
+    {'size': B('size'), 'static': [1, 2], 'nested': {'var': V('var')}},
+    {B('size'): 1},
+])
+def test_compile_expr(expr):
+    pipeline = Dataset(10).pipeline().init_variable('var', 3)
+    pipeline.before.run()
+    batch = pipeline.dataset.create_batch(np.arange(4))
+    batch.pipeline = pipeline
+    compiled = compile_expr(expr)
+    assert compiled(batch=batch, pipeline=pipeline) == eval_expr(expr, batch=batch, pipeline=pipeline)
+
+
+def test_compiled_pipeline():
+    pipeline = (Dataset(10).pipeline()
+        .init_variable('sizes', [])
+        .update(V('sizes', mode='a'), B('size'))
+        .do_nothing([1, 2])
+    )
+    pipeline.run(4, n_epochs=1)
+    assert pipeline.v('sizes') == [4, 4, 2]
+
+    # a pipeline is recompiled when actions are added in place
+    pipeline.append_pipeline(Pipeline().update(V('sizes', mode='a'), 0))
+    pipeline.run(10, n_epochs=1)
+    assert pipeline.v('sizes') == [4, 4, 2, 10, 0]
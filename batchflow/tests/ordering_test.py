@@ -0,0 +1,77 @@
+""" Tests for lazy orders of index items. """
+# pylint: disable=missing-docstring
+import pickle
+
+import pytest
+import numpy as np
+
+from batchflow import DatasetIndex
+from batchflow.ordering import RangeOrder, BlockPermutation, BlockShuffle
+
+
+def test_range_order():
+    order = RangeOrder(10)
+    assert len(order) == 10
+    assert list(order[3:7]) == [3, 4, 5, 6]
+    assert order[-1] == 9
+    assert list(order[[1, 5]]) == [1, 5]
+    assert list(order) == list(range(10))
+
+
+@pytest.mark.parametrize('size, block_size', [(1000, 64), (1000, 1000), (1000, 3000), (1, 5)])
+def test_block_permutation(size, block_size):
+    order = BlockPermutation(size, block_size, seed=11)
+    positions = np.asarray(order)
+    assert sorted(positions) == list(range(size))
+
+    # any slice or selection gives the same positions as the whole order
+    assert (order[size // 3 : size // 2] == positions[size // 3 : size // 2]).all()
+    assert (order[::7] == positions[::7]).all()
+    places = np.random.randint(0, size, 50)
+    assert (order[places] == positions[places]).all()
+    assert order[-1] == positions[-1]
+
+
+def test_block_permutation_locality():
+    order = BlockPermutation(10000, 100, seed=1)
+    for start in range(0, 10000, 100):
+        assert np.ptp(order[start : start + 100]) < 100
+
+
+def test_block_permutation_seed():
+    first, second = BlockPermutation(1000, 64, seed=5), BlockPermutation(1000, 64, seed=5)
+    assert (np.asarray(first) == np.asarray(second)).all()
+    assert (np.asarray(first) != np.asarray(BlockPermutation(1000, 64, seed=6))).any()
+    assert (np.asarray(pickle.loads(pickle.dumps(first))) == np.asarray(first)).all()
+
+
+@pytest.mark.parametrize('size, block_size, window', [(1000, 64, 4), (1000, 64, 20), (100, 64, 3), (10, 3, 2)])
+def test_block_permutation_window(size, block_size, window):
+    order = BlockPermutation(size, block_size, seed=3, window=window)
+    positions = np.asarray(order)
+    assert sorted(positions) == list(range(size))
+    places = np.random.randint(0, size, 50)
+    assert (order[places] == positions[places]).all()
+    assert (order[size // 2 : size // 2 + 30] == positions[size // 2 : size // 2 + 30]).all()
+
+
+def test_block_permutation_window_locality():
+    order = BlockPermutation(10000, 100, seed=1, window=4)
+    blocks = np.asarray(order) // 100
+    # every chunk of the order is read from 4 consecutive (in the shuffled order) blocks only
+    rank = np.argsort(order.blocks)
+    for start, stop in zip(order.offsets[:-1], order.offsets[1:]):
+        ranks = rank[blocks[start:stop]]
+        assert ranks.max() - ranks.min() < 4
+
+
+def test_block_shuffle():
+    index = DatasetIndex(np.arange(10, 1010))
+    first = [batch.indices for batch in index.gen_batch(100, shuffle=BlockShuffle(32, 4, seed=7), n_epochs=2)]
+    second = [batch.indices for batch in index.gen_batch(100, shuffle=BlockShuffle(32, 4, seed=7), n_epochs=2)]
+    assert all((a == b).all() for a, b in zip(first, second))
+    assert sorted(np.concatenate(first[:10])) == sorted(np.concatenate(first[10:])) == list(range(10, 1010))
+    assert (np.concatenate(first[:10]) != np.concatenate(first[10:])).any()
+
+    batches = list(index.gen_batch(100, shuffle='block', n_epochs=1))
+    assert sorted(np.concatenate([batch.indices for batch in batches])) == list(range(10, 1010))
@@ -0,0 +1,101 @@
+""" Test worker pools shared by parallel actions """
+# pylint: disable=missing-docstring
+import threading
+
+import numpy as np
+import pytest
+
+from batchflow import Dataset, Batch, action, inbatch_parallel, PoolRegistry, WorkerPool
+
+
+THREAD_NAMES = []
+
+
+class PoolBatch(Batch):
+    @action
+    @inbatch_parallel(init='indices', target='threads')
+    def thread_names(self, ix):
+        _ = ix
+        THREAD_NAMES.append(threading.current_thread().name)
+
+    @action
+    @inbatch_parallel(init='indices', target='threads')
+    def nested(self, ix):
+        _ = ix
+        return self.inner()
+
+    @inbatch_parallel(init='indices', post='_post_count', target='threads')
+    def inner(self, ix):
+        return ix
+
+    def _post_count(self, all_results, *args, **kwargs):
+        _ = args, kwargs
+        return len(all_results)
+
+
+def test_lazy_start_and_stats():
+    pool = WorkerPool('threads', max_workers=2)
+    assert not pool.is_started
+
+    futures = [pool.submit(pow, 2, i) for i in range(10)]
+    assert [f.result() for f in futures] == [2 ** i for i in range(10)]
+    stats = pool.stats()
+    assert stats['submitted'] == 10
+    assert stats['completed'] == 10
+    assert stats['active'] == 0
+    assert 1 <= stats['peak_active'] <= 2
+
+    pool.shutdown()
+    assert not pool.is_started
+    assert pool.submit(abs, -1).result() == 1
+    pool.shutdown()
+
+
+def test_registry():
+    pools = PoolRegistry(threads=3)
+    assert pools.get('threads') is pools.get('t')
+    assert pools.get('threads').max_workers == 3
+    assert pools.get('mpc').kind == 'processes'
+    assert len(pools.stats()) == 2
+
+    # another size resizes the same pool instead of starting a new one
+    pool = pools.get('threads')
+    pool.submit(abs, -1).result()
+    assert pools.get('threads', 5) is pool
+    assert pool.max_workers == 5 and not pool.is_started
+    assert len(pools.pools()) == 2
+
+    with pytest.raises(ValueError):
+        pools.configure(threads=0)
+
+
+def test_pipeline_reuses_threads():
+    THREAD_NAMES.clear()
+    dataset = Dataset(100, batch_class=PoolBatch)
+    pipeline = dataset.p.thread_names()
+    pipeline.pools.configure(threads=2)
+    pipeline.run(10, n_epochs=1)
+    names = THREAD_NAMES
+
+    assert len(names) == 100
+    assert len(set(names)) <= 2
+    assert pipeline.pools.stats()['threads[2]']['completed'] == 100
+
+
+def test_nested_call():
+    dataset = Dataset(10, batch_class=PoolBatch)
+    pipeline = dataset.p.nested()
+    pipeline.pools.configure(threads=1)
+    batch = pipeline.next_batch(10)
+    assert isinstance(batch, PoolBatch)
+
+
+def test_prefetch_pools():
+    dataset = Dataset(np.arange(100), batch_class=PoolBatch)
+    pipeline = dataset.p.thread_names()
+    n_batches = sum(1 for _ in pipeline.gen_batch(10, n_epochs=1, prefetch=2))
+    assert n_batches == 10
+    assert pipeline.pools.get('prefetch', 3).stats()['completed'] == 10
+
+    pipeline.reset('iter')
+    assert not any(pool.is_started for pool in pipeline.pools.pools())
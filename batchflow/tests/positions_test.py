@@ -0,0 +1,63 @@
+""" Test position lookups in an index """
+# pylint: disable=missing-docstring
+import numpy as np
+import pytest
+
+from batchflow import DatasetIndex
+from batchflow.positions import make_positions, DictPositions, RangePositions, SortedPositions, HashPositions
+
+
+@pytest.mark.parametrize('indices, backend', [
+    (np.arange(10, 20), RangePositions),
+    (np.array([7, 3, 11, 5]), SortedPositions),
+    (np.array([.5, .1, .3]), SortedPositions),
+    (np.array(['b', 'a', 'c']), HashPositions),
+    (np.array(['b', 'a', 'b']), SortedPositions),
+    (np.array([(1, 2), 'a', 3], dtype=object), HashPositions),
+])
+def test_auto_backend(indices, backend):
+    positions = make_positions(indices)
+    assert isinstance(positions, backend)
+    expected = [list(indices).index(item) for item in indices]
+    assert [positions[item] for item in indices] == expected
+    assert (positions.get_many(indices[::-1]) == expected[::-1]).all()
+
+
+@pytest.mark.parametrize('backend', ['dict', 'range', 'sorted', 'hash'])
+def test_missing_items(backend):
+    positions = make_positions(np.arange(5), backend)
+    assert positions.get(3) == 3
+    assert 7 not in positions
+    with pytest.raises(KeyError):
+        positions.get(-1)
+    with pytest.raises(KeyError):
+        positions.get_many([1, 2, 10])
+
+
+@pytest.mark.parametrize('backend', ['dict', 'range', 'sorted', 'hash'])
+def test_items_equal_to_integers(backend):
+    positions = make_positions(np.arange(10), backend)
+    assert positions.get(3.0) == 3
+    assert positions.get(np.float64(3.)) == 3
+    assert positions.get(np.int32(3)) == 3
+    assert (positions.get_many([3., 5.]) == [3, 5]).all()
+    with pytest.raises(KeyError):
+        positions.get(3.5)
+    with pytest.raises(KeyError):
+        positions.get_many([np.nan])
+    assert DatasetIndex(np.arange(10)).get_pos(3.0) == 3
+
+
+def test_repeated_items():
+    indices = np.array([4, 2, 4, 1])
+    assert make_positions(indices, 'sorted').get(4) == 0
+    assert make_positions(indices, 'dict').get(4) == 0
+
+
+def test_index_backend():
+    index = DatasetIndex(np.array(['a', 'b', 'c', 'd']))
+    index.pos_backend = DictPositions
+    assert isinstance(index._pos, DictPositions)      # pylint: disable=protected-access
+    assert (index.get_pos(np.array(['d', 'b'])) == [3, 1]).all()
+    assert (index.get_pos(ix for ix in ['c', 'a']) == [2, 0]).all()
+    assert index.get_pos(slice('b', 'd')) == slice(1, 3)
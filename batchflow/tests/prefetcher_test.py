@@ -0,0 +1,88 @@
+""" Test process prefetching with shared memory transport """
+# pylint: disable=missing-docstring, protected-access
+import gc
+
+import numpy as np
+import pytest
+
+from batchflow import Dataset, Batch, action
+from batchflow.prefetcher import ProcessPrefetcher, dumps_batch, loads_batch
+
+
+class ImagesBatch(Batch):
+    components = 'images', 'labels'
+
+    @action
+    def transform(self):
+        self.images = self.images * 2 + 1
+        return self
+
+
+@pytest.fixture
+def dataset():
+    images = np.arange(40 * 16 * 16, dtype=np.float32).reshape(40, 16, 16)
+    return Dataset(40, batch_class=ImagesBatch, preloaded=(images, np.arange(40)))
+
+
+def test_serialization(dataset):
+    batch = dataset.create_batch(np.arange(8)).transform()
+    buffer = np.zeros(2 ** 16, dtype=np.uint8)
+    shared = dict(dataset=dataset, preloaded=dataset.preloaded, data=dataset.data)
+    data = dumps_batch(batch, {id(obj): key for key, obj in shared.items()}, buffer)
+
+    # arrays are put into the buffer and the dataset is not pickled
+    assert len(data) < batch.images.nbytes
+    new_batch = loads_batch(data, shared, buffer)
+    assert new_batch.dataset is dataset
+    assert np.shares_memory(new_batch.images, buffer)
+    assert (new_batch.images == batch.images).all()
+
+
+def test_mpc_prefetch(dataset):
+    pipeline = dataset.p.transform()
+    batches = list(pipeline.gen_batch(8, n_epochs=1, prefetch=2, target='mpc'))
+    expected = list(dataset.p.transform().gen_batch(8, n_epochs=1))
+
+    assert len(batches) == len(expected)
+    for batch, true_batch in zip(batches, expected):
+        assert (batch.indices == true_batch.indices).all()
+        assert (batch.images == true_batch.images).all()
+        assert batch.pipeline is pipeline
+
+
+def test_slots_are_recycled(dataset):
+    pipeline = dataset.p.transform()
+    pipeline._dataset = dataset
+    prefetcher = ProcessPrefetcher(pipeline, n_workers=1, n_slots=2, slot_size=2 ** 16)
+    try:
+        batches = [prefetcher.submit(dataset.create_batch(np.arange(i, i + 4))).result() for i in range(3)]
+        assert not prefetcher._free_slots
+        # the last batch does not fit into busy slots, so it is pickled as a whole
+        assert not np.shares_memory(batches[-1].images, np.frombuffer(prefetcher._shm.buf, dtype=np.uint8))
+
+        del batches
+        gc.collect()
+        assert sorted(prefetcher._free_slots) == [0, 1]
+    finally:
+        prefetcher.shutdown()
+
+
+def test_mpc_prefetch_after_threads(dataset):
+    # worker threads of pools started in the parent process do not exist in forked workers
+    pipeline = dataset.p.transform().apply_parallel(np.negative, src='images', target='threads')
+    pipeline.run(8, n_epochs=1, prefetch=0)
+    assert any(pool.is_started for pool in pipeline.pools.pools())
+
+    batches = list(pipeline.gen_batch(8, n_epochs=1, prefetch=2, target='mpc'))
+    assert len(batches) == 5
+    assert (batches[0].images == -(dataset.preloaded[0][:8] * 2 + 1)).all()
+
+
+def test_mpc_prefetch_closed_early(dataset):
+    pipeline = dataset.p.transform()
+    generator = pipeline.gen_batch(8, n_epochs=1, prefetch=2, target='mpc')
+    next(generator)
+    prefetcher = pipeline._executor
+    generator.close()
+    assert prefetcher._stopped
+    assert not any(worker.is_alive() for worker in prefetcher._workers)
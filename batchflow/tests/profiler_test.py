@@ -0,0 +1,108 @@
+""" Test storage of pipeline profiling data """
+# pylint: disable=missing-docstring, protected-access
+import time
+
+import numpy as np
+import pytest
+
+from batchflow import Dataset, Batch, action
+from batchflow.profiler import ProfileInfo, SamplingProfiler
+
+
+class ProfileBatch(Batch):
+    @action
+    def compute(self):
+        np.sort(np.random.rand(100))
+        return self
+
+
+def test_aggregates():
+    info = ProfileInfo()
+    info.add('a', 0, 1, 1., .5, [('f', 1, .2, .3), ('g', 2, .1, .1)])
+    info.add('a', 1, 2, 3., 1.5, [('f', 1, .4, .5)])
+    info.add('b', 1, 2, 2., 1., [('f', 5, .1, .1)], start_time=10.)
+
+    summary = info.summary()
+    assert summary.loc['a', ('total_time', 'sum')] == 4.
+    assert summary.loc['a', ('total_time', 'mean')] == 2.
+    assert summary.loc['a', ('pipeline_time', 'max')] == 1.5
+
+    detailed = info.summary(detailed=True, columns=['ncalls'])
+    assert detailed.loc[('a', 'f'), ('ncalls', 'sum')] == 2
+
+    frame = info.to_frame()
+    assert len(frame) == len(info) == 4
+    assert list(frame['iter']) == [0, 0, 1, 1]
+    assert np.isnan(frame['start_time'].iloc[:3]).all()
+    assert frame['start_time'].iloc[3] == 10.
+
+
+def test_summary_only():
+    info = ProfileInfo(keep_rows=False)
+    for i in range(100):
+        info.add('a', i, 0, 1., 1., [('f', 1, .1, .1)])
+    assert len(info) == 0
+    assert info.summary().loc['a', ('total_time', 'sum')] == 100.
+
+
+@pytest.mark.parametrize('profile', [True, 'summary'])
+def test_pipeline_profile(profile):
+    pipeline = Dataset(50, batch_class=ProfileBatch).p.compute()
+    pipeline.run(10, n_epochs=1, profile=profile)
+
+    summary = pipeline.show_profile_info()
+    assert len(summary) == 1
+    assert summary[('total_time', 'sum')].iloc[0] > 0
+    assert len(pipeline.show_profile_info(detailed=True)) > 0
+
+    if profile is True:
+        assert set(pipeline.profile_info['iter']) == set(range(1, 6))
+        assert len(pipeline.show_profile_info(per_iter=True)) == 5
+    else:
+        assert pipeline.profile_info is None
+        with pytest.raises(ValueError):
+            pipeline.show_profile_info(per_iter=True)
+
+
+class SlowBatch(Batch):
+    @action
+    def slow(self):
+        time.sleep(.02)
+        return self
+
+    @action
+    def fail(self):
+        raise ValueError(self.indices)
+
+
+def test_sampling_profiler():
+    profiler = SamplingProfiler(interval=.001).start()
+    try:
+        profiler.enter()
+        time.sleep(.05)
+        details, sampled_time = profiler.leave()
+    finally:
+        profiler.stop()
+
+    assert sampled_time > 0
+    assert any(fid.startswith('test_sampling_profiler::') for fid, *_ in details)
+
+
+def test_pipeline_sampling():
+    pipeline = Dataset(20, batch_class=SlowBatch).p.slow()
+    pipeline.run(5, n_epochs=1, profile='sampling')
+
+    summary = pipeline.show_profile_info()
+    assert summary[('pipeline_time', 'sum')].iloc[0] > 0
+    detailed = pipeline.show_profile_info(detailed=True)
+    ids = detailed.index.get_level_values('id')
+    assert any(fid.startswith('slow::') for fid in ids)
+    assert not any(fid.startswith('_exec_plan::') for fid in ids)
+    assert len(pipeline.show_profile_info(per_iter=True)) == 4
+
+
+def test_sampling_stops_on_error():
+    pipeline = Dataset(20, batch_class=SlowBatch).p.fail()
+    with pytest.raises(ValueError):
+        pipeline.run(5, n_epochs=1, profile='sampling')
+    assert not pipeline._profiler._threads
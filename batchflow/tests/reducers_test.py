@@ -0,0 +1,104 @@
+""" Tests for reducers and Pipeline.reduce. """
+# pylint: disable=missing-docstring
+# pylint: disable=redefined-outer-name
+import threading
+
+import pytest
+import numpy as np
+
+from batchflow import Dataset, Batch, B, Reducer, Sum, Count, Min, Max, MeanVar, Histogram, ValueCounts
+
+
+DATA = np.random.RandomState(0).normal(3, 2, size=(100, 4, 3))
+LABELS = np.arange(100) % 7
+
+
+class MyBatch(Batch):
+    components = 'images', 'labels'
+
+
+def reduce_in_parts(reducer, data, n_parts=3, batch_size=7):
+    """ Update a state for each of several workers and combine them """
+    states = [reducer.init() for _ in range(n_parts)]
+    for i, start in enumerate(range(0, len(data), batch_size)):
+        states[i % n_parts] = reducer.update(states[i % n_parts], data[start : start + batch_size])
+    return reducer.reduce(states)
+
+
+@pytest.mark.parametrize('axis', [None, 0, (0, 1)])
+def test_axis_reducers(axis):
+    assert np.allclose(reduce_in_parts(Sum(axis), DATA), DATA.sum(axis=axis))
+    assert np.allclose(reduce_in_parts(Min(axis), DATA), DATA.min(axis=axis))
+    assert np.allclose(reduce_in_parts(Max(axis), DATA), DATA.max(axis=axis))
+    assert reduce_in_parts(Count(axis), DATA) == DATA.size // np.asarray(DATA.sum(axis=axis)).size
+
+
+@pytest.mark.parametrize('axis, ddof', [(None, 0), ((0, 1), 1)])
+def test_mean_var(axis, ddof):
+    result = reduce_in_parts(MeanVar(axis, ddof=ddof), DATA)
+    assert np.allclose(result['mean'], DATA.mean(axis=axis))
+    assert np.allclose(result['var'], DATA.var(axis=axis, ddof=ddof))
+    assert np.allclose(result['std'], DATA.std(axis=axis, ddof=ddof))
+
+
+def test_mean_var_is_stable():
+    data = 1e9 + np.random.RandomState(1).rand(1000)
+    result = reduce_in_parts(MeanVar(), data, batch_size=10)
+    assert np.isclose(result['var'], data.var(), rtol=1e-6)
+
+
+@pytest.mark.parametrize('axis', [None, 0])
+def test_mean_var_empty_batches(axis):
+    reducer = MeanVar(axis)
+    empty = [reducer.update(None, DATA[:0]) for _ in range(2)]
+    assert reducer.reduce(empty)['count'] == 0
+    result = reducer.reduce(empty + [reducer.update(None, DATA)])
+    assert np.allclose(result['mean'], DATA.mean(axis=axis))
+    assert np.allclose(result['var'], DATA.var(axis=axis))
+
+
+def test_histogram():
+    counts, edges = reduce_in_parts(Histogram(10, range=(-5, 11)), DATA)
+    expected, _ = np.histogram(DATA, bins=10, range=(-5, 11))
+    assert np.array_equal(counts, expected)
+    assert len(edges) == 11
+    with pytest.raises(ValueError):
+        Histogram(10)
+
+
+def test_value_counts():
+    assert reduce_in_parts(ValueCounts(), LABELS) == {label: (LABELS == label).sum() for label in range(7)}
+
+
+def test_custom_reducer():
+    reducer = Reducer(init=set, update=lambda state, value: state | set(value.tolist()), combine=set.union)
+    assert reduce_in_parts(reducer, LABELS) == set(range(7))
+
+
+@pytest.mark.parametrize('prefetch', [0, 4])
+def test_pipeline(prefetch):
+    threads = set()
+
+    def remember_thread(batch):
+        threads.add(threading.get_ident())
+        return batch
+
+    dataset = Dataset(len(DATA), MyBatch, preloaded=(DATA, LABELS))
+    pipeline = (dataset.p
+                .call(remember_thread)
+                .reduce('stats', B('images'), MeanVar(axis=(0, 1)))
+                .reduce('labels', B('labels'), ValueCounts())
+                .reduce('n_items', B('images'), Count(axis=0))
+               )
+    pipeline.run(6, n_epochs=1, prefetch=prefetch)
+
+    stats = pipeline.v('stats')
+    assert np.allclose(stats['mean'], DATA.mean(axis=(0, 1)))
+    assert np.allclose(stats['std'], DATA.std(axis=(0, 1)))
+    assert sum(pipeline.v('labels').values()) == len(DATA)
+    assert pipeline.v('n_items') == len(DATA)
+    assert pipeline.get_reduced('n_items') == len(DATA)
+
+    # a new run starts from scratch
+    pipeline.run(10, n_iters=2, prefetch=prefetch)
+    assert pipeline.v('n_items') == 20
@@ -0,0 +1,76 @@
+""" Tests for the parallel directory scanner. """
+# pylint: disable=missing-docstring
+# pylint: disable=redefined-outer-name
+import os
+import glob
+
+import pytest
+
+from batchflow import FilesIndex
+from batchflow.scanner import scan
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for folder in ['a', 'a/b', 'a/b/c', 'd', '.hidden', 'a/.git']:
+        os.makedirs(str(tmp_path / folder), exist_ok=True)
+    for name in ['x.txt', 'a/y.txt', 'a/z.png', 'a/b/w.txt', 'a/b/c/v.txt', 'd/u.txt', '.hidden/h.txt',
+                 'a/.git/g.txt', 'a/.dot.txt']:
+        (tmp_path / name).touch()
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize('pattern', ['*', '*.txt', 'a/*', 'a/*.txt', '*/*.txt', '**/*.txt', '**', 'a/**/*.txt',
+                                     '*/b/*', 'a/.*', '.*/*', 'a/y.txt', 'missing/*', 'a/b/c/v.txt',
+                                     '*/', 'a/*/', 'a/b/'])
+@pytest.mark.parametrize('dirs', [False, True])
+def test_same_as_glob(tree, pattern, dirs):
+    pattern = os.path.join(tree, pattern)
+    check = os.path.isdir if dirs else os.path.isfile
+    expected = sorted(path.rstrip(os.sep) for path in glob.glob(pattern, recursive=True) if check(path))
+    paths = scan(pattern, dirs=dirs, n_workers=2)
+    assert sorted(paths) == sorted(set(expected))
+    assert len(set(paths)) == len(paths)
+
+
+def test_slash_separated_pattern(tree):
+    pattern = '/'.join([os.path.abspath(tree).replace(os.sep, '/'), '*', '*.txt'])
+    expected = glob.glob(os.path.join(tree, '*', '*.txt'))
+    assert sorted(os.path.normpath(path) for path in scan(pattern)) == sorted(expected)
+
+
+def test_cache(tree, tmp_path_factory):
+    cache = str(tmp_path_factory.mktemp('cache'))
+    pattern = os.path.join(tree, '**', '*.txt')
+    paths = scan(pattern, cache=cache)
+    assert len(os.listdir(cache)) == 1
+
+    # the manifest is used while directories are unchanged
+    stat = os.stat(os.path.join(tree, 'a', 'b'))
+    os.remove(os.path.join(tree, 'a', 'b', 'w.txt'))
+    os.utime(os.path.join(tree, 'a', 'b'), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert sorted(scan(pattern, cache=cache)) == sorted(paths)
+
+    # a modified directory invalidates the manifest
+    open(os.path.join(tree, 'a', 'b', 'new.txt'), 'w').close()
+    new_paths = scan(pattern, cache=cache)
+    assert os.path.join(tree, 'a', 'b', 'new.txt') in new_paths
+    assert os.path.join(tree, 'a', 'b', 'w.txt') not in new_paths
+
+
+def test_cache_without_wildcards(tree, tmp_path_factory):
+    cache = str(tmp_path_factory.mktemp('cache'))
+    path = os.path.join(tree, 'a', 'new.txt')
+    assert len(scan(path, cache=cache)) == 0
+
+    open(path, 'w').close()
+    assert list(scan(path, cache=cache)) == [path]
+
+
+def test_files_index_cache(tree, tmp_path_factory):
+    cache = str(tmp_path_factory.mktemp('cache'))
+    findex = FilesIndex(path=os.path.join(tree, 'a', '**', '*.txt'), sort=True, cache=cache, n_workers=4)
+    cached = FilesIndex(path=os.path.join(tree, 'a', '**', '*.txt'), sort=True, cache=cache)
+    assert list(findex.indices) == ['v.txt', 'w.txt', 'y.txt']
+    assert list(cached.indices) == list(findex.indices)
+    assert cached.get_fullpath('v.txt') == os.path.join(tree, 'a', 'b', 'c', 'v.txt')
@@ -0,0 +1,116 @@
+""" Tests for StreamIndex and StreamDataset classes. """
+# pylint: disable=missing-docstring
+import itertools
+
+import pytest
+import numpy as np
+
+from batchflow import Batch, StreamIndex, StreamDataset, B, V
+from batchflow.stream import ShuffleBuffer
+
+
+def batches(index, *args, **kwargs):
+    return [list(batch.indices) for batch in index.gen_batch(*args, **kwargs)]
+
+
+class ComponentsBatch(Batch):
+    components = 'images', 'labels'
+
+
+def records():
+    for i in itertools.count():
+        yield np.full((2, 2), i), i % 3
+
+
+@pytest.mark.parametrize('size', [0, 5, 100])
+def test_buffer_returns_each_item_once(size):
+    buffer = ShuffleBuffer(range(53), size)
+    items = []
+    while True:
+        batch = buffer.take(10, np.random.RandomState(size))
+        items.extend(batch)
+        if len(batch) < 10:
+            break
+    assert sorted(items) == list(range(53))
+    assert buffer.take(10, np.random) == []
+
+
+def test_buffer_is_bounded():
+    buffer = ShuffleBuffer(itertools.count(), 50)
+    for _ in range(100):
+        assert len(buffer.take(8, np.random)) == 8
+        assert len(buffer) == 50
+    assert buffer.n_pulled == 50 + 8 * 100
+
+
+def test_buffer_shuffles():
+    buffer = ShuffleBuffer(range(1000), 200)
+    items = buffer.take(1000, np.random.RandomState(0))
+    assert sorted(items) == list(range(1000))
+    assert items != list(range(1000))
+
+
+@pytest.mark.parametrize('drop_last, expected', [
+    (False, [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]),
+    (True, [[0, 1, 2], [3, 4, 5], [6, 7, 8]]),
+])
+def test_sequential(drop_last, expected):
+    index = StreamIndex(iter(range(10)), buffer_size=4)
+    assert batches(index, 3, drop_last=drop_last) == expected
+
+
+def test_seeded_shuffle():
+    result = [batches(StreamIndex(lambda: range(30), buffer_size=8), 4, shuffle=42) for _ in range(2)]
+    assert result[0] == result[1]
+    assert sorted(sum(result[0], [])) == list(range(30))
+
+
+def test_n_iters():
+    index = StreamIndex(itertools.count(), buffer_size=16)
+    assert len(batches(index, 4, shuffle=True, n_iters=5)) == 5
+    assert len(index) == 16 + 4 * 5
+
+    index.reset('iter')
+    # the stream is not rewound
+    assert min(index.next_batch(4).indices) > 0
+
+
+def test_n_epochs():
+    index = StreamIndex(range(10))
+    assert len(batches(index, 3, n_epochs=1)) == 4
+    with pytest.raises(ValueError):
+        index.next_batch(3, n_epochs=2)
+
+
+def test_dataset_components():
+    dataset = StreamDataset(records, ComponentsBatch, buffer_size=20)
+    batch = dataset.next_batch(5, shuffle=True)
+    assert len(batch) == 5
+    assert batch.images.shape == (5, 2, 2)
+    assert (batch.images[:, 0, 0] == batch.indices).all()
+    assert (batch.labels == batch.indices % 3).all()
+
+
+def test_dataset_without_components():
+    dataset = StreamDataset([np.arange(3), np.arange(5)])
+    batch = dataset.next_batch(2)
+    assert batch.data.dtype == object
+    assert [len(item) for item in batch.data] == [3, 5]
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_pipeline(prefetch):
+    dataset = StreamDataset(records, ComponentsBatch, buffer_size=50)
+    pipeline = (dataset.p
+                .init_variable('labels', [])
+                .update(V('labels', mode='e'), B('labels'))
+               )
+    pipeline.run(8, shuffle=True, n_iters=10, prefetch=prefetch)
+    assert len(pipeline.v('labels')) == 80
+    assert len(dataset.index.buffer) == 50
+
+
+def test_dataset_cannot_be_split():
+    dataset = StreamDataset(records)
+    with pytest.raises(NotImplementedError):
+        dataset.split()
@@ -0,0 +1,56 @@
+""" Test recording of pipeline timelines """
+# pylint: disable=missing-docstring
+import json
+
+import numpy as np
+import pytest
+
+from batchflow import Dataset, Batch, action, inbatch_parallel
+from batchflow.tracing import Tracer, get_tracer
+
+
+class TraceBatch(Batch):
+    @action(use_lock=True)
+    def locked(self):
+        return self
+
+    @action
+    @inbatch_parallel(init='indices', target='threads')
+    def parallel(self, ix):
+        _ = ix
+
+
+def test_tracer():
+    with Tracer() as tracer:
+        assert get_tracer() is tracer
+        with tracer.span('work', 'test', size=3):
+            pass
+    assert get_tracer() is None
+
+    trace = tracer.to_dict()
+    events = [event for event in trace['traceEvents'] if event['ph'] == 'X']
+    assert events[0]['name'] == 'work'
+    assert events[0]['args'] == dict(size=3)
+    assert events[0]['dur'] >= 0
+    assert any(event['ph'] == 'M' and event['name'] == 'thread_name' for event in trace['traceEvents'])
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_pipeline_trace(prefetch, tmp_path):
+    path = str(tmp_path / 'trace.json')
+    pipeline = Dataset(np.arange(40), batch_class=TraceBatch).p.locked().parallel()
+    pipeline.run(10, n_epochs=1, prefetch=prefetch, trace=path)
+    assert get_tracer() is None
+
+    with open(path) as file:
+        events = json.load(file)['traceEvents']
+    names = [event['name'] for event in events]
+    categories = {event.get('cat') for event in events}
+
+    assert names.count('locked #0') == 4
+    assert names.count('batch') == 4
+    assert 'lock #_lock_locked' in names
+    assert 'parallel' in categories
+    if prefetch:
+        assert {'wait', 'generator'} <= categories
+        assert len({event['tid'] for event in events if event['ph'] == 'X'}) > 2
@@ -0,0 +1,104 @@
+""" Tests for chunked volumes, CropIndex and VolumeBatch classes. """
+# pylint: disable=missing-docstring
+# pylint: disable=redefined-outer-name
+import os
+import pickle
+
+import pytest
+import numpy as np
+
+from batchflow import Dataset, CropIndex, VolumeBatch, BloscVolume, ChunkCache
+from batchflow.volume import ArrayVolume
+
+
+SHAPE = 20, 30, 25
+CHUNKS = 8, 16, 16
+
+
+@pytest.fixture
+def array():
+    return np.random.RandomState(0).rand(*SHAPE).astype(np.float32)
+
+
+@pytest.fixture
+def volume(array, tmp_path):
+    return BloscVolume.create(str(tmp_path / 'volume'), array, chunks=CHUNKS)
+
+
+def crop_of(array, origin, shape, fill_value=0):
+    pad = 32
+    padded = np.pad(array, pad, constant_values=fill_value)
+    return padded[tuple(slice(o + pad, o + pad + size) for o, size in zip(origin, shape))]
+
+
+def test_create(volume):
+    assert volume.shape == SHAPE
+    assert volume.dtype == np.float32
+    assert len([name for name in os.listdir(volume.path) if name.endswith('.blosc')]) == 3 * 2 * 2
+    assert BloscVolume(volume.path).key == volume.key
+
+
+@pytest.mark.parametrize('origin', [(0, 0, 0), (3, 10, 14), (12, 20, 10), (-3, 25, -5), (30, 0, 0)])
+def test_read(array, volume, origin):
+    shape = (8, 10, 12)
+    for source in (volume, ArrayVolume(array, chunks=(4, 7, 9)), ArrayVolume(array)):
+        assert np.array_equal(source.read(origin, shape, fill_value=-1), crop_of(array, origin, shape, -1))
+
+
+def test_read_touched_chunks_only(volume):
+    cache = ChunkCache()
+    volume.read((1, 1, 1), (4, 4, 4), cache=cache)
+    assert cache.misses == 1
+    volume.read((6, 14, 1), (4, 4, 4), cache=cache)
+    assert cache.misses == 1 + 3
+    assert cache.hits == 1
+    assert len(cache) == 4
+
+
+def test_cache_size_limit(volume):
+    chunk_size = np.prod(CHUNKS) * 4
+    cache = ChunkCache(max_size=2 * chunk_size)
+    volume.read((0, 0, 0), SHAPE, cache=cache)
+    assert 0 < len(cache) < 3 * 2 * 2
+    assert cache.size <= 2 * chunk_size
+
+    cache = pickle.loads(pickle.dumps(cache))
+    assert len(cache) == 0
+    assert cache.max_size == 2 * chunk_size
+
+
+def test_grid():
+    index = CropIndex.grid({'a': (10, 20, 30), 'b': (5, 8, 8)}, shape=(5, 8, 8), stride=(5, 8, 16))
+    volumes, origins, shapes = index.locate()
+    assert (volumes == 'a').sum() == 2 * 3 * 3
+    assert [np.unique(axis).tolist() for axis in origins[volumes == 'a'].T] == [[0, 5], [0, 8, 12], [0, 16, 22]]
+    assert origins[volumes == 'b'].tolist() == [[0, 0, 0]]
+    assert (shapes == (5, 8, 8)).all()
+
+
+def test_subsets_share_crops():
+    index = CropIndex(volumes='a', origins=np.arange(30).reshape(10, 3), shape=(2, 2, 2))
+    index.split(0.6, shuffle=1)
+    assert index.train.origins is index.origins
+    assert np.array_equal(index.test.locate()[1], index.origins[index.test.indices])
+
+
+@pytest.mark.parametrize('by_path', [False, True])
+def test_batch(array, volume, by_path):
+    other = np.arange(1000, dtype=np.float32).reshape(10, 10, 10)
+    volumes = {'a': volume.path if by_path else volume, 'b': other}
+    index = CropIndex.grid({'a': SHAPE, 'b': other.shape}, shape=(6, 6, 6), stride=(5, 5, 5))
+    dataset = Dataset(index, VolumeBatch)
+    pipeline = dataset.p.load(src=volumes, fmt='volume', dst='images')
+    for batch in pipeline.gen_batch(7, shuffle=True, n_epochs=1, drop_last=True):
+        assert batch.images.shape == (7, 6, 6, 6)
+        for crop, volume_id, origin in zip(batch.images, *batch.index.locate()[:2]):
+            source = array if volume_id == 'a' else other
+            assert np.array_equal(crop, crop_of(source, origin, (6, 6, 6)))
+
+
+def test_batch_requires_same_shapes(array):
+    index = CropIndex(volumes='a', origins=[[0, 0, 0], [1, 1, 1]], shape=[[2, 2, 2], [3, 3, 3]])
+    batch = VolumeBatch(index)
+    with pytest.raises(ValueError):
+        batch.load(src={'a': array}, fmt='volume')
@@ -0,0 +1,95 @@
+""" Tests for WindowIndex and WindowBatch classes. """
+# pylint: disable=missing-docstring
+# pylint: disable=redefined-outer-name
+import pickle
+
+import pytest
+import numpy as np
+
+from batchflow import Dataset, WindowIndex, WindowBatch
+
+
+LENGTHS = [12, 3, 8]
+WINDOW, STRIDE = 4, 2
+
+
+@pytest.fixture
+def series():
+    return [np.arange(length * 2).reshape(length, 2) + 100 * i for i, length in enumerate(LENGTHS)]
+
+
+@pytest.fixture
+def index():
+    return WindowIndex(lengths=LENGTHS, window=WINDOW, stride=STRIDE)
+
+
+def expected_windows(series, index, indices):
+    series_pos, offsets = index.locate(indices)
+    return np.stack([series[s][offset : offset + WINDOW] for s, offset in zip(series_pos, offsets)])
+
+
+class ComponentsBatch(WindowBatch):
+    components = 'signals', 'levels'
+
+
+def test_build(index):
+    assert len(index) == 5 + 0 + 3
+    series, offsets = index.locate()
+    assert series.tolist() == [0, 0, 0, 0, 0, 2, 2, 2]
+    assert offsets.tolist() == [0, 2, 4, 6, 8, 0, 2, 4]
+
+
+def test_series_ids():
+    index = WindowIndex(lengths={'a': 5, 'b': 4}, window=4)
+    series, offsets = index.locate([1, 2])
+    assert series.tolist() == ['a', 'b']
+    assert offsets.tolist() == [1, 0]
+    assert index.locate([1, 2], pos=True)[0].tolist() == [0, 1]
+
+
+def test_locate_out_of_bounds(index):
+    with pytest.raises(IndexError):
+        index.locate([len(index)])
+
+
+def test_subsets_share_lengths(index):
+    index.split(0.5, shuffle=42)
+    for subset in (index.train, index.test, pickle.loads(pickle.dumps(index.train))):
+        assert isinstance(subset, WindowIndex)
+        assert np.array_equal(subset.locate()[1], index.locate(subset.indices)[1])
+    assert index.train.lengths is index.lengths
+    assert sorted(WindowIndex.concat(index.train, index.test).indices) == list(range(len(index)))
+
+
+@pytest.mark.parametrize('concatenated', [False, True])
+def test_batch_from_series(series, index, concatenated):
+    preloaded = np.concatenate(series) if concatenated else series
+    dataset = Dataset(index, WindowBatch, preloaded=preloaded)
+    batch = dataset.create_batch([7, 0, 3, 5])
+    assert batch.data.shape == (4, WINDOW, 2)
+    assert np.array_equal(batch.data, expected_windows(series, index, [7, 0, 3, 5]))
+
+
+def test_batch_from_dict(series):
+    index = WindowIndex(lengths={'a': LENGTHS[0], 'c': LENGTHS[2]}, window=WINDOW, stride=STRIDE)
+    batch = WindowBatch(index.create_subset([1, 6])).load(src={'a': series[0], 'c': series[2]})
+    assert np.array_equal(batch.data, [series[0][2:6], series[2][2:6]])
+
+
+def test_components(series, index):
+    levels = [item[:, 0] for item in series]
+    dataset = Dataset(index, ComponentsBatch, preloaded=(series, levels))
+    for batch in dataset.gen_batch(3, shuffle=True, n_epochs=1):
+        assert np.array_equal(batch.signals, expected_windows(series, index, batch.indices))
+        assert np.array_equal(batch.levels, batch.signals[:, :, 0])
+
+
+def test_load_component(series, index):
+    batch = ComponentsBatch(index.create_subset([0, 1])).load(src=series, dst='signals')
+    assert np.array_equal(batch.signals, expected_windows(series, index, [0, 1]))
+
+
+def test_1d_series():
+    index = WindowIndex(lengths=10, window=3, stride=3)
+    batch = WindowBatch(index.create_subset([0, 2])).load(src=np.arange(10))
+    assert np.array_equal(batch.data, [[0, 1, 2], [6, 7, 8]])
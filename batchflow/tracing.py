@@ -0,0 +1,128 @@
+""" Contains a recorder of pipeline execution timeline in Chrome trace event format """
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+
+# an active tracer shared by all threads
+_ACTIVE = dict(tracer=None)
+
+
+def get_tracer():
+    """ Return an active tracer or None """
+    return _ACTIVE['tracer']
+
+
+class Tracer:
+    """ Records begin and end times of actions, batches, parallel chunks and waits in all threads
+
+    The trace could be saved as JSON and opened in `chrome://tracing` or `Perfetto <https://ui.perfetto.dev>`_.
+
+    Examples
+    --------
+    ::
+
+        with Tracer() as tracer:
+            pipeline.run(BATCH_SIZE, n_epochs=1, prefetch=4)
+        tracer.save('trace.json')
+
+    or just::
+
+        pipeline.run(BATCH_SIZE, n_epochs=1, prefetch=4, trace='trace.json')
+    """
+    def __init__(self):
+        self.events = []
+        self.pid = os.getpid()
+        self._threads = {}
+        self._start_ns = time.perf_counter_ns()
+        self._previous = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, trback):
+        self.stop()
+
+    def start(self):
+        """ Make the tracer active, so that events from all threads are recorded """
+        if _ACTIVE['tracer'] is not self:
+            self._previous = _ACTIVE['tracer']
+            _ACTIVE['tracer'] = self
+        return self
+
+    def stop(self):
+        """ Stop recording events """
+        if _ACTIVE['tracer'] is self:
+            _ACTIVE['tracer'] = self._previous
+        self._previous = None
+        return self
+
+    def add(self, name, category, start_ns, end_ns=None, **kwargs):
+        """ Add an event
+
+        Parameters
+        ----------
+        name : str
+            an event name (e.g. an action name)
+        category : str
+            an event category (e.g. 'action', 'batch', 'wait')
+        start_ns : int
+            start time as returned by :func:`time.perf_counter_ns`
+        end_ns : int
+            end time (if None, the current time is used)
+        kwargs
+            event arguments shown in the trace viewer (e.g. `batch_id`)
+        """
+        end_ns = time.perf_counter_ns() if end_ns is None else end_ns
+        tid = threading.get_ident()
+        if tid not in self._threads:
+            self._threads[tid] = threading.current_thread().name
+        event = dict(name=name, cat=category, ph='X', pid=self.pid, tid=tid,
+                     ts=(start_ns - self._start_ns) / 1000, dur=(end_ns - start_ns) / 1000)
+        if kwargs:
+            event['args'] = kwargs
+        self.events.append(event)
+
+    @contextmanager
+    def span(self, name, category, **kwargs):
+        """ Record an event which lasts while the context is executed """
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(name, category, start_ns, **kwargs)
+
+    def to_dict(self):
+        """ Return the trace in Chrome trace event format """
+        metadata = [dict(name='thread_name', ph='M', pid=self.pid, tid=tid, args=dict(name=name))
+                    for tid, name in list(self._threads.items())]
+        return dict(traceEvents=metadata + list(self.events), displayTimeUnit='ms')
+
+    def save(self, path):
+        """ Save the trace as a JSON file """
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, default=str)
+
+
+@contextmanager
+def trace_span(name, category, **kwargs):
+    """ Record an event with the active tracer, if any """
+    tracer = _ACTIVE['tracer']
+    if tracer is None:
+        yield
+    else:
+        with tracer.span(name, category, **kwargs):
+            yield
+
+
+def acquire_lock(lock, name):
+    """ Acquire a lock recording the waiting time with the active tracer, if any """
+    tracer = _ACTIVE['tracer']
+    if tracer is None:
+        lock.acquire()
+    else:
+        start_ns = time.perf_counter_ns()
+        lock.acquire()
+        tracer.add('lock ' + name, 'wait', start_ns)
@@ -0,0 +1,284 @@
+""" Contains chunked volumes and a cache of their chunks """
+import os
+import json
+import itertools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+try:
+    import blosc
+except ImportError:
+    pass
+
+
+class ChunkCache:
+    """ A thread-safe LRU cache of decompressed chunks limited by their total size
+
+    The cache is per-process: after a fork a child process starts with an empty cache
+    (and the cache is not copied when pickled), so processes never share locks or memory.
+
+    Parameters
+    ----------
+    max_size : int
+        a maximum total size of cached chunks in bytes
+    """
+    def __init__(self, max_size=2 ** 30):
+        self.max_size = max_size
+        self.size = self.hits = self.misses = 0
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._chunks = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        return {'max_size': self.max_size}
+
+    def __setstate__(self, state):
+        self.max_size = state['max_size']
+        self._reset()
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def clear(self):
+        """ Remove all chunks """
+        with self._lock:
+            self._chunks.clear()
+            self.size = 0
+
+    def get(self, volume, position):
+        """ Return a chunk of a volume reading it if it is not cached
+
+        Parameters
+        ----------
+        volume : Volume
+            a volume
+        position : tuple of int
+            a position of the chunk in the grid of chunks
+
+        Returns
+        -------
+        np.ndarray
+            a read-only chunk
+        """
+        if self._pid != os.getpid():
+            self._reset()
+        key = volume.key, tuple(position)
+        with self._lock:
+            item = self._chunks.get(key)
+            if item is not None:
+                self._chunks.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            self.misses += 1
+
+        # chunks are read without the lock, so threads read (and decompress) different chunks in parallel
+        chunk = volume.read_chunk(position)
+        chunk.flags.writeable = False
+        with self._lock:
+            if key not in self._chunks:
+                # the volume is kept along with the chunk, so that its key cannot be reused by another volume
+                self._chunks[key] = volume, chunk
+                self.size += chunk.nbytes
+                while self.size > self.max_size and self._chunks:
+                    _, (_, evicted) = self._chunks.popitem(last=False)
+                    self.size -= evicted.nbytes
+        return chunk
+
+
+chunk_cache = ChunkCache()
+
+
+class Volume:
+    """ Base class for n-dimensional arrays which are read chunk by chunk
+
+    Child classes should define `shape`, `dtype`, `chunks` (a shape of chunks), `key` (a hashable which
+    identifies the volume in a cache) and implement :meth:`read_chunk`.
+    """
+    shape = None
+    dtype = None
+    chunks = None
+    key = None
+
+    @property
+    def ndim(self):
+        """ int : a number of dimensions """
+        return len(self.shape)
+
+    def get_chunk_slices(self, position):
+        """ Return slices of a chunk at a given position in the grid of chunks """
+        return tuple(slice(pos * size, min((pos + 1) * size, length))
+                     for pos, size, length in zip(position, self.chunks, self.shape))
+
+    def read_chunk(self, position):
+        """ Return a chunk at a given position in the grid of chunks """
+        raise NotImplementedError()
+
+    def read(self, origin, shape=None, out=None, cache=None, fill_value=0):
+        """ Read a crop reading only the chunks it touches
+
+        Parameters
+        ----------
+        origin : sequence of int
+            coordinates of the first crop element (might be negative)
+        shape : sequence of int
+            a shape of the crop (if None, `out` shape)
+        out : np.ndarray or None
+            an array to read the crop into
+        cache : ChunkCache or None
+            a cache of chunks
+        fill_value : number
+            a value for crop elements outside the volume
+
+        Returns
+        -------
+        np.ndarray
+        """
+        origin = np.asarray(origin, dtype=np.int64)
+        if out is None:
+            out = np.full(shape, fill_value, dtype=self.dtype)
+        shape = np.array(out.shape, dtype=np.int64)
+
+        start = np.maximum(origin, 0)
+        stop = np.minimum(origin + shape, self.shape)
+        if (start != origin).any() or (stop != origin + shape).any():
+            # the crop is partially outside the volume
+            out[...] = fill_value
+        if (stop > start).all():
+            self._read_into(out, origin, start, stop, cache)
+        return out
+
+    def _read_into(self, out, origin, start, stop, cache=None):
+        """ Copy a region `[start, stop)` of the volume into `out` which begins at `origin` """
+        chunks = np.array(self.chunks, dtype=np.int64)
+        first, last = start // chunks, (stop - 1) // chunks
+        for position in itertools.product(*[range(a, b + 1) for a, b in zip(first, last)]):
+            chunk = cache.get(self, position) if cache is not None else self.read_chunk(position)
+            chunk_start = np.array(position) * chunks
+            low = np.maximum(start, chunk_start)
+            high = np.minimum(stop, chunk_start + chunk.shape)
+            out[tuple(slice(a - o, b - o) for a, b, o in zip(low, high, origin))] = \
+                chunk[tuple(slice(a - c, b - c) for a, b, c in zip(low, high, chunk_start))]
+
+
+class BloscVolume(Volume):
+    """ A volume stored as a directory of blosc-compressed chunk files
+
+    A directory contains `volume.json` with a shape, a dtype and a chunk shape of the volume
+    and a file for each chunk. Use :meth:`create` to convert an array (e.g. memory-mapped) into this format.
+
+    Parameters
+    ----------
+    path : str
+        a volume directory
+
+    Examples
+    --------
+    >>> volume = BloscVolume.create('/data/cubes/cube_1', np.load('cube_1.npy', mmap_mode='r'), chunks=(64, 64, 64))
+    >>> crop = volume.read(origin=(100, 200, 300), shape=(32, 128, 128), cache=chunk_cache)
+    """
+    META_FILE = 'volume.json'
+
+    def __init__(self, path):
+        self.path = path
+        meta_path = os.path.join(path, self.META_FILE)
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        self.shape = tuple(meta['shape'])
+        self.dtype = np.dtype(meta['dtype'])
+        self.chunks = tuple(meta['chunks'])
+        # a rewritten volume gets a new key, so that outdated chunks are not taken from a cache
+        self.key = os.path.abspath(path), os.path.getmtime(meta_path)
+
+    @classmethod
+    def create(cls, path, data, chunks=(64, 64, 64), cname='lz4', clevel=5):
+        """ Save an array as a chunked volume
+
+        Parameters
+        ----------
+        path : str
+            a volume directory
+        data : array-like
+            an array which supports slicing (e.g. `np.memmap`, hdf5 or zarr array)
+        chunks : sequence of int
+            a shape of chunks
+        cname : str
+            a blosc compressor
+        clevel : int
+            a compression level
+
+        Returns
+        -------
+        BloscVolume
+        """
+        if len(chunks) != len(data.shape):
+            raise ValueError("chunks should have as many dimensions as data", chunks, data.shape)
+        os.makedirs(path, exist_ok=True)
+        dtype = np.dtype(data.dtype)
+        grid = [range(-(-length // size)) for length, size in zip(data.shape, chunks)]
+        for position in itertools.product(*grid):
+            slices = tuple(slice(pos * size, (pos + 1) * size) for pos, size in zip(position, chunks))
+            chunk = np.ascontiguousarray(data[slices], dtype=dtype)
+            with open(cls._chunk_path(path, position), 'wb') as f:
+                f.write(blosc.compress(chunk.tobytes(), typesize=dtype.itemsize, clevel=clevel, cname=cname))
+
+        meta = dict(shape=list(data.shape), dtype=dtype.str, chunks=list(chunks))
+        with open(os.path.join(path, cls.META_FILE), 'w') as f:
+            json.dump(meta, f)
+        return cls(path)
+
+    @staticmethod
+    def _chunk_path(path, position):
+        return os.path.join(path, '_'.join(str(pos) for pos in position) + '.blosc')
+
+    def read_chunk(self, position):
+        shape = tuple(s.stop - s.start for s in self.get_chunk_slices(position))
+        with open(self._chunk_path(self.path, position), 'rb') as f:
+            data = blosc.decompress(f.read())
+        return np.frombuffer(data, dtype=self.dtype).reshape(shape)
+
+
+class ArrayVolume(Volume):
+    """ A volume from an array
+
+    Chunked arrays (e.g. hdf5 datasets or zarr arrays) are read chunk by chunk (and might be cached),
+    while numpy arrays (including memory-mapped ones) are sliced directly.
+
+    Parameters
+    ----------
+    array : array-like
+        an array which supports slicing
+    chunks : sequence of int or None
+        a shape of chunks (by default, `array.chunks`)
+    """
+    def __init__(self, array, chunks=None):
+        self.array = array
+        self.shape = tuple(array.shape)
+        self.dtype = np.dtype(array.dtype)
+        self.chunks = chunks or getattr(array, 'chunks', None)
+        self.key = id(array), self.chunks
+
+    def read_chunk(self, position):
+        return np.asarray(self.array[self.get_chunk_slices(position)])
+
+    def _read_into(self, out, origin, start, stop, cache=None):
+        if self.chunks is not None:
+            super()._read_into(out, origin, start, stop, cache)
+        else:
+            region = tuple(slice(a, b) for a, b in zip(start, stop))
+            out[tuple(slice(a - o, b - o) for a, b, o in zip(start, stop, origin))] = self.array[region]
+
+
+def as_volume(volume):
+    """ Return a :class:`Volume` for a volume, a path to a :class:`BloscVolume` or an array """
+    if isinstance(volume, Volume):
+        return volume
+    if isinstance(volume, str):
+        return BloscVolume(volume)
+    return ArrayVolume(volume)
@@ -30,7 +30,7 @@ setup(
     zip_safe=False,
     platforms='any',
     install_requires=[
-        'numpy>=1.10',
+        'numpy>=1.17',
         'pandas>=0.24',
         'dill>=0.2.7',
         'tqdm>=4.19.7',